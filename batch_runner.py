@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""Headless batch runner for Veo and Lyria jobs described in a JSONL manifest.
+
+Usage:
+    python batch_runner.py jobs.jsonl --results results.jsonl --concurrency 16
+
+Each manifest line is one job, for example:
+    {"id": "intro", "kind": "veo", "prompt": "A lighthouse at dusk", "image": "frames/intro.png"}
+    {"id": "morph", "kind": "interpolation", "prompt": "...", "image": "a.jpg", "last_frame": "gs://bucket/b.jpg"}
+    {"id": "longer", "kind": "extension", "prompt": "Continue the video naturally", "video": "clip.mp4"}
+    {"id": "pan", "kind": "camera", "prompt": "...", "image": "start.jpg", "camera_control": "PAN_LEFT"}
+    {"id": "score", "kind": "lyria", "prompt": "Epic cinematic score", "negative_prompt": "noisy", "sample_count": 2}
+    {"id": "beds", "kind": "lyria", "prompts": ["Calm lo-fi piano", "Upbeat synthwave"], "sample_count": 4, "concurrency": 8}
+
+A Lyria job's samples (for each of its ``prompts``) are split into concurrent
+predict calls; per-call latencies are reported under ``timings.calls``.
+``parameters`` in a Veo job is merged over the defaults the matching tab uses.
+Veo jobs are spread over the ``VEO_TARGETS`` pool when it is set (see
+``routing``), otherwise they all run on ``--project``/``--bucket``. Local input
+paths are uploaded to the job's target bucket first (images downscaled and
+re-encoded for the job's aspect ratio, see ``image_preprocess``, with their
+before/after sizes under ``inputs``; ``"crop": true`` also center-crops them to
+the aspect ratio); ``gs://`` URIs are used as-is.
+Every Veo job is uploaded and submitted up front (the quota scheduler paces
+the predict calls), so all operations run at once; polling and downloads, and
+the Lyria jobs, then share ``--concurrency`` workers. One result line (status,
+operation name, output URIs, local files and per-stage timings) is appended to
+the results file as each job finishes.
+
+Relative ``image``, ``last_frame`` and ``video`` paths are looked up next to
+the manifest first, then in the working directory. Job ids must be unique. Outputs and job store rows are named after the id with
+characters other than letters, digits, ``.``, ``_`` and ``-`` replaced; such ids
+also get a short hash of the original so that e.g. ``a/b`` and ``a b`` differ.
+
+Submitted Veo operations are recorded in the job store under this manifest.
+If a run is interrupted, running the same manifest again resumes polling its
+unfinished operations (``"resumed": true`` in their result lines) instead of
+submitting them again, and jobs that already succeeded are returned from their
+stored outputs (``"completed_earlier": true``; missing local files are downloaded
+again) without a new operation. ``--force-regenerate`` submits them anyway.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+from google.cloud import storage
+
+from gcp_auth import get_token_provider
+from job_store import get_job_store, claim as claim_job
+from gcs_utils import upload_file, upload_buffer
+from image_preprocess import prepare_upload, IMAGE_CROP_TO_ASPECT
+from lro_polling import PollPolicy
+from lyria import plan_lyria_calls, iter_lyria_batch, LYRIA_MAX_CONCURRENCY, MUSIC_OUTPUT_SUBDIR
+from quota_scheduler import PRIORITY_BATCH
+from routing import get_router
+from veo_api import VEO_ADVANCED_MODEL_URL, VEO_STANDARD_MODEL_URL, compose_veo_request, extract_video_uris
+from veo_batch import VeoBatchJob, submit_job, complete_job, resolve_from_cache, download_job_outputs
+
+load_dotenv()
+
+logger = logging.getLogger("batch_runner")
+
+IMAGE_UPLOAD_GCS_PREFIX = os.getenv("IMAGE_UPLOAD_GCS_PREFIX", "uploads/")
+VIDEO_UPLOAD_GCS_PREFIX = os.getenv("VIDEO_UPLOAD_GCS_PREFIX", "video_uploads/")
+INPUT_PATH_KEYS = ("image", "last_frame", "video")
+
+# kind -> (model URL template, output sub-path in the bucket, default parameters); mirrors the tabs.
+VEO_KINDS = {
+    "veo": (VEO_STANDARD_MODEL_URL, "video_outputs_v0_std/",
+            {"sampleCount": 1, "aspectRatio": "16:9", "durationSeconds": 8, "enhancePrompt": False, "personGeneration": "allow_adult"}),
+    "interpolation": (VEO_ADVANCED_MODEL_URL, "interpolation_videos/", {"aspectRatio": "16:9", "durationSeconds": 5, "enhancePrompt": True}),
+    "extension": (VEO_ADVANCED_MODEL_URL, "extended_videos/", {"aspectRatio": "16:9", "durationSeconds": 4, "enhancePrompt": True}),
+    "camera": (VEO_ADVANCED_MODEL_URL, "camera_videos/", {"aspectRatio": "16:9", "enhancePrompt": True}),
+}
+
+
+@dataclass
+class RunnerContext:
+    project_id: str
+    lyria_project_id: str
+    bucket: str
+    output_dir: str
+    storage_client: object = None
+    poll_deadline: float = None
+    use_cache: bool = False
+    force_regenerate: bool = False
+    router: object = None
+    origin: str = None  # Job store origin of this manifest's jobs
+    resumable: dict = None  # Job name -> unfinished job store row left by an earlier run of this manifest
+    completed: dict = None  # Job name -> latest succeeded job store row of an earlier run of this manifest
+
+
+@dataclass
+class VeoRun:
+    """A manifest Veo job between its submission and its result record."""
+    spec: dict
+    record: dict
+    started: float
+    job: VeoBatchJob = None
+    fetch_endpoint: str = None
+    output_dir: str = None
+    poll_policy: PollPolicy = None
+
+    @property
+    def needs_polling(self):
+        return bool(self.job and self.job.operation_name and self.job.result is None and not self.job.error)
+
+
+def load_manifest(path):
+    """Reads a JSONL manifest, skipping blank and ``#`` lines, and gives every job an ``id``.
+
+    Relative input paths that exist next to the manifest are made to point there.
+
+    Raises ``ValueError`` when two jobs have the same id (or the same job name once sanitized).
+    """
+    jobs, names = [], {}
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                spec = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: invalid JSON ({e})") from e
+            spec.setdefault("id", f"job_{line_no}")
+            spec.setdefault("kind", "veo")
+            if spec["kind"] not in VEO_KINDS and spec["kind"] != "lyria":
+                raise ValueError(f"{path}:{line_no}: unknown job kind {spec['kind']!r}")
+            name = _job_name(spec)
+            if name in names:
+                raise ValueError(f"{path}:{line_no}: job id {spec['id']!r} duplicates the id on line {names[name]}")
+            names[name] = line_no
+            for key in INPUT_PATH_KEYS:
+                value = spec.get(key)
+                if value and not value.startswith("gs://") and not os.path.isabs(value) and os.path.exists(os.path.join(base_dir, value)):
+                    spec[key] = os.path.join(base_dir, value)
+            jobs.append(spec)
+    return jobs
+
+
+def _safe_name(value):
+    return re.sub(r"[^A-Za-z0-9._-]", "_", str(value))
+
+
+def _resolve_input(ctx, bucket, value, prefix):
+    if not value or value.startswith("gs://"):
+        return value or ""
+    gcs_uri, _ = upload_file(ctx.storage_client, bucket, value, prefix)
+    return gcs_uri
+
+
+def _resolve_image(ctx, bucket, value, aspect_ratio, record, crop=IMAGE_CROP_TO_ASPECT):
+    """Like ``_resolve_input`` for frames: local images are downscaled/re-encoded first. Returns ``(gcs_uri, mime_type)``."""
+    if not value or value.startswith("gs://"):
+        return value or "", mimetypes.guess_type(value or "")[0] or "image/jpeg"
+    with open(value, "rb") as f:
+        payload, file_name, mime_type, prepared = prepare_upload(f.read(), os.path.basename(value), aspect_ratio, crop=crop)
+    if prepared:
+        record.setdefault("inputs", []).append({"path": value, "original_bytes": prepared.original_size, "bytes": len(prepared.data),
+                                                "size": f"{prepared.width}x{prepared.height}", "crop_box": prepared.crop_box,
+                                                "seconds": round(prepared.seconds, 3)})
+    gcs_uri, _, _ = upload_buffer(ctx.storage_client, bucket, payload, file_name, IMAGE_UPLOAD_GCS_PREFIX)
+    return gcs_uri, mime_type
+
+
+def _job_name(spec):
+    """File-safe, unique name of a job: its id, plus a short hash of the raw id when sanitizing changed it."""
+    raw = str(spec["id"])
+    name = _safe_name(raw)
+    return name if name == raw else f"{name}_{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _policy_overrides(ctx):
+    return {"deadline": ctx.poll_deadline} if ctx.poll_deadline else {}
+
+
+def resume_veo_job(run, stored, ctx):
+    """Takes over an operation an earlier run of this manifest submitted but did not finish; ``poll_veo_job`` completes it."""
+    run.record.update(target=stored["target"], resumed=True)
+    run.job = VeoBatchJob(stored["name"], stored["request"], operation_name=stored["operation_name"], store_id=stored["id"], target=stored["target"])
+    if not claim_job(stored["id"]):
+        run.job.error = f"Operation {stored['operation_name']} is still being polled by another process; not resubmitting it."
+    run.fetch_endpoint, run.output_dir = stored["fetch_endpoint"], stored["local_output_dir"] or ctx.output_dir
+    run.poll_policy = PollPolicy.for_parameters(stored["request"].get("parameters"), **_policy_overrides(ctx))
+    return run
+
+
+def restore_veo_job(run, stored, ctx):
+    """Returns the outputs an earlier run of this manifest already produced for the job, like a result cache hit."""
+    t0 = time.monotonic()
+    run.record.update(target=stored["target"], completed_earlier=True)
+    run.job = VeoBatchJob(stored["name"], stored["request"], operation_name=stored["operation_name"], target=stored["target"])
+    run.job.result = {"done": True, "response": {"videos": [{"gcsUri": uri} for uri in stored["output_uris"]]}}
+    try:
+        download_job_outputs(run.job, ctx.storage_client, stored["local_output_dir"] or ctx.output_dir, stored["local_files"])
+    except Exception as e:
+        run.job.error = f"Earlier result could not be fetched: {e}"
+    run.job.timings["restore"] = time.monotonic() - t0
+    return run
+
+
+def submit_veo_job(spec, ctx):
+    """Uploads a Veo job's inputs and starts its operation (unless it is cached, resumed or already done); never raises."""
+    run = VeoRun(spec, {"timings": {}}, time.monotonic())
+    try:
+        stored = (ctx.resumable or {}).get(_job_name(spec))
+        if stored:
+            return resume_veo_job(run, stored, ctx)
+        stored = (ctx.completed or {}).get(_job_name(spec))
+        if stored and not ctx.force_regenerate:
+            return restore_veo_job(run, stored, ctx)
+        model_url, output_subdir, defaults = VEO_KINDS[spec["kind"]]
+        target = (ctx.router or get_router(ctx.project_id, ctx.bucket)).next_target()
+        predict_endpoint, run.fetch_endpoint = target.endpoints(model_url)
+        run.record["target"], run.output_dir = target.label, ctx.output_dir
+
+        parameters = {**defaults, "storageUri": target.storage_uri(output_subdir), **spec.get("parameters", {})}
+        t0 = time.monotonic()
+        aspect_ratio = parameters.get("aspectRatio", "16:9")
+        crop = spec.get("crop", IMAGE_CROP_TO_ASPECT)
+        image_uri, image_mime = _resolve_image(ctx, target.bucket, spec.get("image"), aspect_ratio, run.record, crop)
+        last_frame_uri, last_frame_mime = _resolve_image(ctx, target.bucket, spec.get("last_frame"), aspect_ratio, run.record, crop)
+        video_uri = _resolve_input(ctx, target.bucket, spec.get("video"), VIDEO_UPLOAD_GCS_PREFIX)
+        run.record["timings"]["upload"] = time.monotonic() - t0
+
+        request_body = compose_veo_request(spec.get("prompt", ""), parameters, image_uri, video_uri, last_frame_uri, spec.get("camera_control", ""),
+                                           image_mime, last_frame_mime)
+        run.job = VeoBatchJob(_job_name(spec), request_body, target=target.label)
+        run.poll_policy = PollPolicy.for_parameters(parameters, **_policy_overrides(ctx))
+        if not (ctx.use_cache and resolve_from_cache(run.job, predict_endpoint, ctx.storage_client, ctx.output_dir, ctx.force_regenerate)):
+            submit_job(run.job, predict_endpoint, run.fetch_endpoint, ctx.output_dir, kind=spec["kind"], priority=PRIORITY_BATCH, origin=ctx.origin)
+    except Exception as e:
+        run.record["error"] = str(e)
+    return run
+
+
+def poll_veo_job(run, ctx):
+    """Polls a submitted job until it finishes and downloads its samples; never raises."""
+    if run.needs_polling:
+        complete_job(run.job, run.fetch_endpoint, ctx.storage_client, run.output_dir, run.poll_policy, PRIORITY_BATCH)
+    return run
+
+
+def _job_record(spec, record, started):
+    record = {"id": spec["id"], "kind": spec["kind"], "status": "failed" if record.get("error") else "succeeded", **record}
+    record["timings"]["total"] = time.monotonic() - started
+    return record
+
+
+def veo_run_record(run):
+    """Result record of a finished (or failed) ``VeoRun``."""
+    job, record = run.job, run.record
+    if job:
+        record["timings"].update(job.timings)
+        record.update(operation_name=job.operation_name, output_uris=extract_video_uris(job.result),
+                      local_files=job.local_files, cached=job.cached, error=job.error)
+    return _job_record(run.spec, record, run.started)
+
+
+def run_lyria_job(spec, ctx):
+    """Runs a Lyria job; its samples (and ``prompts``, if given) are fanned out over concurrent predict calls."""
+    record = {"timings": {}, "output_uris": [], "local_files": []}
+    prompts = spec.get("prompts") or [spec.get("prompt", "")]
+    calls = plan_lyria_calls(prompts, spec.get("negative_prompt", ""), spec.get("sample_count", 4))
+    music_dir = os.path.join(ctx.output_dir, MUSIC_OUTPUT_SUBDIR)
+    t0 = time.monotonic()
+    errors = []
+    for call in iter_lyria_batch(ctx.lyria_project_id, calls, music_dir, spec.get("concurrency", LYRIA_MAX_CONCURRENCY), PRIORITY_BATCH):
+        record["timings"].setdefault("calls", []).append(round(call.latency, 3))
+        if call.error:
+            errors.append(call.error)
+        record["local_files"].extend(call.samples)
+    record["timings"]["predict"] = time.monotonic() - t0
+    record["error"] = None if record["local_files"] else ("; ".join(errors) or "Lyria returned no audio samples.")
+    if errors and record["local_files"]:
+        record["partial_errors"] = errors
+    return record
+
+
+def run_manifest_job(spec, ctx):
+    """Runs one manifest job to completion and returns its result record; never raises."""
+    if spec["kind"] != "lyria":
+        return veo_run_record(poll_veo_job(submit_veo_job(spec, ctx), ctx))
+    started = time.monotonic()
+    try:
+        record = run_lyria_job(spec, ctx)
+    except Exception as e:
+        record = {"error": str(e), "timings": {}}
+    return _job_record(spec, record, started)
+
+
+def run_manifest(jobs, ctx, concurrency):
+    """Runs ``jobs`` on ``concurrency`` workers and yields records as they finish.
+
+    Veo submissions are queued first; each submitted job is queued again for
+    polling, behind the Lyria jobs, like ``veo_batch.run_veo_batch`` does.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        pending = {executor.submit(submit_veo_job, spec, ctx) for spec in jobs if spec["kind"] != "lyria"}
+        pending |= {executor.submit(run_manifest_job, spec, ctx) for spec in jobs if spec["kind"] == "lyria"}
+        polling = set()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if not isinstance(result, VeoRun):
+                    yield result
+                elif future not in polling and result.needs_polling:
+                    poll_future = executor.submit(poll_veo_job, result, ctx)
+                    polling.add(poll_future)
+                    pending.add(poll_future)
+                else:
+                    yield veo_run_record(result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Veo/Lyria jobs from a JSONL manifest without Streamlit.")
+    parser.add_argument("manifest", help="Path to the JSONL job manifest.")
+    parser.add_argument("--results", default="batch_results.jsonl", help="Results JSONL to append to (default: %(default)s).")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_RUNNER_CONCURRENCY", "8")), help="Jobs in flight at once (default: %(default)s).")
+    parser.add_argument("--project", default=os.getenv("DEFAULT_PROJECT_ID", "veo-testing"), help="Veo project ID.")
+    parser.add_argument("--lyria-project", default=os.getenv("DEFAULT_LYRIA_PROJECT_ID", "music-generation-434117"), help="Lyria project ID.")
+    parser.add_argument("--bucket", default=os.getenv("DEFAULT_OUTPUT_GCS_BUCKET", "fk-test-veo"), help="GCS bucket for inputs and outputs.")
+    parser.add_argument("--output-dir", default=os.getenv("DEFAULT_LOCAL_OUTPUT_DIR", "Output"), help="Local directory for downloaded outputs.")
+    parser.add_argument("--poll-deadline", type=float, default=None, help="Per-job polling deadline in seconds.")
+    parser.add_argument("--use-cache", action="store_true", help="Reuse cached results for fixed-seed jobs.")
+    parser.add_argument("--force-regenerate", action="store_true",
+                        help="Submit jobs an earlier run of this manifest already completed; with --use-cache, also regenerate and overwrite cached results.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    jobs = load_manifest(args.manifest)
+    storage_client = storage.Client(project=args.project, credentials=get_token_provider().get_credentials(refresh=False))
+    ctx = RunnerContext(args.project, args.lyria_project, args.bucket, args.output_dir, storage_client, args.poll_deadline,
+                        args.use_cache, args.force_regenerate, get_router(args.project, args.bucket),
+                        origin=f"batch:{os.path.abspath(args.manifest)}")
+    ctx.resumable = {stored["name"]: stored for stored in get_job_store().unfinished(ctx.origin)}
+    ctx.completed = {stored["name"]: stored for stored in get_job_store().succeeded(ctx.origin)}
+    if ctx.resumable:
+        logger.info("Resuming %d unfinished operation(s) from an earlier run of this manifest", len(ctx.resumable))
+    if ctx.completed:
+        logger.info("%d job(s) already succeeded in an earlier run of this manifest; their outputs are reused", len(ctx.completed))
+    logger.info("Running %d job(s) from %s with concurrency %d on %s", len(jobs), args.manifest, args.concurrency,
+                ", ".join(f"{t.label} (weight {t.weight:g})" for t in ctx.router.targets))
+
+    failed = 0
+    with open(args.results, "a", encoding="utf-8") as results_file:
+        for record in run_manifest(jobs, ctx, args.concurrency):
+            results_file.write(json.dumps(record) + "\n")
+            results_file.flush()
+            failed += record["status"] == "failed"
+            logger.info("%s %s (%s) in %.1fs%s", record["id"], record["status"], record["kind"], record["timings"]["total"],
+                        f": {record['error']}" if record.get("error") else "")
+    logger.info("Done: %d succeeded, %d failed. Results in %s", len(jobs) - failed, failed, args.results)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
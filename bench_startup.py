@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Cold-start benchmark for the Streamlit hub: imports and the first script run.
+
+Usage:
+    python bench_startup.py --runs 5 --budget-ms 1000 --run-budget-ms 3000 --json startup.json
+
+Every run starts a fresh interpreter and imports the app's top-level modules
+(read from ``veo_streamlit_app.py``, in order, without running the app), timing
+how much each one adds. A second fresh interpreter then runs the whole script
+once with ``streamlit.testing.v1.AppTest``, as a browser's first page load
+would, so work done while rendering (clients built for the sidebar and so on)
+is measured too. Medians over the runs are reported. The script exits with
+status 1 when the median import total exceeds ``--budget-ms``
+(``STARTUP_BUDGET_MS``), the median first run exceeds ``--run-budget-ms``
+(``FIRST_RUN_BUDGET_MS``), or a heavy dependency that should only load on
+first use (``LAZY_MODULES``) is loaded by the imports or the first run.
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "veo_streamlit_app.py")
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1000"))
+FIRST_RUN_BUDGET_MS = float(os.getenv("FIRST_RUN_BUDGET_MS", "3000"))
+FIRST_RUN_TIMEOUT_S = float(os.getenv("FIRST_RUN_TIMEOUT_S", "60"))
+# Loaded by the tabs/features that need them, never at startup.
+LAZY_MODULES = ("moviepy.editor", "vertexai", "googleapiclient.discovery", "google_auth_oauthlib.flow", "PIL.Image")
+
+# Runs in the fresh interpreter: argv[1] is a JSON list of [module, [names imported from it]].
+_CHILD = """
+import importlib, json, sys, time
+timings = {}
+for module, names in json.loads(sys.argv[1]):
+    t0 = time.perf_counter()
+    imported = importlib.import_module(module)
+    for name in names:  # "from google.cloud import storage" imports a submodule
+        if not hasattr(imported, name):
+            importlib.import_module(module + "." + name)
+    timings[module] = (time.perf_counter() - t0) * 1000
+print(json.dumps({"timings": timings, "loaded": sorted(sys.modules)}))
+"""
+
+# Runs the whole app script once in the fresh interpreter: argv[1] is the app path, argv[2] the timeout.
+_CHILD_RUN = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+t0 = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=float(sys.argv[2]))
+app.run()
+elapsed = (time.perf_counter() - t0) * 1000
+print(json.dumps({"ms": elapsed, "exceptions": [e.message for e in app.exception], "loaded": sorted(sys.modules)}))
+"""
+
+
+def startup_modules(app_path=APP_PATH):
+    """Top-level imports of the app, in order, as ``[(module, [names imported from it])]``."""
+    with open(app_path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), app_path)
+    modules = {}
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                modules.setdefault(alias.name, [])
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.setdefault(node.module, []).extend(alias.name for alias in node.names)
+    return list(modules.items())
+
+
+def measure_once(modules, cwd):
+    out = subprocess.run([sys.executable, "-c", _CHILD, json.dumps(modules)], cwd=cwd, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure_first_run(app_path, timeout=FIRST_RUN_TIMEOUT_S):
+    out = subprocess.run([sys.executable, "-c", _CHILD_RUN, app_path, str(timeout)], cwd=os.path.dirname(app_path),
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(runs=5, app_path=APP_PATH, first_run=True):
+    """Returns ``{"modules": {name: median_ms}, "total_ms", "first_run_ms", "first_run_exceptions", "eager_lazy_modules"}``."""
+    modules = startup_modules(app_path)
+    cwd = os.path.dirname(app_path)
+    measure_once(modules, cwd)  # Warm-up: compiles .pyc files so every measured run is a cold *process* start.
+    samples = [measure_once(modules, cwd) for _ in range(max(1, runs))]
+    medians = {name: statistics.median(s["timings"][name] for s in samples) for name, _ in modules}
+    loaded = set(samples[-1]["loaded"])
+    result = {"modules": medians, "total_ms": statistics.median(sum(s["timings"].values()) for s in samples),
+              "first_run_ms": None, "first_run_exceptions": []}
+    if first_run:
+        run_samples = [measure_first_run(app_path) for _ in range(max(1, runs))]
+        result["first_run_ms"] = statistics.median(s["ms"] for s in run_samples)
+        result["first_run_exceptions"] = run_samples[-1]["exceptions"]
+        loaded |= set(run_samples[-1]["loaded"])
+    result["eager_lazy_modules"] = [name for name in LAZY_MODULES if name in loaded]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure (median is reported)")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="Maximum median total import time")
+    parser.add_argument("--run-budget-ms", type=float, default=FIRST_RUN_BUDGET_MS, help="Maximum median time of the first script run")
+    parser.add_argument("--imports-only", action="store_true", help="Skip the first script run (AppTest)")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to print")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.runs, first_run=not args.imports_only)
+    for name, ms in sorted(result["modules"].items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"{ms:9.1f} ms  {name}")
+    print(f"{result['total_ms']:9.1f} ms  total (budget {args.budget_ms:.0f} ms, median of {args.runs} runs)")
+    if result["first_run_ms"] is not None:
+        print(f"{result['first_run_ms']:9.1f} ms  first script run (budget {args.run_budget_ms:.0f} ms, median of {args.runs} runs)")
+        for message in result["first_run_exceptions"]:
+            print(f"  exception during the first run: {message}")
+    result["budget_ms"], result["run_budget_ms"] = args.budget_ms, args.run_budget_ms
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    failed = False
+    if result["total_ms"] > args.budget_ms:
+        print(f"FAIL: cold-start imports take {result['total_ms']:.0f} ms, over the {args.budget_ms:.0f} ms budget.")
+        failed = True
+    if result["first_run_ms"] is not None and result["first_run_ms"] > args.run_budget_ms:
+        print(f"FAIL: the first script run takes {result['first_run_ms']:.0f} ms, over the {args.run_budget_ms:.0f} ms budget.")
+        failed = True
+    if result["eager_lazy_modules"]:
+        print(f"FAIL: loaded at startup or by the first run but should be lazy: {', '.join(result['eager_lazy_modules'])}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""Word-by-word captions that render each word once.
+
+The Movie Creator reveals a clip's caption one word at a time. Building a new
+``TextClip(method='caption')`` for every prefix of the caption sends all the
+earlier words through ImageMagick again (O(n²) rendering) and stacks n
+overlays on every frame. Here the caption is rasterized one word at a time
+(one ImageMagick call per word), laid out once by greedy wrapping into a box
+``box_ratio`` of the clip width, exactly like ImageMagick's caption method,
+and blended onto the frames as a single overlay. The overlay of the currently
+revealed prefix is rebuilt only when another word appears, and only its last
+line is recomposed. Like the per-prefix captions, each line is centered and
+the block of revealed lines is centered in the frame. Word rasters are kept in
+the on-disk text raster cache, so later runs with the same captions and fonts
+skip ImageMagick entirely.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from text_raster_cache import get_text_raster_cache, text_raster_key
+
+
+@dataclass
+class WordRaster:
+    rgb: np.ndarray  # (h, w, 3) uint8
+    alpha: np.ndarray  # (h, w) float32 in [0, 1]
+
+    @property
+    def width(self):
+        return self.rgb.shape[1]
+
+    @property
+    def height(self):
+        return self.rgb.shape[0]
+
+    def to_rgba(self):
+        """``(h, w, 4)`` uint8 array, the form stored in the text raster cache."""
+        return np.dstack([self.rgb, np.round(self.alpha * 255).astype(np.uint8)])
+
+    @classmethod
+    def from_rgba(cls, rgba):
+        return cls(np.ascontiguousarray(rgba[..., :3]), rgba[..., 3].astype(np.float32) / 255)
+
+
+def render_text(text, font, fontsize=50, color="white", stroke_color="black", stroke_width=1):
+    """Renders ``text`` on one line with ImageMagick (``TextClip(method='label')``) and returns a ``WordRaster``."""
+    from moviepy.editor import TextClip  # Slow to import; only loaded when a caption is rendered
+
+    clip = TextClip(text, fontsize=fontsize, font=font, color=color, stroke_color=stroke_color,
+                    stroke_width=stroke_width, method="label")
+    try:
+        rgb = clip.get_frame(0).astype(np.uint8)
+        alpha = clip.mask.get_frame(0).astype(np.float32) if clip.mask is not None else np.ones(rgb.shape[:2], np.float32)
+    finally:
+        clip.close()
+    return WordRaster(rgb, alpha)
+
+
+def rasterize_text(text, font, fontsize=50, color="white", stroke_color="black", stroke_width=1):
+    """Like ``render_text``, but served from the on-disk text raster cache when this exact text was rendered before."""
+    key = text_raster_key(text, font, fontsize, color, stroke_color, stroke_width)
+    rgba = get_text_raster_cache().get_or_render(
+        key, lambda: render_text(text, font, fontsize, color, stroke_color, stroke_width).to_rgba())
+    return WordRaster.from_rgba(rgba)
+
+
+@dataclass
+class PlacedWord:
+    raster: WordRaster
+    line: int
+    x: int  # Offset from the start of its line
+
+
+def layout_words(rasters, space_width, box_width):
+    """Greedy wrap (as ImageMagick's caption does); returns ``(placed_words, line_widths)``.
+
+    Wrapping is prefix-stable: the first k words wrap the same way on their own
+    as within the whole caption, so one layout serves every revealed prefix.
+    """
+    placed, line_widths = [], []
+    line, x = 0, 0
+    for raster in rasters:
+        if placed and x > 0 and x + space_width + raster.width > box_width:
+            line_widths.append(x)
+            line, x = line + 1, 0
+        if x > 0:
+            x += space_width
+        placed.append(PlacedWord(raster, line, x))
+        x += raster.width
+    if placed:
+        line_widths.append(x)
+    return placed, line_widths
+
+
+def _blend_into(dst_rgb, dst_alpha, raster, x, y):
+    """Alpha-composites ``raster`` over the canvas at ``(x, y)``, clipped to the canvas."""
+    h, w = dst_alpha.shape
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(w, x + raster.width), min(h, y + raster.height)
+    if x1 <= x0 or y1 <= y0:
+        return
+    src_rgb = raster.rgb[y0 - y:y1 - y, x0 - x:x1 - x].astype(np.float32)
+    src_a = raster.alpha[y0 - y:y1 - y, x0 - x:x1 - x]
+    region_a = dst_alpha[y0:y1, x0:x1]
+    dst_rgb[y0:y1, x0:x1] = src_rgb * src_a[..., None] + dst_rgb[y0:y1, x0:x1] * (1 - src_a[..., None])
+    dst_alpha[y0:y1, x0:x1] = src_a + region_a * (1 - src_a)
+
+
+class WordByWordCaption:
+    """A caption laid out once whose words are revealed one at a time.
+
+    ``rasterize`` is called once per distinct word (plus once to measure a
+    space) with ``(text, font, fontsize, color, stroke_color, stroke_width)``.
+    """
+
+    def __init__(self, text, font, box_width, fontsize=50, color="white", stroke_color="black", stroke_width=1,
+                 rasterize=rasterize_text):
+        self.words = text.split()
+        self.box_width = int(box_width)
+        style = (font, fontsize, color, stroke_color, stroke_width)
+        rendered = {}
+        for word in self.words:
+            if word not in rendered:
+                rendered[word] = rasterize(word, *style)
+        rasters = [rendered[word] for word in self.words]
+        self.line_height = max((r.height for r in rasters), default=0)
+        # A space's advance: "x x" minus two "x"s (a lone space renders as nothing).
+        x_width = rendered["x"].width if "x" in rendered else rasterize("x", *style).width
+        self.space_width = max(0, rasterize("x x", *style).width - 2 * x_width) if len(self.words) > 1 else 0
+        self.placed, self.line_widths = layout_words(rasters, self.space_width, self.box_width)
+        self._lines_cache = (0, None, None)  # (complete lines, rgb, alpha) of the lines above the current one
+        self._state = (None, None)  # (revealed word count, overlay)
+
+    def _complete_lines(self, count):
+        """Canvas with the first ``count`` lines fully revealed; extended line by line as the reveal advances."""
+        done, rgb, alpha = self._lines_cache
+        if rgb is None or count < done:
+            done, rgb, alpha = 0, None, None
+        if rgb is None or rgb.shape[0] < count * self.line_height:
+            new_rgb = np.zeros((count * self.line_height, self.box_width, 3), np.float32)
+            new_alpha = np.zeros((count * self.line_height, self.box_width), np.float32)
+            if rgb is not None:
+                new_rgb[:rgb.shape[0]], new_alpha[:alpha.shape[0]] = rgb, alpha
+            rgb, alpha = new_rgb, new_alpha
+        for word in self.placed:
+            if done <= word.line < count:
+                offset = (self.box_width - self.line_widths[word.line]) // 2
+                _blend_into(rgb, alpha, word.raster, offset + word.x, word.line * self.line_height)
+        self._lines_cache = (count, rgb, alpha)
+        return rgb, alpha
+
+    def overlay(self, revealed):
+        """``(rgb, alpha)`` of the caption block with the first ``revealed`` words shown (None for none)."""
+        revealed = min(revealed, len(self.placed))
+        if revealed <= 0:
+            return None
+        if self._state[0] == revealed:
+            return self._state[1]
+        last = self.placed[revealed - 1]
+        lines_rgb, lines_alpha = self._complete_lines(last.line)
+        height = (last.line + 1) * self.line_height
+        rgb = np.zeros((height, self.box_width, 3), np.float32)
+        alpha = np.zeros((height, self.box_width), np.float32)
+        rgb[:lines_rgb.shape[0]], alpha[:lines_alpha.shape[0]] = lines_rgb, lines_alpha
+        # The line being revealed is centered on its partial width, as a caption of the prefix would be.
+        partial_width = last.x + last.raster.width
+        offset = (self.box_width - partial_width) // 2
+        for word in self.placed[:revealed]:
+            if word.line == last.line:
+                _blend_into(rgb, alpha, word.raster, offset + word.x, last.line * self.line_height)
+        self._state = (revealed, (rgb, alpha))
+        return rgb, alpha
+
+    def apply(self, clip, reveal_times):
+        """Returns ``clip`` with the caption blended in; word ``i`` appears at ``reveal_times[i]`` and stays."""
+        times = np.asarray(reveal_times, dtype=float)
+
+        def draw(get_frame, t):
+            frame = get_frame(t)
+            state = self.overlay(int(np.searchsorted(times, t, side="right")))
+            if state is None:
+                return frame
+            rgb, alpha = state
+            frame_h, frame_w = frame.shape[:2]
+            x, y = (frame_w - self.box_width) // 2, (frame_h - rgb.shape[0]) // 2
+            x0, y0 = max(0, x), max(0, y)
+            x1, y1 = min(frame_w, x + self.box_width), min(frame_h, y + rgb.shape[0])
+            if x1 <= x0 or y1 <= y0:
+                return frame
+            a = alpha[y0 - y:y1 - y, x0 - x:x1 - x, None]
+            out = frame.copy()
+            out[y0:y1, x0:x1] = (rgb[y0 - y:y1 - y, x0 - x:x1 - x] * a + frame[y0:y1, x0:x1] * (1 - a)).round().astype(frame.dtype)
+            return out
+
+        return clip.fl(draw)
+
+
+def add_word_by_word_caption(video_clip, text, font, fontsize=50, color="white", stroke_color="black", stroke_width=1,
+                             speed_factor=1.5, box_ratio=0.8, rasterize=rasterize_text):
+    """Reveals ``text`` word by word over ``video_clip``; words accumulate on screen.
+
+    Word ``i`` appears at ``i * duration / (n * speed_factor)``, so the whole
+    caption is shown before the clip ends.
+    """
+    caption = WordByWordCaption(text, font, video_clip.w * box_ratio, fontsize, color, stroke_color, stroke_width, rasterize)
+    if not caption.words:
+        return video_clip
+    duration_per_word = video_clip.duration / len(caption.words) / speed_factor
+    return caption.apply(video_clip, [i * duration_per_word for i in range(len(caption.words))])
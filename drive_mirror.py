@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""Background mirroring of generated outputs to a Google Drive folder.
+
+Files are handed to a shared worker pool and uploaded concurrently with
+resumable uploads of ``DRIVE_UPLOAD_CHUNK_SIZE`` bytes, so Drive no longer adds
+to the latency of a generation. A file already in the folder with the same
+name and MD5 is skipped. Upload session URIs are kept in SQLite, so an upload
+interrupted by a crash or restart continues from the last byte Drive received
+instead of starting over.
+"""
+import hashlib
+import mimetypes
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from google.auth.transport.requests import AuthorizedSession
+
+VEO_CACHE_DIR = os.getenv("VEO_CACHE_DIR", ".veo_cache")
+DRIVE_SESSION_STORE_PATH = os.getenv("DRIVE_SESSION_STORE_PATH", os.path.join(VEO_CACHE_DIR, "drive_uploads.sqlite3"))
+DRIVE_UPLOAD_WORKERS = int(os.getenv("DRIVE_UPLOAD_WORKERS", "4"))
+# Drive requires resumable chunks to be a multiple of 256 KiB.
+DRIVE_UPLOAD_CHUNK_SIZE = max(1, int(os.getenv("DRIVE_UPLOAD_CHUNK_SIZE", str(16 * 1024 * 1024))) // (256 * 1024)) * 256 * 1024
+DRIVE_UPLOAD_RETRIES = int(os.getenv("DRIVE_UPLOAD_RETRIES", "5"))
+
+
+@dataclass
+class DriveUploadResult:
+    path: str
+    file_id: str = None
+    link: str = None
+    skipped: bool = False  # Identical file (name + MD5) was already in the folder
+    resumed: bool = False
+    error: str = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def md5_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DriveSessionStore:
+    """Resumable upload session URIs of unfinished uploads, keyed by folder, path and MD5."""
+
+    def __init__(self, path=DRIVE_SESSION_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (folder_id TEXT, path TEXT, md5 TEXT, session_uri TEXT NOT NULL,"
+                         " updated_at REAL NOT NULL, PRIMARY KEY (folder_id, path, md5))")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, folder_id, path, md5):
+        with self._connect() as conn:
+            row = conn.execute("SELECT session_uri FROM sessions WHERE folder_id = ? AND path = ? AND md5 = ?", (folder_id, path, md5)).fetchone()
+        return row[0] if row else None
+
+    def put(self, folder_id, path, md5, session_uri):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (folder_id, path, md5, session_uri, updated_at) VALUES (?, ?, ?, ?, ?)",
+                         (folder_id, path, md5, session_uri, time.time()))
+
+    def delete(self, folder_id, path, md5):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE folder_id = ? AND path = ? AND md5 = ?", (folder_id, path, md5))
+
+
+class DriveMirror:
+    """Uploads files to Drive from a pool of workers, each with its own Drive service (they are not thread-safe)."""
+
+    def __init__(self, credentials, max_workers=DRIVE_UPLOAD_WORKERS, chunk_size=DRIVE_UPLOAD_CHUNK_SIZE, sessions=None):
+        self.credentials = credentials
+        self.chunk_size = chunk_size
+        self.sessions = sessions or DriveSessionStore()
+        self.recent = deque(maxlen=50)
+        self.in_flight = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="drive-mirror")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _service(self):
+        if getattr(self._local, "credentials", None) is not self.credentials:
+            from googleapiclient.discovery import build  # Slow to import; loaded by the first upload
+            self._local.service = build("drive", "v3", credentials=self.credentials, cache_discovery=False)
+            self._local.credentials = self.credentials
+        return self._local.service
+
+    def _find_existing(self, folder_id, name, md5):
+        escaped = name.replace("\\", "\\\\").replace("'", "\\'")
+        query = f"name = '{escaped}' and trashed = false" + (f" and '{folder_id}' in parents" if folder_id else "")
+        files = self._service().files().list(q=query, fields="files(id, webViewLink, md5Checksum)", pageSize=100).execute().get("files", [])
+        return next((f for f in files if f.get("md5Checksum") == md5), None)
+
+    def _resume_offset(self, session_uri, size):
+        """Asks Drive how far an interrupted session got; returns ``(offset, finished_file)`` or ``(None, None)`` if it expired."""
+        resp = AuthorizedSession(self.credentials).put(session_uri, headers={"Content-Range": f"bytes */{size}"}, timeout=30)
+        if resp.status_code in (200, 201):
+            return size, resp.json()
+        if resp.status_code == 308:
+            received = resp.headers.get("Range")  # e.g. "bytes=0-1048575"
+            return (int(received.rsplit("-", 1)[1]) + 1 if received else 0), None
+        return None, None
+
+    def upload(self, path, folder_id, file_name=None):
+        """Uploads one file synchronously (skipping or resuming where possible); never raises."""
+        t0 = time.monotonic()
+        result = DriveUploadResult(path)
+        try:
+            name = file_name or os.path.basename(path)
+            md5 = md5_file(path)
+            existing = self._find_existing(folder_id, name, md5)
+            if existing:
+                result.file_id, result.link, result.skipped = existing["id"], existing.get("webViewLink"), True
+                return result
+            from googleapiclient.http import MediaFileUpload
+            media = MediaFileUpload(path, mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream",
+                                    resumable=True, chunksize=self.chunk_size)
+            request = self._service().files().create(body={"name": name, "parents": [folder_id] if folder_id else []},
+                                                     media_body=media, fields="id, webViewLink")
+            response = None
+            session_uri = self.sessions.get(folder_id, path, md5)
+            if session_uri:
+                offset, response = self._resume_offset(session_uri, media.size())
+                if offset is not None and response is None:
+                    request.resumable_uri, request.resumable_progress = session_uri, offset
+                    result.resumed = True
+            while response is None:
+                _, response = request.next_chunk(num_retries=DRIVE_UPLOAD_RETRIES)
+                if request.resumable_uri and request.resumable_uri != session_uri:
+                    session_uri = request.resumable_uri
+                    self.sessions.put(folder_id, path, md5, session_uri)
+            self.sessions.delete(folder_id, path, md5)
+            result.file_id, result.link = response.get("id"), response.get("webViewLink")
+        except Exception as e:
+            result.error = str(e)
+        finally:
+            result.seconds = time.monotonic() - t0
+        return result
+
+    def _upload_tracked(self, path, folder_id):
+        try:
+            result = self.upload(path, folder_id)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        with self._lock:
+            self.recent.appendleft(result)
+        return result
+
+    def recent_results(self, n=10):
+        """The latest ``n`` upload results, newest first (copied under the lock the workers append with)."""
+        with self._lock:
+            return list(self.recent)[:n]
+
+    def mirror(self, paths, folder_id):
+        """Queues ``paths`` for upload and returns their futures without waiting."""
+        paths = [p for p in paths if p and os.path.exists(p)]
+        with self._lock:
+            self.in_flight += len(paths)
+        return [self._executor.submit(self._upload_tracked, path, folder_id) for path in paths]
+
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def get_drive_mirror(credentials):
+    """Returns the process-wide ``DriveMirror``, switched to the latest ``credentials``."""
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = DriveMirror(credentials)
+        else:
+            _mirror.credentials = credentials
+        return _mirror
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""ffprobe/ffmpeg helpers for stitching clips without re-encoding.
+
+Veo clips from one model share codec, resolution, frame rate and pixel
+format, so they can be joined with ffmpeg's concat demuxer in stream-copy
+mode: packets are copied as they are, which takes seconds instead of a full
+decode and libx264 encode. ``probe_media`` reads each clip's stream
+parameters with ffprobe and ``concat_incompatibility`` says why a set of clips
+cannot be copied (``None`` when they can). Binaries come from
+``FFMPEG_BINARY``/``FFPROBE_BINARY``, then ``PATH``; ffmpeg falls back to the
+copy bundled with imageio-ffmpeg (the one MoviePy uses).
+"""
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from dataclasses import dataclass
+
+FFMPEG_TIMEOUT_SECONDS = float(os.getenv("FFMPEG_TIMEOUT_SECONDS", "600"))
+
+# Stream parameters that must match for the concat demuxer to copy packets.
+VIDEO_COPY_FIELDS = ("codec_name", "profile", "width", "height", "pix_fmt", "r_frame_rate", "time_base")
+AUDIO_COPY_FIELDS = ("codec_name", "sample_rate", "channels")
+
+
+class FFmpegError(RuntimeError):
+    """ffmpeg/ffprobe is missing or exited with an error."""
+
+
+def ffmpeg_binary():
+    binary = os.getenv("FFMPEG_BINARY") or shutil.which("ffmpeg")
+    if binary and binary != "ffmpeg-imageio":
+        return binary
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception as e:
+        raise FFmpegError(f"ffmpeg not found: {e}") from e
+
+
+def ffprobe_binary():
+    binary = os.getenv("FFPROBE_BINARY") or shutil.which("ffprobe")
+    if not binary:
+        raise FFmpegError("ffprobe not found (install ffmpeg or set FFPROBE_BINARY)")
+    return binary
+
+
+def _run(cmd):
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=FFMPEG_TIMEOUT_SECONDS)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise FFmpegError(f"{os.path.basename(cmd[0])} failed: {e}") from e
+    if result.returncode != 0:
+        raise FFmpegError(f"{os.path.basename(cmd[0])} exited with {result.returncode}: {result.stderr.strip()[-2000:]}")
+    return result.stdout
+
+
+@dataclass
+class MediaInfo:
+    path: str
+    duration: float
+    video: dict  # First video stream as reported by ffprobe; None if there is none
+    audio: dict  # First audio stream, or None
+
+    @property
+    def video_signature(self):
+        return tuple(self.video.get(field) for field in VIDEO_COPY_FIELDS) if self.video else None
+
+    @property
+    def audio_signature(self):
+        return tuple(self.audio.get(field) for field in AUDIO_COPY_FIELDS) if self.audio else None
+
+
+def probe_media(path):
+    """Returns the ``MediaInfo`` of ``path``; raises ``FFmpegError`` if ffprobe cannot read it."""
+    out = _run([ffprobe_binary(), "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path])
+    data = json.loads(out or "{}")
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    duration = float(data.get("format", {}).get("duration") or (video or {}).get("duration") or 0)
+    return MediaInfo(path, duration, video, audio)
+
+
+def concat_incompatibility(infos, ignore_audio=False):
+    """Reason the clips cannot be joined by stream copy, or None if they can.
+
+    With ``ignore_audio`` (the clips' audio is replaced by a music track) only
+    the video streams have to match.
+    """
+    if not infos:
+        return "no clips"
+    first = infos[0]
+    for info in infos:
+        name = os.path.basename(info.path)
+        if not info.video:
+            return f"{name} has no video stream"
+        for field, a, b in zip(VIDEO_COPY_FIELDS, first.video_signature, info.video_signature):
+            if a != b:
+                return f"{name} differs in {field} ({b} vs {a})"
+        if not ignore_audio and info.audio_signature != first.audio_signature:
+            return f"{name} differs in its audio stream ({info.audio_signature} vs {first.audio_signature})"
+    return None
+
+
+def _concat_list_line(path):
+    return "file '" + os.path.abspath(path).replace("'", "'\\''") + "'\n"
+
+
+def concat_stream_copy(paths, output_path, audio_path=None, duration=None):
+    """Joins ``paths`` into ``output_path`` with the concat demuxer, copying every video packet.
+
+    With ``audio_path`` the clips' own audio is dropped and that track is
+    muxed in instead, encoded to AAC and cut at ``duration`` seconds (the
+    movie's length). Without it the clips' audio is copied too.
+    """
+    fd, list_path = tempfile.mkstemp(prefix="concat_", suffix=".txt", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.writelines(_concat_list_line(path) for path in paths)
+        cmd = [ffmpeg_binary(), "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path]
+        if audio_path:
+            cmd += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy", "-c:a", "aac"]
+            if duration:
+                cmd += ["-t", f"{duration:.3f}"]
+        else:
+            cmd += ["-map", "0", "-c", "copy"]
+        _run(cmd + ["-movflags", "+faststart", output_path])
+    finally:
+        os.remove(list_path)
+    return output_path
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Process-wide, expiry-aware cache for the Application Default Credentials token.
+
+Every Vertex AI call (Veo predict/fetch, Lyria, the Gemini prompt builder) and
+the GCS clients share one credentials object. The token is only refreshed when
+it is missing or within ``TOKEN_REFRESH_MARGIN_SECONDS`` of expiry, instead of
+once per request.
+"""
+import datetime
+import os
+import threading
+
+import google.auth
+from google.auth.transport.requests import Request as GoogleAuthRequest
+
+CLOUD_PLATFORM_SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
+TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+
+
+class CachedTokenProvider:
+    """Thread-safe holder of one ADC credentials object that refreshes shortly before expiry."""
+
+    def __init__(self, scopes=None, refresh_margin_seconds=TOKEN_REFRESH_MARGIN_SECONDS):
+        self.scopes = scopes or CLOUD_PLATFORM_SCOPES
+        self.refresh_margin = datetime.timedelta(seconds=refresh_margin_seconds)
+        self.refresh_count = 0
+        self._credentials = None
+        self._project = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._credentials is None:
+            self._credentials, self._project = google.auth.default(scopes=self.scopes)
+
+    def _needs_refresh(self):
+        creds = self._credentials
+        if not creds.token:
+            return True
+        if creds.expiry is None:
+            return False
+        # google-auth stores expiry as a naive UTC datetime.
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now < self.refresh_margin
+
+    def get_credentials(self, refresh=True):
+        """Returns the shared credentials, refreshing the token first if it is close to expiry.
+
+        Pass ``refresh=False`` when handing the credentials to a client library
+        that refreshes on its own (GCS, Vertex AI SDK); they still share the token.
+        """
+        with self._lock:
+            self._load()
+            if refresh and self._needs_refresh():
+                self._credentials.refresh(GoogleAuthRequest())
+                self.refresh_count += 1
+            return self._credentials
+
+    def get_token(self):
+        return self.get_credentials().token
+
+    def auth_headers(self):
+        return {"Authorization": f"Bearer {self.get_token()}"}
+
+    @property
+    def project(self):
+        with self._lock:
+            self._load()
+            return self._project
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_token_provider():
+    """Returns the process-wide ``CachedTokenProvider``."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = CachedTokenProvider()
+        return _provider
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""Streamlit-free Google Cloud Storage helpers shared by the tabs and the batch tools.
+
+Uploads are content-addressed: an input is stored as ``<prefix><sha256><ext>``,
+so re-running the same image, frame or source video with a new prompt or seed
+reuses the object that is already in the bucket instead of uploading it again.
+A local SQLite index of known objects avoids even the existence check for
+recently seen hashes. Files uploaded through Streamlit are hashed and streamed
+straight from their in-memory buffer into a resumable upload, without a temp
+file, sending at most ``GCS_UPLOAD_CHUNK_SIZE`` bytes per request.
+
+Downloads fetch all samples of an operation at once; large objects are split
+into byte ranges fetched in parallel, and every file is verified against the
+object's CRC32C before it is moved into place.
+"""
+import base64
+import hashlib
+import io
+import mimetypes
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import google_crc32c
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+VEO_CACHE_DIR = os.getenv("VEO_CACHE_DIR", ".veo_cache")
+GCS_UPLOAD_INDEX_PATH = os.getenv("GCS_UPLOAD_INDEX_PATH", os.path.join(VEO_CACHE_DIR, "gcs_uploads.sqlite3"))
+# Index entries older than this are re-checked against the bucket (objects may be deleted by lifecycle rules).
+GCS_UPLOAD_INDEX_TTL_SECONDS = float(os.getenv("GCS_UPLOAD_INDEX_TTL_SECONDS", str(24 * 3600)))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Resumable upload chunk size; GCS requires a multiple of 256 KiB.
+GCS_UPLOAD_CHUNK_SIZE = max(1, int(os.getenv("GCS_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024))) // (256 * 1024)) * 256 * 1024
+
+GCS_DOWNLOAD_WORKERS = int(os.getenv("GCS_DOWNLOAD_WORKERS", "8"))
+GCS_DOWNLOAD_CHUNK_SIZE = int(os.getenv("GCS_DOWNLOAD_CHUNK_SIZE", str(16 * 1024 * 1024)))
+# Objects at least this large are fetched as parallel byte ranges; smaller ones in a single request.
+GCS_RANGED_DOWNLOAD_THRESHOLD = int(os.getenv("GCS_RANGED_DOWNLOAD_THRESHOLD", str(32 * 1024 * 1024)))
+
+
+def parse_gcs_uri(gcs_uri):
+    """Splits ``gs://bucket/path/to/blob`` into ``(bucket, blob_name)``."""
+    if not gcs_uri or not gcs_uri.startswith("gs://"):
+        raise ValueError(f"Not a GCS URI: {gcs_uri!r}")
+    parts = gcs_uri[5:].split("/", 1)
+    return parts[0], parts[1] if len(parts) > 1 else ""
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sha256_buffer(buffer):
+    view = memoryview(buffer).cast("B")
+    digest = hashlib.sha256()
+    for start in range(0, len(view), HASH_CHUNK_SIZE):
+        digest.update(view[start:start + HASH_CHUNK_SIZE])
+    return digest.hexdigest()
+
+
+class MemoryviewReader(io.RawIOBase):
+    """Seekable read-only file object over a buffer that does not copy it (``io.BytesIO`` would)."""
+
+    def __init__(self, buffer):
+        super().__init__()
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self._view[self._pos:self._pos + len(b)]
+        b[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def content_addressed_blob_name(prefix, sha256_hex, extension):
+    return f"{prefix}{sha256_hex}{(extension or '').lower()}"
+
+
+class UploadIndex:
+    """Local record of ``gs://`` objects known to exist, keyed by bucket and blob name."""
+
+    def __init__(self, path=GCS_UPLOAD_INDEX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS uploads (bucket TEXT, blob TEXT, size INTEGER, verified_at REAL, PRIMARY KEY (bucket, blob))")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def is_known(self, bucket_name, blob_name, max_age=GCS_UPLOAD_INDEX_TTL_SECONDS):
+        with self._connect() as conn:
+            row = conn.execute("SELECT verified_at FROM uploads WHERE bucket = ? AND blob = ?", (bucket_name, blob_name)).fetchone()
+        return bool(row) and time.time() - row[0] < max_age
+
+    def add(self, bucket_name, blob_name, size=None):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO uploads (bucket, blob, size, verified_at) VALUES (?, ?, ?, ?)",
+                         (bucket_name, blob_name, size, time.time()))
+
+
+_upload_index = None
+_upload_index_lock = threading.Lock()
+
+
+def get_upload_index():
+    global _upload_index
+    with _upload_index_lock:
+        if _upload_index is None:
+            _upload_index = UploadIndex()
+        return _upload_index
+
+
+def _upload_if_missing(storage_client, bucket_name, blob_name, size, upload):
+    index = get_upload_index()
+    if index.is_known(bucket_name, blob_name):
+        return False
+    blob = storage_client.bucket(bucket_name).blob(blob_name, chunk_size=GCS_UPLOAD_CHUNK_SIZE)
+    if blob.exists():
+        index.add(bucket_name, blob_name, size)
+        return False
+    try:
+        # if_generation_match=0 turns a concurrent upload of the same content into a no-op.
+        upload(blob)
+        uploaded = True
+    except PreconditionFailed:
+        uploaded = False
+    index.add(bucket_name, blob_name, size)
+    return uploaded
+
+
+def upload_file_to_blob(storage_client, bucket_name, source_file_path, blob_name, content_type=None):
+    """Uploads ``source_file_path`` to ``blob_name`` unless the object already exists.
+
+    Returns True when bytes were actually sent. Meant for content-addressed
+    names, where an existing object is by definition identical.
+    """
+    return _upload_if_missing(storage_client, bucket_name, blob_name, os.path.getsize(source_file_path),
+                              lambda blob: blob.upload_from_filename(source_file_path, content_type=content_type, if_generation_match=0))
+
+
+def upload_buffer_to_blob(storage_client, bucket_name, buffer, blob_name, content_type=None):
+    """Like ``upload_file_to_blob`` for an in-memory buffer (bytes, ``memoryview``, ``UploadedFile.getbuffer()``)."""
+    reader = MemoryviewReader(buffer)
+    size = memoryview(buffer).nbytes
+    return _upload_if_missing(storage_client, bucket_name, blob_name, size,
+                              lambda blob: blob.upload_from_file(reader, size=size, content_type=content_type, if_generation_match=0))
+
+
+def upload_file(storage_client, bucket_name, source_file_path, destination_blob_name_prefix=""):
+    """Uploads a local file as ``<prefix><sha256><ext>`` (skipped if present) and returns ``(gcs_uri, mime_type)``."""
+    mime_type = mimetypes.guess_type(source_file_path)[0] or 'application/octet-stream'
+    blob_name = content_addressed_blob_name(destination_blob_name_prefix, sha256_file(source_file_path), os.path.splitext(source_file_path)[1])
+    upload_file_to_blob(storage_client, bucket_name, source_file_path, blob_name, mime_type)
+    return f"gs://{bucket_name}/{blob_name}", mime_type
+
+
+def upload_buffer(storage_client, bucket_name, buffer, file_name, destination_blob_name_prefix=""):
+    """Uploads an in-memory file as ``<prefix><sha256><ext>`` and returns ``(gcs_uri, mime_type, uploaded)``."""
+    mime_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+    blob_name = content_addressed_blob_name(destination_blob_name_prefix, sha256_buffer(buffer), os.path.splitext(file_name)[1])
+    uploaded = upload_buffer_to_blob(storage_client, bucket_name, buffer, blob_name, mime_type)
+    return f"gs://{bucket_name}/{blob_name}", mime_type, uploaded
+
+
+class DownloadChecksumError(Exception):
+    pass
+
+
+@dataclass
+class DownloadResult:
+    gcs_uri: str
+    path: str
+    size: int = 0
+    seconds: float = 0.0
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def crc32c_file(path):
+    """Returns the base64 big-endian CRC32C of a file, the format of ``Blob.crc32c``."""
+    checksum = google_crc32c.Checksum()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            checksum.update(chunk)
+    return base64.b64encode(checksum.digest()).decode("ascii")
+
+
+def _download_ranges(bucket, blob, path, chunk_size, max_workers):
+    with open(path, "wb") as f:
+        f.truncate(blob.size)
+
+    def fetch(start):
+        # A blob object per range (pinned to the generation we sized) keeps the workers independent.
+        part = bucket.blob(blob.name, generation=blob.generation)
+        data = part.download_as_bytes(start=start, end=min(start + chunk_size, blob.size) - 1, checksum=None)
+        with open(path, "r+b") as f:
+            f.seek(start)
+            f.write(data)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(fetch, range(0, blob.size, chunk_size)))
+
+
+def download_gcs_uri(storage_client, gcs_uri, destination_file_name, chunk_size=GCS_DOWNLOAD_CHUNK_SIZE,
+                     max_workers=GCS_DOWNLOAD_WORKERS, ranged_threshold=GCS_RANGED_DOWNLOAD_THRESHOLD):
+    """Downloads one object to ``destination_file_name``, verifying its CRC32C, and returns a ``DownloadResult``.
+
+    The data is written to a ``.part`` file first, so a failed or corrupt
+    download never leaves a truncated file under the final name.
+    """
+    t0 = time.monotonic()
+    bucket_name, blob_name = parse_gcs_uri(gcs_uri)
+    bucket = storage_client.bucket(bucket_name)
+    blob = bucket.get_blob(blob_name)
+    if blob is None:
+        raise NotFound(f"{gcs_uri} does not exist")
+    os.makedirs(os.path.dirname(destination_file_name) or ".", exist_ok=True)
+    partial_path = destination_file_name + ".part"
+    try:
+        if blob.size and blob.size >= ranged_threshold and max_workers > 1:
+            _download_ranges(bucket, blob, partial_path, chunk_size, max_workers)
+        else:
+            blob.download_to_filename(partial_path, checksum=None)
+        if blob.crc32c and crc32c_file(partial_path) != blob.crc32c:
+            raise DownloadChecksumError(f"CRC32C mismatch for {gcs_uri}")
+        os.replace(partial_path, destination_file_name)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return DownloadResult(gcs_uri, destination_file_name, blob.size or 0, time.monotonic() - t0)
+
+
+def download_gcs_uris(storage_client, downloads, max_workers=GCS_DOWNLOAD_WORKERS):
+    """Downloads ``(gcs_uri, destination)`` pairs concurrently; returns ``DownloadResult``s in input order.
+
+    Failures are reported in ``DownloadResult.error`` rather than raised.
+    """
+    def fetch(item):
+        gcs_uri, destination = item
+        try:
+            return download_gcs_uri(storage_client, gcs_uri, destination)
+        except Exception as e:
+            return DownloadResult(gcs_uri, destination, error=str(e))
+
+    downloads = list(downloads)
+    if not downloads:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(downloads)))) as executor:
+        return list(executor.map(fetch, downloads))
+
+
+def describe_downloads(results, elapsed):
+    """One-line throughput summary, e.g. ``4 file(s), 52.3 MB in 3.1s (16.9 MB/s)``."""
+    total_mb = sum(r.size for r in results if r.ok) / 1e6
+    return f"{sum(r.ok for r in results)} file(s), {total_mb:.1f} MB in {elapsed:.1f}s ({total_mb / max(elapsed, 1e-6):.1f} MB/s)"
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Shared keep-alive HTTP transport for the Vertex AI endpoints and media downloads.
+
+One pooled ``requests.Session`` is reused process-wide, so concurrent predict,
+fetch and Lyria calls ride on warm TLS connections instead of doing a new
+handshake per request. Every request gets connect/read timeouts. Setting
+``HTTP2_ENABLED=true`` routes JSON API calls through ``httpx`` over HTTP/2 when
+``httpx[http2]`` is installed; errors are always surfaced as
+``requests.exceptions`` so callers handle both transports the same way.
+"""
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # Optional dependency, only needed for HTTP/2.
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "120"))
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))  # Number of per-host pools kept
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))  # Connections kept per host
+# Per-host overrides, e.g. "us-central1-aiplatform.googleapis.com=64,storage.googleapis.com=16"
+HTTP_HOST_POOL_SIZES = os.getenv("HTTP_HOST_POOL_SIZES", "")
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+DEFAULT_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+_session = None
+_http2_client = None
+_lock = threading.Lock()
+
+
+def parse_host_pool_sizes(spec):
+    """Parses ``"host=size,host=size"`` into a dict, ignoring malformed entries."""
+    sizes = {}
+    for item in (spec or "").split(","):
+        host, sep, size = item.strip().partition("=")
+        if sep and host and size.strip().isdigit():
+            sizes[host.strip()] = int(size)
+    return sizes
+
+
+def _build_session():
+    session = requests.Session()
+    default_adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+    session.mount("https://", default_adapter)
+    session.mount("http://", default_adapter)
+    # requests picks the longest matching prefix, so host mounts win over the defaults.
+    for host, size in parse_host_pool_sizes(HTTP_HOST_POOL_SIZES).items():
+        session.mount(f"https://{host}/", HTTPAdapter(pool_connections=1, pool_maxsize=size))
+    return session
+
+
+def get_http_session():
+    """Returns the process-wide pooled ``requests.Session``."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = _build_session()
+        return _session
+
+
+def _get_http2_client():
+    global _http2_client, HTTP2_ENABLED
+    with _lock:
+        if _http2_client is None and HTTP2_ENABLED:
+            try:
+                _http2_client = httpx.Client(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=HTTP_POOL_MAXSIZE, max_keepalive_connections=HTTP_POOL_MAXSIZE),
+                    timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                )
+            except Exception as e:  # httpx missing or installed without the h2 extra.
+                logger.warning("HTTP/2 unavailable, falling back to HTTP/1.1 keep-alive: %s", e)
+                HTTP2_ENABLED = False
+        return _http2_client
+
+
+def _post_json_http2(client, url, payload, headers, timeout):
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    try:
+        response = client.post(url, json=payload, headers=headers, timeout=httpx.Timeout(read, connect=connect))
+    except httpx.TimeoutException as e:
+        raise requests.exceptions.Timeout(str(e)) from e
+    except httpx.TransportError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+    if response.is_error:
+        raise requests.exceptions.HTTPError(f"{response.status_code} Error for url: {url}", response=response)
+    return response
+
+
+def post_json(url, payload, headers=None, timeout=DEFAULT_TIMEOUT, stream=False):
+    """POSTs ``payload`` as JSON over the shared transport and returns the (successful) response.
+
+    Raises ``requests.exceptions.HTTPError`` for 4xx/5xx responses and the usual
+    ``requests`` connection/timeout exceptions, whichever transport is used.
+    With ``stream`` the body is not read up front (always over the pooled
+    ``requests`` session); iterate ``iter_content`` and close the response.
+    """
+    client = _get_http2_client() if HTTP2_ENABLED and not stream else None
+    if client is not None:
+        return _post_json_http2(client, url, payload, headers, timeout)
+    response = get_http_session().post(url, json=payload, headers=headers, timeout=timeout, stream=stream)
+    if not response.ok:
+        response.content  # Read the error body so HTTPError.response.text is available after close
+        response.close()
+    response.raise_for_status()
+    return response
+
+
+def http_get(url, stream=False, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """GETs ``url`` over the pooled session (used for media downloads)."""
+    return get_http_session().get(url, stream=stream, timeout=timeout, **kwargs)
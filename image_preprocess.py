@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Prepares input images before they are uploaded to GCS or sent to Gemini.
+
+Originals straight from a phone or camera are often several megabytes of
+full-resolution pixels plus EXIF data that the models never use. Each image is
+opened with PIL to detect its real format (instead of trusting the file
+extension), rotated per its EXIF orientation, downscaled to fit the model's
+working resolution (never upscaled, aspect ratio kept) and re-encoded without
+metadata: JPEG for opaque images, PNG when there is transparency. If
+re-encoding an untouched JPEG or PNG without any EXIF, XMP, ICC or text
+metadata would only make it larger, the original bytes are kept. Cropping to the job's aspect ratio discards part of the frame,
+so it is opt-in (``IMAGE_CROP_TO_ASPECT=on`` or the tabs' checkbox) and the
+crop is reported. Set ``IMAGE_PREPROCESS=off`` to upload originals as-is.
+Uploads are read through a ``memoryview``, never copied.
+"""
+import io
+import mimetypes
+import os
+import time
+from dataclasses import dataclass
+
+from gcs_utils import MemoryviewReader
+
+IMAGE_PREPROCESS_ENABLED = os.getenv("IMAGE_PREPROCESS", "on").lower() not in ("off", "false", "0")
+IMAGE_CROP_TO_ASPECT = os.getenv("IMAGE_CROP_TO_ASPECT", "off").lower() in ("on", "true", "1")
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "90"))
+GEMINI_IMAGE_MAX_EDGE = int(os.getenv("GEMINI_IMAGE_MAX_EDGE", "1536"))
+# Veo works at 720p (or 1080p); larger inputs are downscaled by the service anyway.
+VEO_IMAGE_SIZES = {
+    ("16:9", "720p"): (1280, 720),
+    ("9:16", "720p"): (720, 1280),
+    ("16:9", "1080p"): (1920, 1080),
+    ("9:16", "1080p"): (1080, 1920),
+}
+
+_PASSTHROUGH_FORMATS = {"JPEG", "PNG"}
+# ``Image.info`` keys describing the encoding rather than carrying metadata; anything else rules out passthrough.
+_ENCODING_INFO_KEYS = {"dpi", "jfif", "jfif_version", "jfif_unit", "jfif_density", "progressive", "progression",
+                       "adobe", "adobe_transform", "gamma", "srgb", "interlace", "transparency", "aspect"}
+
+
+class ImagePreprocessError(ValueError):
+    """The bytes could not be decoded as an image."""
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_size: int
+    original_mime_type: str
+    original_width: int
+    original_height: int
+    seconds: float = 0.0
+    reencoded: bool = True
+    crop_box: tuple = None  # (left, top, right, bottom) kept from the oriented original, when center-cropped
+
+    @property
+    def extension(self):
+        return ".png" if self.mime_type == "image/png" else ".jpg"
+
+    def describe(self, name="image"):
+        after = f"{len(self.data) / 1e6:.2f} MB {self.mime_type} {self.width}x{self.height}" if self.reencoded else "kept original"
+        cropped = ""
+        if self.crop_box:
+            left, top, right, bottom = self.crop_box
+            cropped = f", center-cropped to {right - left}x{bottom - top} (box {left},{top}–{right},{bottom})"
+        return (f"{name}: {self.original_size / 1e6:.2f} MB {self.original_mime_type} {self.original_width}x{self.original_height}"
+                f" → {after}{cropped} in {self.seconds:.2f}s")
+
+
+def detect_image_mime(data):
+    """Returns the MIME type of the image in ``data`` from its content, or None if PIL cannot read it."""
+    from PIL import Image
+    try:
+        with Image.open(MemoryviewReader(data)) as image:
+            return Image.MIME.get(image.format)
+    except Exception:
+        return None
+
+
+def _has_alpha(image):
+    return image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def _center_crop_box(width, height, aspect):
+    """Box of the largest centered region with ``aspect``, or None if the image already has it."""
+    if abs(width / height - aspect) < 0.01:
+        return None
+    if width / height > aspect:
+        new_width = round(height * aspect)
+        left = (width - new_width) // 2
+        return left, 0, left + new_width, height
+    new_height = round(width / aspect)
+    top = (height - new_height) // 2
+    return 0, top, width, top + new_height
+
+
+def prepare_image(data, target_size=None, max_edge=None, crop=False):
+    """Detects, downscales (and optionally crops) and re-encodes ``data``; returns a ``PreparedImage``.
+
+    The image is fit within ``target_size`` ``(width, height)`` keeping its
+    aspect ratio; with ``crop`` it is first center-cropped to that aspect
+    ratio. ``max_edge`` only bounds the longer side. ``data`` may be any
+    buffer (bytes, ``memoryview``). Raises ``ImagePreprocessError`` for bytes
+    PIL cannot decode.
+    """
+    from PIL import Image, ImageOps  # Imported on first use to keep app startup fast
+
+    t0 = time.monotonic()
+    data_size = memoryview(data).nbytes
+    try:
+        image = Image.open(MemoryviewReader(data))
+        image.load()
+    except Exception as e:
+        raise ImagePreprocessError(f"Not a readable image: {e}") from e
+    original_format, original_size = image.format, image.size
+    original_mime = Image.MIME.get(original_format, "application/octet-stream")
+    # EXIF (GPS, orientation...), XMP, ICC and text chunks would survive in the original bytes.
+    has_metadata = bool(image.getexif()) or any(key not in _ENCODING_INFO_KEYS for key in image.info)
+
+    image = ImageOps.exif_transpose(image)
+    crop_box = None
+    if target_size:
+        crop_box = _center_crop_box(image.width, image.height, target_size[0] / target_size[1]) if crop else None
+        if crop_box:
+            image = image.crop(crop_box)
+        bound = target_size
+    else:
+        bound = (max_edge, max_edge) if max_edge else None
+    if bound and (image.width > bound[0] or image.height > bound[1]):
+        image.thumbnail(bound, Image.LANCZOS)
+    geometry_changed = image.size != original_size
+
+    out = io.BytesIO()
+    if _has_alpha(image):
+        image.convert("RGBA").save(out, format="PNG", optimize=True)
+        mime_type = "image/png"
+    else:
+        image.convert("RGB").save(out, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+        mime_type = "image/jpeg"
+    encoded = out.getvalue()
+
+    if not (geometry_changed or has_metadata) and original_format in _PASSTHROUGH_FORMATS and len(encoded) >= data_size:
+        return PreparedImage(data, original_mime, *original_size, data_size, original_mime, *original_size,
+                             time.monotonic() - t0, reencoded=False)
+    return PreparedImage(encoded, mime_type, image.width, image.height, data_size, original_mime, *original_size,
+                         time.monotonic() - t0, crop_box=crop_box)
+
+
+def prepare_for_veo(data, aspect_ratio="16:9", resolution="720p", crop=IMAGE_CROP_TO_ASPECT):
+    """Prepares a Veo input frame for ``aspect_ratio`` at ``resolution``; ``crop`` center-crops it to that aspect ratio."""
+    return prepare_image(data, target_size=VEO_IMAGE_SIZES.get((aspect_ratio, resolution), VEO_IMAGE_SIZES[("16:9", "720p")]), crop=crop)
+
+
+def prepare_for_gemini(data):
+    """Prepares an image for Gemini, keeping its aspect ratio."""
+    return prepare_image(data, max_edge=GEMINI_IMAGE_MAX_EDGE)
+
+
+def prepare_gemini_image(data, mime_type=None):
+    """Prepares an image for Gemini; returns ``(payload, mime_type, prepared)`` (originals when off or unreadable)."""
+    if IMAGE_PREPROCESS_ENABLED:
+        try:
+            prepared = prepare_for_gemini(data)
+            return prepared.data, prepared.mime_type, prepared
+        except ImagePreprocessError:
+            pass
+    return data, detect_image_mime(data) or mime_type or "image/png", None
+
+
+def prepare_upload(data, file_name, aspect_ratio="16:9", resolution="720p", crop=IMAGE_CROP_TO_ASPECT):
+    """Prepares a Veo input for upload; returns ``(payload, file_name, mime_type, prepared)``.
+
+    ``crop`` center-crops the frame to ``aspect_ratio`` (``prepared.crop_box``
+    says what was kept). With preprocessing off, or for bytes PIL cannot read,
+    the original bytes are returned with their detected (or guessed) MIME type
+    and ``prepared`` is None.
+    """
+    if IMAGE_PREPROCESS_ENABLED:
+        try:
+            prepared = prepare_for_veo(data, aspect_ratio, resolution, crop)
+            return prepared.data, os.path.splitext(file_name)[0] + prepared.extension, prepared.mime_type, prepared
+        except ImagePreprocessError:
+            pass
+    mime_type = detect_image_mime(data) or mimetypes.guess_type(file_name)[0] or "image/jpeg"
+    return data, file_name, mime_type, None
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""Durable SQLite record of submitted Veo jobs.
+
+Every submitted operation is written here with its request, fetch endpoint
+and output directory, and updated when it finishes. In-flight operations
+therefore survive Streamlit reruns, browser refreshes and container restarts:
+on startup the app resumes polling them instead of paying for a resubmission.
+
+The store is shared by every app process and ``batch_runner.py``, so the
+process polling a job holds a lease on it in the database (``owner`` is
+``host:pid``, renewed by a heartbeat thread every ``JOB_LEASE_SECONDS / 3``).
+Another process may only take a job over once its owner released it or the
+lease expired, i.e. the owner stopped or crashed. ``origin`` says who
+submitted a job (``app``, or ``batch:<manifest path>``), so each front end
+resumes its own jobs.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+VEO_CACHE_DIR = os.getenv("VEO_CACHE_DIR", ".veo_cache")
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(VEO_CACHE_DIR, "jobs.sqlite3"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+
+# Identifies this process as the owner of the jobs it polls.
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}"
+ORIGIN_APP = "app"
+
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    request_json TEXT NOT NULL,
+    fetch_endpoint TEXT NOT NULL,
+    operation_name TEXT NOT NULL,
+    local_output_dir TEXT,
+    target TEXT,
+    origin TEXT,
+    owner TEXT,
+    lease_expires_at REAL,
+    status TEXT NOT NULL,
+    output_uris TEXT,
+    local_files TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+
+class JobStore:
+    """Small SQLite-backed catalog of Veo operations; safe to use from several threads."""
+
+    def __init__(self, path=JOB_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            # Stores created before jobs were routed across targets / leased to a process
+            for column, column_type in (("target", "TEXT"), ("origin", "TEXT"), ("owner", "TEXT"), ("lease_expires_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps this usable from worker threads.
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:  # commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def record_submitted(self, name, kind, request, fetch_endpoint, operation_name, local_output_dir=None, target=None, origin=ORIGIN_APP):
+        """Stores a freshly submitted operation, leased to this process, and returns its job id.
+
+        ``target`` is the ``project/region`` it ran on. Call ``release`` (or
+        ``record_finished``) when this process stops polling it.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, name, kind, request_json, fetch_endpoint, operation_name, local_output_dir, target, origin, owner,"
+                " lease_expires_at, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, name, kind, json.dumps(request), fetch_endpoint, operation_name, local_output_dir, target, origin, OWNER_ID,
+                 now + JOB_LEASE_SECONDS, STATUS_RUNNING, now, now))
+        _hold(job_id)
+        return job_id
+
+    def record_finished(self, job_id, status, output_uris=None, local_files=None, error=None):
+        """Stores a job's terminal status; this also ends this process's lease on it."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, output_uris = ?, local_files = ?, error = ?, owner = NULL, lease_expires_at = NULL, updated_at = ?"
+                " WHERE id = ?",
+                (status, json.dumps(output_uris or []), json.dumps(local_files or []), error, time.time(), job_id))
+        _unhold(job_id)
+
+    def claim(self, job_id):
+        """Leases an unfinished job to this process; False if another lease on it is live (or it finished)."""
+        now = time.time()
+        with self._connect() as conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET owner = ?, lease_expires_at = ? WHERE id = ? AND status = ?"
+                " AND (owner IS NULL OR lease_expires_at IS NULL OR lease_expires_at < ?)",
+                (OWNER_ID, now + JOB_LEASE_SECONDS, job_id, STATUS_RUNNING, now)).rowcount == 1
+        if claimed:
+            _hold(job_id)
+        return claimed
+
+    def release(self, job_id):
+        """Gives up this process's lease so another process (or a later run) can resume the job."""
+        _unhold(job_id)
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET owner = NULL, lease_expires_at = NULL WHERE id = ? AND owner = ?", (job_id, OWNER_ID))
+
+    def renew(self, job_ids):
+        with self._connect() as conn:
+            conn.executemany("UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND owner = ?",
+                             [(time.time() + JOB_LEASE_SECONDS, job_id, OWNER_ID) for job_id in job_ids])
+
+    def unfinished(self, origin=ORIGIN_APP):
+        """Running jobs submitted by ``origin`` (rows from before origins were recorded count as the app's)."""
+        return self._query("SELECT * FROM jobs WHERE status = ? AND COALESCE(origin, ?) = ? ORDER BY created_at",
+                           (STATUS_RUNNING, ORIGIN_APP, origin))
+
+    def succeeded(self, origin=ORIGIN_APP):
+        """Jobs submitted by ``origin`` that finished successfully, oldest first."""
+        return self._query("SELECT * FROM jobs WHERE status = ? AND COALESCE(origin, ?) = ? ORDER BY created_at",
+                           (STATUS_SUCCEEDED, ORIGIN_APP, origin))
+
+    def recent(self, limit=20):
+        return self._query("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+
+    def _query(self, sql, params):
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job["request"] = json.loads(job.pop("request_json"))
+            job["output_uris"] = json.loads(job["output_uris"] or "[]")
+            job["local_files"] = json.loads(job["local_files"] or "[]")
+            jobs.append(job)
+        return jobs
+
+
+_store = None
+_store_lock = threading.Lock()
+# Jobs leased to this process; the heartbeat keeps their leases alive.
+_held = set()
+_heartbeat = None
+
+
+def get_job_store():
+    """Returns the process-wide ``JobStore``."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
+
+
+def _hold(job_id):
+    global _heartbeat
+    with _store_lock:
+        _held.add(job_id)
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_renew_leases, name="job-lease-heartbeat", daemon=True)
+            _heartbeat.start()
+
+
+def _unhold(job_id):
+    with _store_lock:
+        _held.discard(job_id)
+
+
+def _renew_leases():
+    while True:
+        time.sleep(JOB_LEASE_SECONDS / 3)
+        with _store_lock:
+            job_ids = list(_held)
+        if job_ids:
+            try:
+                get_job_store().renew(job_ids)
+            except sqlite3.Error:
+                pass  # Retried on the next beat, well before the lease runs out.
+
+
+def claim(job_id):
+    """Leases a stored job to this process; returns False if another process (or thread) is polling it."""
+    return get_job_store().claim(job_id)
+
+
+def release(job_id):
+    get_job_store().release(job_id)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""Adaptive polling for Vertex AI long-running operations.
+
+Instead of fetching every 10 seconds from the moment a job is submitted, the
+scheduler first sleeps for most of the expected generation time (derived from
+``durationSeconds`` and ``sampleCount``), then polls with exponentially growing,
+jittered intervals. Transient fetch failures (connection errors, timeouts,
+429/5xx) are retried, and an overall deadline bounds the wait.
+"""
+import os
+import random
+import time
+from dataclasses import dataclass
+
+import requests
+
+VEO_POLL_DEADLINE_SECONDS = float(os.getenv("VEO_POLL_DEADLINE_SECONDS", "1200"))
+# Rough model of Veo latency: fixed overhead + per generated second + per extra sample.
+VEO_EXPECTED_BASE_SECONDS = float(os.getenv("VEO_EXPECTED_BASE_SECONDS", "20"))
+VEO_EXPECTED_SECONDS_PER_VIDEO_SECOND = float(os.getenv("VEO_EXPECTED_SECONDS_PER_VIDEO_SECOND", "5"))
+VEO_EXPECTED_SECONDS_PER_EXTRA_SAMPLE = float(os.getenv("VEO_EXPECTED_SECONDS_PER_EXTRA_SAMPLE", "10"))
+# Fraction of the expected time to sleep before the first fetch.
+VEO_INITIAL_DELAY_FRACTION = float(os.getenv("VEO_INITIAL_DELAY_FRACTION", "0.7"))
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class OperationDeadlineExceeded(TimeoutError):
+    """Raised when an operation is still running at the polling deadline."""
+
+
+def estimate_generation_seconds(duration_seconds=8, sample_count=1):
+    """Returns the expected wall time of a Veo job for the given output length and sample count."""
+    duration_seconds = duration_seconds or 8
+    sample_count = sample_count or 1
+    return (VEO_EXPECTED_BASE_SECONDS
+            + VEO_EXPECTED_SECONDS_PER_VIDEO_SECOND * duration_seconds
+            + VEO_EXPECTED_SECONDS_PER_EXTRA_SAMPLE * (sample_count - 1))
+
+
+@dataclass
+class PollPolicy:
+    initial_delay: float = 10.0
+    min_interval: float = 5.0
+    max_interval: float = 30.0
+    multiplier: float = 1.5
+    jitter: float = 0.2  # +/- fraction applied to every interval
+    deadline: float = VEO_POLL_DEADLINE_SECONDS
+    max_transient_errors: int = 5  # consecutive failures tolerated before giving up
+
+    @classmethod
+    def for_parameters(cls, parameters, **overrides):
+        """Builds a policy whose initial delay matches the expected time for a Veo ``parameters`` dict."""
+        parameters = parameters or {}
+        expected = estimate_generation_seconds(parameters.get("durationSeconds"), parameters.get("sampleCount"))
+        overrides.setdefault("initial_delay", expected * VEO_INITIAL_DELAY_FRACTION)
+        return cls(**overrides)
+
+    def next_interval(self, interval):
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+def is_transient_error(error):
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code in TRANSIENT_STATUS_CODES
+    return False
+
+
+def poll_operation(fetch_fn, policy=None, on_poll=None, sleep=time.sleep, clock=time.monotonic):
+    """Calls ``fetch_fn()`` on the policy's schedule until it returns an operation with ``done``.
+
+    ``on_poll(attempt, elapsed_seconds, response, error)`` is called after every
+    unfinished fetch. Non-transient errors propagate immediately; transient
+    ones propagate once ``max_transient_errors`` happen in a row. Raises
+    ``OperationDeadlineExceeded`` if the deadline passes first.
+    """
+    policy = policy or PollPolicy()
+    start = clock()
+    wait = policy.initial_delay
+    interval = policy.min_interval
+    attempt = consecutive_errors = 0
+    while True:
+        remaining = policy.deadline - (clock() - start)
+        if remaining <= 0:
+            raise OperationDeadlineExceeded(f"Operation not done after {policy.deadline:.0f}s ({attempt} fetches).")
+        sleep(max(0.0, min(wait, remaining)))
+        attempt += 1
+        response = error = None
+        try:
+            response = fetch_fn()
+            consecutive_errors = 0
+        except Exception as e:
+            if not is_transient_error(e):
+                raise
+            consecutive_errors += 1
+            if consecutive_errors > policy.max_transient_errors:
+                raise
+            error = e
+        if response and response.get('done'):
+            return response
+        if on_poll:
+            on_poll(attempt, clock() - start, response, error)
+        wait = policy.next_interval(interval)
+        interval = min(interval * policy.multiplier, policy.max_interval)
@@ -1,42 +1,32 @@
 # -*- coding: utf-8 -*-
 import os
-import json
-import requests
-import google.auth
-from google.auth.transport.requests import Request as GoogleAuthRequest
 import base64
-import streamlit as st # For st.error, st.info etc.
+import re
+import time
 import uuid # Added missing import
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 
-def generate_lyria_music(project_id, prompt, negative_prompt="", sample_count=4):
-    """
-    Generates music using Google's Lyria model.
-
-    Args:
-        project_id (str): The Google Cloud Project ID.
-        prompt (str): The text prompt for music generation.
-        negative_prompt (str, optional): Negative prompt. Defaults to "".
-        sample_count (int, optional): Number of samples to generate. Defaults to 4.
-
-    Returns:
-        list: A list of dictionaries, where each dictionary contains
-              'filename' (str) and 'audio_bytes' (bytes) for a generated sample,
-              or None if an error occurs.
-    """
-    LOCATION_ID = "us-central1"
-    API_ENDPOINT_BASE = "us-central1-aiplatform.googleapis.com"
-    MODEL_ID = "lyria-base-001" # Or the specific Lyria model ID you have access to
+from gcp_auth import get_token_provider
+from http_transport import post_json
+from quota_scheduler import PRIORITY_INTERACTIVE, get_quota_scheduler
+
+LYRIA_LOCATION_ID = "us-central1"
+LYRIA_API_ENDPOINT_BASE = "us-central1-aiplatform.googleapis.com"
+LYRIA_MODEL_ID = "lyria-base-001" # Or the specific Lyria model ID you have access to
+MUSIC_OUTPUT_SUBDIR = "lyria_music_outputs" # Subdirectory for Lyria outputs within local_output_dir
+# Most samples Lyria returns per predict call; only larger requests are split into concurrent calls.
+LYRIA_MAX_SAMPLES_PER_CALL = int(os.getenv("LYRIA_MAX_SAMPLES_PER_CALL", "4"))
+LYRIA_MAX_CONCURRENCY = int(os.getenv("LYRIA_MAX_CONCURRENCY", "4"))
+LYRIA_STREAM_CHUNK_SIZE = 256 * 1024
 
-    try:
-        credentials, _ = google.auth.default(scopes=['https://www.googleapis.com/auth/cloud-platform'])
-        auth_req = GoogleAuthRequest()
-        credentials.refresh(auth_req)
-        token = credentials.token
-    except Exception as e:
-        st.error(f"Lyria Auth Error: Failed to get Google Cloud credentials: {e}")
-        return None
 
-    request_data = {
+def lyria_predict_url(project_id):
+    return f"https://{LYRIA_API_ENDPOINT_BASE}/v1/projects/{project_id}/locations/{LYRIA_LOCATION_ID}/publishers/google/models/{LYRIA_MODEL_ID}:predict"
+
+
+def compose_lyria_request(prompt, negative_prompt="", sample_count=4):
+    return {
         "instances": [
             {
                 "prompt": prompt,
@@ -46,48 +36,165 @@ def generate_lyria_music(project_id, prompt, negative_prompt="", sample_count=4)
         ]
     }
 
-    url = f"https://{API_ENDPOINT_BASE}/v1/projects/{project_id}/locations/{LOCATION_ID}/publishers/google/models/{MODEL_ID}:predict"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}"
-    }
 
-    st.info(f"Sending Lyria request to: {url}")
-    st.json(request_data) # Show request for debugging
+class LyriaAudioStreamWriter:
+    """Incrementally extracts the base64 audio of each prediction from a streamed predict response.
 
-    try:
-        response = requests.post(url, headers=headers, json=request_data)
-        response.raise_for_status()  # Raises an HTTPError for bad responses (4XX or 5XX)
-        response_json = response.json()
-        st.success("Lyria API request successful!")
-        # st.json(response_json) # For debugging the full response
-
-        predictions = response_json.get('predictions', [])
-        generated_samples = []
-
-        if not predictions:
-            st.warning("Lyria API returned no predictions.")
-            return []
-
-        for i, prediction in enumerate(predictions):
-            audio_bytes = None
-            if 'bytesBase64Encoded' in prediction and prediction['bytesBase64Encoded']:
-                audio_bytes = base64.b64decode(prediction['bytesBase64Encoded'])
-            elif 'content' in prediction and prediction['content']: # Fallback, as seen in Colab
-                audio_bytes = base64.b64decode(prediction['content'])
-            
-            if audio_bytes:
-                filename = f"lyria_sample_{project_id}_{uuid.uuid4().hex[:8]}_{i+1}.wav"
-                generated_samples.append({"filename": filename, "audio_bytes": audio_bytes})
+    The JSON body is never parsed as a whole: the scanner looks for each
+    ``"bytesBase64Encoded"`` (or the ``"content"`` fallback seen in the Colab)
+    string value and decodes it in 4-character-aligned pieces straight into
+    ``<output_dir>/<filename>``. Memory stays at about one network chunk no
+    matter how large the samples are.
+    """
+
+    _AUDIO_VALUE_RE = re.compile(rb'"(?:bytesBase64Encoded|content)"\s*:\s*"')
+    _KEY_TAIL = 64  # Bytes kept between chunks so a key split across chunks is still found
+
+    def __init__(self, output_dir, project_id):
+        self.output_dir = output_dir
+        self.project_id = project_id
+        self.batch_id = uuid.uuid4().hex[:8]
+        self.paths = []
+        self._buffer = b""
+        self._carry = b""
+        self._file = None
+        self._partial_path = None
+
+    def _open_sample(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        filename = f"lyria_sample_{self.project_id}_{self.batch_id}_{len(self.paths) + 1}.wav"
+        self._partial_path = os.path.join(self.output_dir, filename) + ".part"
+        self._file = open(self._partial_path, "wb")
+
+    def _write_base64(self, data, final=False):
+        data = (self._carry + data).replace(b"\\/", b"/")  # JSON may escape "/" as "\/"
+        if not final and data.endswith(b"\\"):
+            data, self._carry = data[:-1], b"\\"
+        else:
+            self._carry = b""
+        usable = len(data) if final else len(data) - len(data) % 4
+        self._carry = data[usable:] + self._carry
+        if usable:
+            self._file.write(base64.b64decode(data[:usable] + (b"=" * (-usable % 4) if final else b"")))
+
+    def _close_sample(self):
+        self._write_base64(b"", final=True)
+        empty = self._file.tell() == 0
+        self._file.close()
+        self._file = None
+        if empty:  # "bytesBase64Encoded": "" -- a sample without audio
+            os.remove(self._partial_path)
+            return
+        final_path = self._partial_path[:-len(".part")]
+        os.replace(self._partial_path, final_path)
+        self.paths.append(final_path)
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        while self._buffer:
+            if self._file is None:
+                match = self._AUDIO_VALUE_RE.search(self._buffer)
+                if not match:
+                    self._buffer = self._buffer[-self._KEY_TAIL:]
+                    return
+                self._buffer = self._buffer[match.end():]
+                self._open_sample()
             else:
-                st.warning(f"Sample {i+1} from Lyria had no audio content.")
-        
-        return generated_samples
+                end = self._buffer.find(b'"')
+                if end < 0:
+                    self._write_base64(self._buffer)
+                    self._buffer = b""
+                    return
+                self._write_base64(self._buffer[:end])
+                self._buffer = self._buffer[end + 1:]
+                self._close_sample()
+
+    def close(self):
+        """Discards a sample cut off mid-stream and returns the paths of the complete ones."""
+        if self._file is not None:
+            self._file.close()
+            os.remove(self._partial_path)
+            self._file = None
+        return self.paths
+
+
+def stream_lyria_predictions_to_files(chunks, output_dir, project_id):
+    """Decodes every audio sample in a streamed predict response into ``output_dir`` and returns the file paths."""
+    writer = LyriaAudioStreamWriter(output_dir, project_id)
+    try:
+        for chunk in chunks:
+            writer.feed(chunk)
+    finally:
+        paths = writer.close()
+    return paths
+
+
+def post_lyria_request(project_id, request_data, priority=PRIORITY_INTERACTIVE):
+    """POSTs a predict request under the project's Lyria quota (429/503 are retried after backing off).
+
+    The body is left unread (``stream=True``); consume it with ``iter_content`` and close the response.
+    """
+    def post():
+        headers = {**get_token_provider().auth_headers(), "Content-Type": "application/json"}
+        return post_json(lyria_predict_url(project_id), request_data, headers=headers, stream=True)
+    return get_quota_scheduler().call((project_id, "lyria"), post, priority)
+
+
+def request_lyria_samples(project_id, prompt, negative_prompt="", sample_count=4, output_dir=MUSIC_OUTPUT_SUBDIR, priority=PRIORITY_INTERACTIVE):
+    """Streamlit-free Lyria call; decodes the samples into ``output_dir`` and returns their paths. Raises on errors."""
+    response = post_lyria_request(project_id, compose_lyria_request(prompt, negative_prompt, sample_count), priority)
+    with response:
+        return stream_lyria_predictions_to_files(response.iter_content(LYRIA_STREAM_CHUNK_SIZE), output_dir, project_id)
+
+
+@dataclass
+class LyriaCall:
+    index: int
+    prompt: str
+    negative_prompt: str = ""
+    sample_count: int = 1
+    samples: list = field(default_factory=list)
+    latency: float = None
+    error: str = None
+
 
-    except requests.exceptions.HTTPError as http_err:
-        st.error(f"Lyria API HTTP error: {http_err}")
-        st.error(f"Response content: {response.text}")
+def plan_lyria_calls(prompts, negative_prompt="", sample_count=4, max_samples_per_call=LYRIA_MAX_SAMPLES_PER_CALL):
+    """One call per prompt, split into calls of at most ``max_samples_per_call`` samples only when ``sample_count`` exceeds it."""
+    calls = []
+    per_call = max(1, max_samples_per_call)
+    for prompt in prompts:
+        remaining = sample_count
+        while remaining > 0:
+            calls.append(LyriaCall(len(calls), prompt, negative_prompt, min(per_call, remaining)))
+            remaining -= per_call
+    return calls
+
+
+def run_lyria_call(project_id, call, output_dir, priority=PRIORITY_INTERACTIVE):
+    """Runs one planned call, filling ``samples`` (file paths), ``latency`` and ``error``; never raises."""
+    t0 = time.monotonic()
+    try:
+        call.samples = request_lyria_samples(project_id, call.prompt, call.negative_prompt, call.sample_count, output_dir, priority)
+        if not call.samples:
+            call.error = "Lyria returned no audio samples."
     except Exception as e:
-        st.error(f"An error occurred during Lyria music generation: {e}")
-    
-    return None
+        call.error = str(e)
+    call.latency = time.monotonic() - t0
+    return call
+
+
+def iter_lyria_batch(project_id, calls, output_dir, max_concurrency=LYRIA_MAX_CONCURRENCY, priority=PRIORITY_INTERACTIVE):
+    """Runs ``calls`` with at most ``max_concurrency`` in flight and yields each as soon as it returns.
+
+    Samples are decoded into ``output_dir`` while they download; ``call.samples`` holds their paths.
+    """
+    if not calls:
+        return
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(calls))))
+    try:
+        futures = [executor.submit(run_lyria_call, project_id, call, output_dir, priority) for call in calls]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False)
+
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""Streams generated media to the browser without loading it into the app process.
+
+``st.video(path)``, ``st.audio(path)`` and ``st.download_button(file)`` read the
+whole file into Streamlit's memory on every rerun. Instead the UI asks for a
+URL. Outputs that live in GCS get a V4 signed URL; local files are streamed
+from disk, with HTTP range support (206 Partial Content), by a small threaded
+HTTP server in this process, so the player seeks and the app only keeps a
+path -> token mapping. That server is only reachable where its port is, so
+it is used only once ``MEDIA_SERVER_PUBLIC_URL`` says how the browser reaches
+it (or with ``MEDIA_URL_MODE=local`` for a local run on ``localhost``).
+``MEDIA_URL_MODE`` is ``auto`` (signed URLs when there is a GCS copy, the
+server when its public URL is set, otherwise the old in-memory media),
+``gcs``, ``local`` or ``off``.
+
+Only files registered through ``media_url`` are served, under unguessable
+tokens, never arbitrary paths.
+"""
+import datetime
+import logging
+import mimetypes
+import os
+import re
+import secrets
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, urlparse, parse_qs
+
+from gcp_auth import get_token_provider
+from gcs_utils import parse_gcs_uri
+
+logger = logging.getLogger(__name__)
+
+MEDIA_URL_MODE = os.getenv("MEDIA_URL_MODE", "auto").lower()  # auto | gcs | local | off
+MEDIA_SERVER_PORT = int(os.getenv("MEDIA_SERVER_PORT", "8765"))
+# Base URL the browser uses to reach the server (e.g. behind the same https proxy as the app).
+# Without it the server is only used with MEDIA_URL_MODE=local, at http://localhost:<port>.
+MEDIA_SERVER_PUBLIC_URL = os.getenv("MEDIA_SERVER_PUBLIC_URL", "")
+# The server has no authentication beyond its tokens: loopback only, unless it is published or a host is set.
+MEDIA_SERVER_HOST = os.getenv("MEDIA_SERVER_HOST", "0.0.0.0" if MEDIA_SERVER_PUBLIC_URL else "127.0.0.1")
+MEDIA_SIGNED_URL_TTL_SECONDS = int(os.getenv("MEDIA_SIGNED_URL_TTL_SECONDS", "3600"))
+MEDIA_REGISTRY_MAX_ENTRIES = 10000
+STREAM_CHUNK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class MediaRegistry:
+    """Bounded, thread-safe mapping between local paths and their URL tokens."""
+
+    def __init__(self, max_entries=MEDIA_REGISTRY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._by_token = OrderedDict()
+        self._by_path = {}
+        self._lock = threading.Lock()
+
+    def register(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            token = self._by_path.get(path)
+            if token is None:
+                token = secrets.token_urlsafe(16)
+                self._by_path[path] = token
+                self._by_token[token] = path
+                while len(self._by_token) > self.max_entries:
+                    _, old_path = self._by_token.popitem(last=False)
+                    self._by_path.pop(old_path, None)
+            return token
+
+    def resolve(self, token):
+        with self._lock:
+            return self._by_token.get(token)
+
+
+def parse_range(header, size):
+    """Returns ``(start, end)`` (inclusive) for a single ``bytes=`` range, None for no/ignored range, or raises ValueError if unsatisfiable."""
+    match = _RANGE_RE.match((header or "").strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:  # suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+class _MediaHandler(BaseHTTPRequestHandler):
+    registry = None  # Set on the server's handler subclass
+
+    def log_message(self, fmt, *args):
+        logger.debug("media_server: " + fmt, *args)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        path = self.registry.resolve(parts[1]) if len(parts) >= 2 and parts[0] == "media" else None
+        if not path or not os.path.isfile(path):
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        try:
+            byte_range = parse_range(self.headers.get("Range"), size)
+        except ValueError:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.end_headers()
+            return
+        start, end = byte_range or (0, size - 1)
+        length = max(0, end - start + 1)
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Cache-Control", "private, max-age=3600")
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        if "download" in parse_qs(url.query):
+            self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(os.path.basename(path))}")
+        self.end_headers()
+        if not send_body:
+            return
+        try:
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = length
+                while remaining > 0:
+                    chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The player cancelled the request (seeking does this constantly).
+
+
+class MediaServer:
+    def __init__(self, host=MEDIA_SERVER_HOST, port=MEDIA_SERVER_PORT, public_url=MEDIA_SERVER_PUBLIC_URL):
+        self.registry = MediaRegistry()
+        handler = type("MediaHandler", (_MediaHandler,), {"registry": self.registry})
+        # If the port is taken this raises and the UI falls back to in-memory media: a server on
+        # some other port would publish URLs nobody has routed to it.
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.public_url = (public_url or f"http://localhost:{port}").rstrip("/")
+        threading.Thread(target=self.httpd.serve_forever, name="media-server", daemon=True).start()
+
+    def url_for(self, path, download=False):
+        token = self.registry.register(path)
+        return f"{self.public_url}/media/{token}/{quote(os.path.basename(path))}" + ("?download=1" if download else "")
+
+
+_server = None
+_server_failed = False
+_server_lock = threading.Lock()
+
+
+def get_media_server():
+    """Returns the process-wide ``MediaServer``, starting it on first use; None if it cannot start."""
+    global _server, _server_failed
+    with _server_lock:
+        if _server is None and not _server_failed:
+            try:
+                _server = MediaServer()
+            except OSError as e:
+                _server_failed = True
+                logger.warning("Media server could not start (%s); falling back to in-memory media.", e)
+        return _server
+
+
+def signed_gcs_url(storage_client, gcs_uri, download=False):
+    """V4 signed GET URL for a ``gs://`` object, signed through IAM when the credentials hold no private key."""
+    bucket_name, blob_name = parse_gcs_uri(gcs_uri)
+    credentials = get_token_provider().get_credentials()
+    signing = {} if hasattr(credentials, "sign_bytes") and getattr(credentials, "signer_email", None) else {
+        "service_account_email": getattr(credentials, "service_account_email", None), "access_token": credentials.token}
+    disposition = f"attachment; filename=\"{os.path.basename(blob_name)}\"" if download else None
+    return storage_client.bucket(bucket_name).blob(blob_name).generate_signed_url(
+        version="v4", expiration=datetime.timedelta(seconds=MEDIA_SIGNED_URL_TTL_SECONDS), method="GET",
+        response_disposition=disposition, **signing)
+
+
+def media_url(local_path=None, gcs_uri=None, storage_client=None, download=False):
+    """URL the browser can stream ``local_path`` (or ``gcs_uri``) from, or None to fall back to in-memory media."""
+    if MEDIA_URL_MODE == "off":
+        return None
+    if MEDIA_URL_MODE in ("auto", "gcs") and gcs_uri and storage_client:
+        try:
+            return signed_gcs_url(storage_client, gcs_uri, download)
+        except Exception as e:
+            logger.warning("Could not sign %s (%s); serving the local copy.", gcs_uri, e)
+    serve_locally = MEDIA_URL_MODE == "local" or (MEDIA_URL_MODE in ("auto", "gcs") and MEDIA_SERVER_PUBLIC_URL)
+    if serve_locally and local_path and os.path.isfile(local_path):
+        server = get_media_server()
+        return server.url_for(local_path, download) if server else None
+    return None
@@ -1,6 +1,6 @@
 import streamlit as st
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip, concatenate_videoclips, AudioFileClip
 import os
+import time
 
 # Ensure the output directory exists
 OUTPUT_DIR = "Output/movie_creator_output"
@@ -13,43 +13,30 @@ AVAILABLE_FONTS = ["Arial", "Times-New-Roman", "Courier-New", "Verdana", "Georgi
 def animate_text_word_by_word(video_clip, text, font, fontsize=50, color='white', stroke_color='black', stroke_width=1):
     """
     Adds text to a video clip, appearing word by word.
-    Words accumulate on screen.
+    Words accumulate on screen, 1.5x faster than one word per equal share of the clip.
+    Each word is rendered once and the caption is laid out once (see caption_engine).
     """
-    words = text.split()
-    if not words:  # Handle empty text or text with only spaces
-        return video_clip
-        
-    # Adjust word appearance speed
-    base_duration_per_word = video_clip.duration / len(words)
-    # User requested 1.5x faster than original
-    speed_factor = 1.5 
-    duration_per_word = base_duration_per_word / speed_factor
-    
-    final_text_clips = []
-    accumulated_words = ""
-    for i, word in enumerate(words):
-        accumulated_words += (word + " ")
-        # Create a text clip for the current accumulated words
-        # Using method='caption' and size for better text wrapping and positioning.
-        # Adjust video_clip.w * 0.8 (width for text) as needed.
-        txt_clip = TextClip(accumulated_words.strip(), fontsize=fontsize, font=font, color=color,
-                            stroke_color=stroke_color, stroke_width=stroke_width,
-                            method='caption', align='center', size=(video_clip.w * 0.8, None))
-        txt_clip = txt_clip.set_pos('center')
-
-        start_time = i * duration_per_word
-        # Duration for this specific text state:
-        # If it's the last word, it lasts till the end of the video clip.
-        # Otherwise, it lasts until the next word is supposed to appear.
-        clip_duration = (video_clip.duration - start_time) if (i == len(words) - 1) else duration_per_word
-        
-        txt_clip = txt_clip.set_start(start_time).set_duration(clip_duration)
-        final_text_clips.append(txt_clip)
+    from caption_engine import add_word_by_word_caption
+
+    return add_word_by_word_caption(video_clip, text, font, fontsize=fontsize, color=color,
+                                    stroke_color=stroke_color, stroke_width=stroke_width, speed_factor=1.5)
 
-    if not final_text_clips:
-        return video_clip # Should not happen if words exist, but as a safeguard
 
-    return CompositeVideoClip([video_clip] + final_text_clips, size=video_clip.size)
+def stitch_by_stream_copy(clip_paths, output_path, audio_path=None):
+    """
+    Joins clips with ffmpeg's concat demuxer without re-encoding, muxing in ``audio_path`` if given.
+    Returns None on success, or why the clips could not be stream-copied (they must share codec, size, fps...).
+    """
+    from ffmpeg_tools import FFmpegError, concat_incompatibility, concat_stream_copy, probe_media
+
+    try:
+        infos = [probe_media(path) for path in clip_paths]
+        reason = concat_incompatibility(infos, ignore_audio=audio_path is not None)
+        if reason is None:
+            concat_stream_copy(clip_paths, output_path, audio_path, duration=sum(info.duration for info in infos))
+        return reason
+    except FFmpegError as e:
+        return str(e)
 
 
 def movie_creator_tab():
@@ -150,81 +137,104 @@ def movie_creator_tab():
             return
 
         with st.spinner("Generating your movie... This might take a while! ⏳"):
-            final_video_clips_processed = []
-            temp_file_paths = [] # To keep track of temporary files for cleanup
+            staging_paths = [] # Segments rendered but not moved into the cache (failed runs)
+            pinned_paths = [] # Cache files this run uses; other runs' evictions leave them alone
+            segment_cache = None
 
             try:
-                for i, v_data in enumerate(valid_clips_to_process):
-                    st.write(f"Processing video {i+1}/{len(valid_clips_to_process)}: {v_data['file'].name}...")
-                    
-                    temp_video_filename = f"temp_video_{v_data['id']}_{v_data['file'].name}"
-                    temp_video_path = os.path.join(OUTPUT_DIR, temp_video_filename)
-                    temp_file_paths.append(temp_video_path)
-
-                    with open(temp_video_path, "wb") as f:
-                        f.write(v_data["file"].getbuffer()) # Corrected this line
-                    
-                    video_clip_obj = VideoFileClip(temp_video_path)
-                    
-                    # Apply tempo adjustment
-                    tempo_factor = v_data.get("tempo", 1.0)
-                    if tempo_factor != 1.0:
-                        st.write(f"... applying tempo {tempo_factor}x")
-                        video_clip_obj = video_clip_obj.speedx(tempo_factor)
-                    
-                    if v_data["text"].strip():
-                        video_clip_with_text = animate_text_word_by_word(video_clip_obj, v_data["text"], v_data["font"])
-                        final_video_clips_processed.append(video_clip_with_text)
-                    else:
-                        final_video_clips_processed.append(video_clip_obj)
-                    
-                if not final_video_clips_processed:
-                    st.error("No videos could be processed.")
-                    return
-
-                concatenated_video_clip = concatenate_videoclips(final_video_clips_processed, method="compose")
-
+                from segment_cache import get_segment_cache, segment_cache_key
+                segment_cache = get_segment_cache()
+
+                # Uploads are stored once by content, so unchanged clips keep their paths (and cached segments) across runs.
+                clip_paths, clip_digests = [], []
+                for v_data in valid_clips_to_process:
+                    clip_path, clip_digest = segment_cache.store_input(v_data["file"].getbuffer(), v_data["file"].name)
+                    pinned_paths.extend(segment_cache.pin(clip_path))
+                    clip_paths.append(clip_path)
+                    clip_digests.append(clip_digest)
+
+                audio_path = None
                 if audio_file_uploaded:
-                    st.write("Adding audio...")
-                    temp_audio_filename = f"temp_audio_{audio_file_uploaded.name}"
-                    temp_audio_path = os.path.join(OUTPUT_DIR, temp_audio_filename)
-                    temp_file_paths.append(temp_audio_path)
-
-                    with open(temp_audio_path, "wb") as f:
-                        f.write(audio_file_uploaded.getbuffer())
-                    
-                    audio_clip_obj = AudioFileClip(temp_audio_path)
-                    final_output_video = concatenated_video_clip.set_audio(audio_clip_obj.set_duration(concatenated_video_clip.duration))
-                else:
-                    final_output_video = concatenated_video_clip
+                    audio_path, _ = segment_cache.store_input(audio_file_uploaded.getbuffer(), audio_file_uploaded.name)
+                    pinned_paths.extend(segment_cache.pin(audio_path))
 
                 output_filename = f"final_movie_{len(os.listdir(OUTPUT_DIR))}.mp4" # Simpler naming
                 final_output_path = os.path.join(OUTPUT_DIR, output_filename)
-                
-                st.write(f"Writing final movie to {final_output_path}...")
-                final_output_video.write_videofile(final_output_path, codec="libx264", audio_codec="aac", 
-                                                   temp_audiofile=os.path.join(OUTPUT_DIR, 'temp-audio.m4a'), 
-                                                   remove_temp=True, 
-                                                   ffmpeg_params=["-pix_fmt", "yuv420p"])
+
+                # Fast path: clips without text or tempo changes are joined by stream copy when their formats match.
+                stream_copied = False
+                if all(not v["text"].strip() and v.get("tempo", 1.0) == 1.0 for v in valid_clips_to_process):
+                    st.write("No text or tempo changes; joining the clips without re-encoding...")
+                    t0 = time.monotonic()
+                    reason = stitch_by_stream_copy(clip_paths, final_output_path, audio_path)
+                    if reason is None:
+                        stream_copied = True
+                        st.write(f"... stream-copied {len(clip_paths)} clips in {time.monotonic() - t0:.1f}s")
+                    else:
+                        st.write(f"... stream copy not possible ({reason}); re-encoding instead.")
+
+                if not stream_copied:
+                    from ffmpeg_tools import concat_stream_copy
+                    from segment_renderer import SEGMENT_RENDER_WORKERS, Segment, iter_segment_renders, plan_segment_settings
+                    from text_raster_cache import get_text_raster_cache
+
+                    # Each clip becomes its own segment; segments cached from earlier runs are reused and
+                    # the rest are rendered in worker processes. The segments are then joined losslessly.
+                    settings = plan_segment_settings(clip_paths, audio=audio_path is None)
+                    segment_files = {} # index -> (path, duration)
+                    segments = []
+                    for i, (v_data, clip_path, clip_digest) in enumerate(zip(valid_clips_to_process, clip_paths, clip_digests)):
+                        tempo = v_data.get("tempo", 1.0)
+                        key = segment_cache_key(clip_digest, v_data["text"].strip(), v_data["font"], tempo, settings)
+                        cached = segment_cache.get_segment(key)
+                        if cached:
+                            segment_files[i] = cached
+                            pinned_paths.extend(segment_cache.pin(cached[0]))
+                        else:
+                            segments.append(Segment(i, clip_path, segment_cache.staging_path(key), v_data["text"], v_data["font"], tempo, key=key))
+                            staging_paths.append(segments[-1].output_path)
+                    st.write(f"Reusing {len(segment_files)} cached segments; rendering {len(segments)} clips at "
+                             f"{settings.width}x{settings.height}, {settings.fps:g} fps in up to {min(SEGMENT_RENDER_WORKERS, max(1, len(segments)))} parallel processes...")
+                    t0 = time.monotonic()
+                    rendered = []
+                    for segment in iter_segment_renders(segments, settings):
+                        clip_name = valid_clips_to_process[segment.index]["file"].name
+                        if segment.error:
+                            st.error(f"Video {segment.index + 1} ({clip_name}) could not be rendered: {segment.error}")
+                        else:
+                            st.write(f"... video {segment.index + 1}/{len(valid_clips_to_process)} ({clip_name}) rendered in {segment.seconds:.1f}s")
+                            segment_files[segment.index] = (segment_cache.put_segment(segment.key, segment.output_path, segment.duration), segment.duration)
+                            pinned_paths.extend(segment_cache.pin(segment_files[segment.index][0]))
+                        rendered.append(segment)
+                    if any(segment.error for segment in rendered):
+                        return
+                    render_seconds = time.monotonic() - t0
+
+                    ordered = [segment_files[i] for i in range(len(valid_clips_to_process))]
+                    st.write("Joining segments and adding audio..." if audio_path else "Joining segments...")
+                    concat_stream_copy([path for path, _ in ordered], final_output_path, audio_path,
+                                       duration=sum(duration for _, duration in ordered))
+                    segment_cache.evict()
 
                 st.success(f"🎉 Movie generated successfully! 🎉")
                 st.video(final_output_path)
-                
-                # Close all MoviePy clips to release resources
-                for clip in final_video_clips_processed:
-                    clip.close()
-                concatenated_video_clip.close()
-                if audio_file_uploaded:
-                    audio_clip_obj.close()
-                final_output_video.close()
+                if not stream_copied:
+                    raster_stats = get_text_raster_cache().stats()
+                    st.caption(f"Reused {len(ordered) - len(rendered)}/{len(ordered)} segments; rendered {len(rendered)} in {render_seconds:.1f}s "
+                               f"({sum(segment.seconds for segment in rendered):.1f}s of work). "
+                               f"Text raster cache: {sum(segment.raster_hits for segment in rendered)} hits, "
+                               f"{sum(segment.raster_misses for segment in rendered)} misses this run "
+                               f"({raster_stats['entries']} rasters, {raster_stats['bytes'] / 1e6:.1f} MB on disk)")
 
             except Exception as e:
                 st.error(f"An error occurred during movie generation: {e}")
                 import traceback
                 st.error(traceback.format_exc())
             finally:
-                # Clean up all temporary files
-                for path in temp_file_paths:
+                if segment_cache:
+                    segment_cache.unpin(*pinned_paths)
+                # Clean up segments that were not moved into the cache
+                for path in staging_paths:
                     if os.path.exists(path):
                         try:
                             os.remove(path)
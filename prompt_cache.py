@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Memo of Gemini-built prompts, so rebuilding the same prompt is instant.
+
+Entries are keyed by the SHA-256 of (image bytes, user text, model,
+generation config). Lookups go to an in-process LRU first and then to SQLite
+under ``VEO_CACHE_DIR``, so memoized prompts survive restarts and are shared by
+all sessions. Disk entries expire after ``PROMPT_CACHE_TTL_SECONDS`` and the
+least recently used ones are evicted beyond ``PROMPT_CACHE_MAX_ENTRIES``; the
+memory tier holds at most ``PROMPT_MEMO_MAX_ENTRIES``.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+VEO_CACHE_DIR = os.getenv("VEO_CACHE_DIR", ".veo_cache")
+PROMPT_CACHE_PATH = os.getenv("PROMPT_CACHE_PATH", os.path.join(VEO_CACHE_DIR, "prompts.sqlite3"))
+PROMPT_CACHE_TTL_SECONDS = float(os.getenv("PROMPT_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "2000"))
+PROMPT_MEMO_MAX_ENTRIES = int(os.getenv("PROMPT_MEMO_MAX_ENTRIES", "256"))
+
+
+def prompt_cache_key(image_bytes, user_text, model_name, generation_config):
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256(image_bytes or b"").digest())
+    digest.update(json.dumps({"text": user_text, "model": model_name, "config": generation_config},
+                             sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PromptCache:
+    def __init__(self, path=PROMPT_CACHE_PATH, ttl=PROMPT_CACHE_TTL_SECONDS, max_entries=PROMPT_CACHE_MAX_ENTRIES,
+                 memo_entries=PROMPT_MEMO_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memo_entries = memo_entries
+        self.hits = 0
+        self.misses = 0
+        self._memo = OrderedDict()  # key -> (prompt, created_at)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS prompts (key TEXT PRIMARY KEY, prompt TEXT NOT NULL,"
+                         " created_at REAL NOT NULL, last_used_at REAL NOT NULL)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _remember(self, key, prompt, created_at):
+        with self._lock:
+            self._memo[key] = (prompt, created_at)
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_entries:
+                self._memo.popitem(last=False)
+
+    def get(self, key):
+        """Returns the memoized prompt, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memo.get(key)
+            if entry and now - entry[1] <= self.ttl:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self._memo.pop(key, None)
+        with self._connect() as conn:
+            row = conn.execute("SELECT prompt, created_at FROM prompts WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM prompts WHERE key = ?", (key,))
+                row = None
+            if row:
+                conn.execute("UPDATE prompts SET last_used_at = ? WHERE key = ?", (now, key))
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not row:
+            return None
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    def put(self, key, prompt):
+        now = time.time()
+        self._remember(key, prompt, now)
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO prompts (key, prompt, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                         (key, prompt, now, now))
+            conn.execute("DELETE FROM prompts WHERE created_at < ?", (now - self.ttl,))
+            conn.execute("DELETE FROM prompts WHERE key NOT IN (SELECT key FROM prompts ORDER BY last_used_at DESC LIMIT ?)", (self.max_entries,))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prompt_cache():
+    """Returns the process-wide ``PromptCache``."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PromptCache()
+        return _cache
@@ -1,10 +1,23 @@
 import streamlit as st
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part, FinishReason
-import vertexai.preview.generative_models as generative_models
+import hashlib
+import itertools
+import json
+import mimetypes
 import os
+import re
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from dotenv import load_dotenv
 
+from gcp_auth import get_token_provider
+from image_preprocess import prepare_gemini_image
+from prompt_cache import get_prompt_cache, prompt_cache_key
+from quota_scheduler import get_quota_scheduler, PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -15,78 +28,205 @@ load_dotenv()
 MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash-preview-04-17") 
 PROJECT_ID = os.getenv("DEFAULT_PROJECT_ID")
 LOCATION = os.getenv("GCP_REGION", "us-central1") # Common default, ensure this is where your Vertex AI models are available
+PROMPT_BATCH_MAX_CONCURRENCY = int(os.getenv("PROMPT_BATCH_MAX_CONCURRENCY", "8"))
+PROMPT_BATCH_DIR = os.getenv("PROMPT_BATCH_DIR", "prompt_batches") # Images and manifests exported by the batch mode
+
+if not PROJECT_ID:
+    st.error("GCP_PROJECT_ID is not set. Please set it in your .env file or environment.")
+
+PROMPT_INSTRUCTION = (
+    "You are an expert prompt engineer for generative AI models that create video from images and text. "
+    "Based on the following uploaded image and the user's initial idea, "
+    "generate an enhanced, highly descriptive, and creative prompt. "
+    "This generated prompt should be suitable for an advanced image-to-video AI model to produce a compelling short video clip. "
+    "Focus on visual details, atmosphere, potential motion, and artistic style implied by the image and text. "
+    "The output should be only the generated prompt itself, ready to be copied and used."
+)
+
+GENERATION_CONFIG = {
+    "max_output_tokens": 2048,
+    "temperature": 0.7, # Adjust for creativity vs. coherence
+    "top_p": 0.95,
+}
+
+_models = {}
+_safety_settings = None
+_models_lock = threading.Lock()
+
+
+def get_gemini_model(model_name=MODEL_NAME):
+    """Returns the process-wide ``GenerativeModel`` for ``model_name`` (built once, shared by all sessions).
+
+    The Vertex AI SDK takes over a second to import, so it is imported and
+    initialized here, on the first prompt build, instead of at app startup.
+    """
+    global _safety_settings
+    with _models_lock:
+        if model_name not in _models:
+            import vertexai
+            from vertexai.generative_models import GenerativeModel
+            import vertexai.preview.generative_models as generative_models
+            if _safety_settings is None:
+                # Share the process-wide credentials so Gemini calls reuse the cached token.
+                vertexai.init(project=PROJECT_ID, location=LOCATION, credentials=get_token_provider().get_credentials(refresh=False))
+                block = generative_models.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
+                _safety_settings = {
+                    generative_models.HarmCategory.HARM_CATEGORY_HATE_SPEECH: block,
+                    generative_models.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: block,
+                    generative_models.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: block,
+                    generative_models.HarmCategory.HARM_CATEGORY_HARASSMENT: block,
+                }
+            _models[model_name] = GenerativeModel(model_name)
+        return _models[model_name]
+
 
-# Initialize Vertex AI once
-try:
-    if PROJECT_ID:
-        vertexai.init(project=PROJECT_ID, location=LOCATION)
-    else:
-        st.error("GCP_PROJECT_ID is not set. Please set it in your .env file or environment.")
-except Exception as e:
-    st.error(f"Error initializing Vertex AI: {e}")
+class PromptGenerationError(Exception):
+    """Gemini finished without producing a prompt."""
 
-def generate_prompt_from_image_and_text(image_bytes, user_text_prompt):
+
+def _start_stream(model, parts):
+    # The SDK sends the request on first iteration; pull the first chunk here so 429s are retried by the scheduler.
+    responses = iter(model.generate_content(parts, generation_config=GENERATION_CONFIG, safety_settings=_safety_settings, stream=True))
+    return next(responses, None), responses
+
+
+def stream_prompt_from_image_and_text(image_bytes, user_text_prompt, use_cache=True, mime_type=None, priority=PRIORITY_INTERACTIVE,
+                                      on_image_prepared=None):
+    """Yields the generated prompt as Gemini streams it (a memoized prompt comes as one chunk).
+
+    On a cache miss the image is downscaled and re-encoded first (see
+    ``image_preprocess``); ``on_image_prepared`` receives the ``PreparedImage``.
+    ``mime_type`` is only a fallback, the real format is detected. Raises
+    ``PromptGenerationError`` when Gemini returns no text; the complete
+    prompt is memoized like ``generate_prompt_from_image_and_text``'s.
+    """
+    cache_key = prompt_cache_key(image_bytes, user_text_prompt, MODEL_NAME, GENERATION_CONFIG)
+    if use_cache:
+        cached_prompt = get_prompt_cache().get(cache_key)
+        if cached_prompt is not None:
+            yield cached_prompt
+            return
+
+    model = get_gemini_model()
+    from vertexai.generative_models import Part, FinishReason
+    payload, mime_type, prepared = prepare_gemini_image(image_bytes, mime_type)
+    if prepared and on_image_prepared:
+        on_image_prepared(prepared)
+    image_part = Part.from_data(mime_type=mime_type, data=payload)
+    full_prompt_parts = [
+        PROMPT_INSTRUCTION,
+        "\n\nUser's Initial Idea: ", user_text_prompt,
+        "\n\nUploaded Image Context:\n", image_part
+    ]
+    # Shares the project's Gemini quota with other sessions; 429/503 are retried after backing off.
+    first, responses = get_quota_scheduler().call((PROJECT_ID, "gemini"), lambda: _start_stream(model, full_prompt_parts), priority)
+
+    text, finish_reason = [], None
+    for response in itertools.chain([first] if first is not None else [], responses):
+        if not response.candidates:
+            continue
+        candidate = response.candidates[0]
+        finish_reason = candidate.finish_reason or finish_reason
+        piece = "".join(part.text for part in candidate.content.parts if getattr(part, "text", None))
+        if piece:
+            text.append(piece)
+            yield piece
+    if not text:
+        if finish_reason not in (None, FinishReason.STOP):
+            raise PromptGenerationError(f"Prompt generation stopped due to: {finish_reason.name}")
+        raise PromptGenerationError("Could not generate prompt. The model returned no content.")
+    get_prompt_cache().put(cache_key, "".join(text))
+
+
+def generate_prompt_from_image_and_text(image_bytes, user_text_prompt, use_cache=True, mime_type=None, priority=PRIORITY_INTERACTIVE):
     """
     Generates a creative prompt using Gemini based on an image and a text idea.
+
+    Successful prompts are memoized by (image, text, model, generation config);
+    ``use_cache=False`` asks Gemini again and replaces the memoized prompt.
     """
     if not PROJECT_ID:
         return "Error: GCP_PROJECT_ID not configured."
-
     try:
-        model = GenerativeModel(MODEL_NAME)
-        
-        image_part = Part.from_data(
-            mime_type="image/png",  # Assuming PNG, adjust if other types are common
-            data=image_bytes
-        )
-        
-        # Construct a more detailed instruction for Gemini
-        instruction = (
-            "You are an expert prompt engineer for generative AI models that create video from images and text. "
-            "Based on the following uploaded image and the user's initial idea, "
-            "generate an enhanced, highly descriptive, and creative prompt. "
-            "This generated prompt should be suitable for an advanced image-to-video AI model to produce a compelling short video clip. "
-            "Focus on visual details, atmosphere, potential motion, and artistic style implied by the image and text. "
-            "The output should be only the generated prompt itself, ready to be copied and used."
-        )
-        
-        full_prompt_parts = [
-            instruction,
-            "\n\nUser's Initial Idea: ", user_text_prompt,
-            "\n\nUploaded Image Context:\n", image_part 
-        ]
-
-        generation_config = {
-            "max_output_tokens": 2048,
-            "temperature": 0.7, # Adjust for creativity vs. coherence
-            "top_p": 0.95,
-        }
-        
-        safety_settings = {
-            generative_models.HarmCategory.HARM_CATEGORY_HATE_SPEECH: generative_models.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-            generative_models.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: generative_models.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-            generative_models.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: generative_models.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-            generative_models.HarmCategory.HARM_CATEGORY_HARASSMENT: generative_models.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-        }
-
-        response = model.generate_content(
-            full_prompt_parts,
-            generation_config=generation_config,
-            safety_settings=safety_settings,
-            stream=False,
-        )
-        
-        if response.candidates and response.candidates[0].content.parts:
-            return response.candidates[0].content.parts[0].text
-        else:
-            # Check for finish_reason if no content
-            if response.candidates and response.candidates[0].finish_reason != FinishReason.FINISH_REASON_STOP:
-                return f"Error: Prompt generation stopped due to: {response.candidates[0].finish_reason.name}"
-            return "Error: Could not generate prompt. The model returned no content."
-
+        return "".join(stream_prompt_from_image_and_text(image_bytes, user_text_prompt, use_cache, mime_type, priority))
+    except PromptGenerationError as e:
+        return f"Error: {e}"
     except Exception as e:
         return f"An error occurred while calling Gemini: {e}"
 
+
+@dataclass
+class PromptBatchItem:
+    index: int
+    name: str
+    image_bytes: bytes
+    idea: str
+    mime_type: str = "image/png"
+    prompt: str = None
+    error: str = None
+    latency: float = None
+    prepared: object = None  # PreparedImage sent to Gemini, when the prompt was not memoized
+
+
+def _build_batch_item(item, use_cache):
+    t0 = time.monotonic()
+    try:
+        item.prompt = "".join(stream_prompt_from_image_and_text(item.image_bytes, item.idea, use_cache, item.mime_type, PRIORITY_NORMAL,
+                                                                on_image_prepared=lambda prepared: setattr(item, "prepared", prepared)))
+    except Exception as e:
+        item.error = str(e)
+    item.latency = time.monotonic() - t0
+    return item
+
+
+def iter_prompt_batch(items, max_concurrency=PROMPT_BATCH_MAX_CONCURRENCY, use_cache=True):
+    """Builds the prompts of ``items`` concurrently (within the Gemini quota) and yields each item as it finishes."""
+    if not items:
+        return
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(items))))
+    try:
+        futures = [executor.submit(_build_batch_item, item, use_cache) for item in items]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False)
+
+
+def export_prompt_manifest(items, batch_dir):
+    """Writes the items' images (content-addressed) and a ``batch_runner`` manifest into ``batch_dir``, plus a zip of both.
+
+    Image paths in the manifest are relative to it, so the zip (``bundle.zip``) runs
+    anywhere once extracted. Returns ``(manifest_path, bundle_path)``; items
+    without a prompt are left out.
+    """
+    os.makedirs(batch_dir, exist_ok=True)
+    lines, images, ids = [], [], set()
+    for item in sorted(items, key=lambda i: i.index):
+        if not item.prompt:
+            continue
+        digest = hashlib.sha256(item.image_bytes).hexdigest()[:16]
+        image_name = digest + (mimetypes.guess_extension(item.mime_type) or ".png")
+        image_path = os.path.join(batch_dir, image_name)
+        if not os.path.exists(image_path):
+            with open(image_path, "wb") as f:
+                f.write(item.image_bytes)
+        if image_name not in images:
+            images.append(image_name)
+        job_id = re.sub(r"[^A-Za-z0-9._-]", "_", os.path.splitext(item.name)[0]) or f"prompt_{item.index + 1}"
+        if job_id in ids:  # Same file name uploaded twice; batch_runner rejects duplicate ids
+            job_id = f"{job_id}_{item.index + 1}"
+        ids.add(job_id)
+        lines.append(json.dumps({"id": job_id, "kind": "veo", "prompt": item.prompt.strip(), "image": image_name}, ensure_ascii=False))
+    manifest_path = os.path.join(batch_dir, "manifest.jsonl")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + ("\n" if lines else ""))
+    bundle_path = os.path.join(batch_dir, "bundle.zip")
+    with zipfile.ZipFile(bundle_path, "w") as bundle:
+        bundle.write(manifest_path, "manifest.jsonl", compress_type=zipfile.ZIP_DEFLATED)
+        for image_name in images:  # Already compressed
+            bundle.write(os.path.join(batch_dir, image_name), image_name, compress_type=zipfile.ZIP_STORED)
+    return manifest_path, bundle_path
+
 def prompt_builder_tab():
     st.header("✨ AI Prompt Builder")
     st.write("""
@@ -106,12 +246,34 @@ def prompt_builder_tab():
     if 'generated_ai_prompt' not in st.session_state:
         st.session_state.generated_ai_prompt = ""
 
+    bypass_cache = st.checkbox("Bypass prompt cache (ask Gemini again)", key="prompt_builder_bypass_cache",
+                               help="Identical image + idea normally return the memoized prompt instantly.")
+
     if st.button("🚀 Generate AI Prompt", key="generate_ai_prompt_button"):
         if uploaded_image is not None and user_text.strip():
             image_bytes = uploaded_image.getvalue()
-            with st.spinner("AI is crafting your prompt... 🧠✨"):
-                generated_prompt = generate_prompt_from_image_and_text(image_bytes, user_text.strip())
-                st.session_state.generated_ai_prompt = generated_prompt
+            heading, placeholder = st.empty(), st.empty()  # Streaming view; the final prompt is rendered below
+            heading.subheader("🤖 Generated AI Prompt:")
+            t0, first_token_at, streamed = time.monotonic(), None, ""
+            try:
+                with st.spinner("AI is crafting your prompt... 🧠✨"):
+                    for piece in stream_prompt_from_image_and_text(image_bytes, user_text.strip(), use_cache=not bypass_cache,
+                                                                   mime_type=uploaded_image.type,
+                                                                   on_image_prepared=lambda p: st.caption(f"🖼️ {p.describe(uploaded_image.name)}")):
+                        first_token_at = first_token_at or time.monotonic()
+                        streamed += piece
+                        placeholder.markdown(streamed + " ▌")
+                generated_prompt = streamed
+            except PromptGenerationError as e:
+                generated_prompt = f"Error: {e}"
+            except Exception as e:
+                generated_prompt = f"An error occurred while calling Gemini: {e}"
+            heading.empty()
+            placeholder.empty()
+            st.session_state.generated_ai_prompt = generated_prompt
+            cache = get_prompt_cache()
+            ttft = f"first text after {first_token_at - t0:.2f}s, " if first_token_at else ""
+            st.caption(f"Built in {time.monotonic() - t0:.2f}s ({ttft}prompt cache: {cache.hits} hit(s), {cache.misses} miss(es))")
         elif not uploaded_image:
             st.warning("Please upload an image.")
         else:
@@ -129,6 +291,46 @@ def prompt_builder_tab():
         # A text_area can be used for easier selection:
         st.text_area("Copyable Prompt", value=st.session_state.generated_ai_prompt, height=150, key="copyable_ai_prompt_text_area")
 
+    with st.expander("📚 Batch Mode: many images → Veo manifest"):
+        st.write("Builds a prompt for every image concurrently (within the Gemini quota) and exports a "
+                 "`batch_runner.py` manifest with one Veo image-to-video job per image.")
+        batch_images = st.file_uploader("Images", type=["png", "jpg", "jpeg", "webp"], accept_multiple_files=True, key="prompt_batch_images")
+        batch_shared_idea = st.text_input("Idea for every image", key="prompt_batch_shared_idea",
+                                          placeholder="e.g., Slow cinematic push-in, golden hour")
+        batch_ideas = st.text_area("Per-image ideas (optional, one line per image in upload order; blank lines use the idea above)",
+                                   height=100, key="prompt_batch_ideas")
+        batch_concurrency = st.number_input("Max Concurrent Gemini Calls", 1, 32, PROMPT_BATCH_MAX_CONCURRENCY, key="prompt_batch_concurrency")
+
+        if st.button("🚀 Build Prompts for All Images", key="prompt_batch_button"):
+            ideas = batch_ideas.splitlines()
+            items = [PromptBatchItem(i, f.name, f.getvalue(), (ideas[i].strip() if i < len(ideas) else "") or batch_shared_idea.strip(),
+                                     f.type or "image/png") for i, f in enumerate(batch_images or [])]
+            if not items:
+                st.warning("Please upload at least one image.")
+            elif not all(item.idea for item in items):
+                st.warning("Every image needs an idea: fill in the shared idea or one line per image.")
+            else:
+                progress = st.progress(0.0, text=f"Building {len(items)} prompt(s)...")
+                t0 = time.monotonic()
+                for done, item in enumerate(iter_prompt_batch(items, batch_concurrency, use_cache=not bypass_cache), 1):
+                    progress.progress(done / len(items), text=f"{done}/{len(items)} prompt(s) built")
+                    if item.error:
+                        st.error(f"{item.name}: {item.error}")
+                batch_dir = os.path.join(PROMPT_BATCH_DIR, time.strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:6])
+                manifest_path, bundle_path = export_prompt_manifest(items, batch_dir)
+                built = sum(1 for item in items if item.prompt)
+                st.success(f"Built {built}/{len(items)} prompt(s) in {time.monotonic() - t0:.1f}s. Manifest: `{manifest_path}`")
+                st.dataframe([{"image": item.name, "idea": item.idea, "prompt": item.prompt or "", "error": item.error or "",
+                               "seconds": round(item.latency, 2),
+                               "sent to Gemini": f"{len(item.prepared.data) / 1e6:.2f} MB" if item.prepared else ""} for item in items],
+                             use_container_width=True)
+                if built:
+                    with open(bundle_path, "rb") as bundle:
+                        st.download_button("⬇️ Download Veo manifest + images (zip)", bundle, file_name=f"{os.path.basename(batch_dir)}.zip",
+                                           mime="application/zip", key="prompt_batch_manifest_download")
+                    st.caption("Extract the zip and run `batch_runner.py` on its `manifest.jsonl`; image paths are relative to the manifest.")
+                    st.code(f"python batch_runner.py {manifest_path} --results {os.path.join(batch_dir, 'results.jsonl')}", language="bash")
+
 
 if __name__ == "__main__":
     # This part is for testing the tab independently if needed
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Process-wide, quota-aware scheduling of Vertex AI calls.
+
+Every Veo, Lyria and Gemini request goes through a token bucket for its
+``(project, model family)``, so all Streamlit sessions and worker threads of
+one process share a single budget per quota instead of bursting into 429s.
+Waiting callers are served by priority (interactive before batch), then in
+arrival order. A 429/503 blocks the whole bucket for the server's
+``Retry-After`` (or an exponential backoff with jitter) before the call is
+retried, so the other callers back off too.
+
+Limits are requests per minute, configured as ``QUOTA_LIMITS``, e.g.
+``"veo=10,lyria=30,my-project:veo=40"`` (a ``project:`` prefix overrides the
+family default for that project).
+"""
+import email.utils
+import heapq
+import itertools
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BATCH = 10
+
+DEFAULT_QUOTA_LIMITS = {"veo": 10, "veo-poll": 300, "lyria": 30, "gemini": 60}
+QUOTA_DEFAULT_RPM = float(os.getenv("QUOTA_DEFAULT_RPM", "60"))
+# Bucket capacity in seconds' worth of tokens: how far a quiet bucket may burst.
+QUOTA_BURST_SECONDS = float(os.getenv("QUOTA_BURST_SECONDS", "30"))
+QUOTA_MAX_RETRIES = int(os.getenv("QUOTA_MAX_RETRIES", "5"))
+QUOTA_BASE_BACKOFF_SECONDS = float(os.getenv("QUOTA_BASE_BACKOFF_SECONDS", "2"))
+QUOTA_MAX_BACKOFF_SECONDS = float(os.getenv("QUOTA_MAX_BACKOFF_SECONDS", "120"))
+
+RETRYABLE_STATUS_CODES = (429, 503)
+
+_VERTEX_MODEL_URL_RE = re.compile(r"/projects/([^/]+)/locations/[^/]+/publishers/google/models/([^/:]+):(\w+)")
+
+
+class QuotaWaitTimeout(TimeoutError):
+    """Raised when ``acquire`` could not get a token within its timeout."""
+
+
+def parse_quota_limits(spec):
+    """Parses ``"family=rpm,project:family=rpm"`` into ``{family or (project, family): rpm}``."""
+    limits = {}
+    for item in (spec or "").split(","):
+        key, _, value = item.strip().partition("=")
+        if not key or not value:
+            continue
+        project, _, family = key.strip().rpartition(":")
+        limits[(project, family) if project else family] = float(value)
+    return limits
+
+
+def quota_key_for_url(url):
+    """Maps a Vertex AI model URL to ``(project, family)``, e.g. ``("p", "veo")`` or ``("p", "veo-poll")``; None if unknown."""
+    match = _VERTEX_MODEL_URL_RE.search(url or "")
+    if not match:
+        return None
+    project, model, method = match.groups()
+    family = next((f for f in ("veo", "lyria", "gemini") if model.startswith(f)), model)
+    return project, family + "-poll" if method == "fetchPredictOperation" else family
+
+
+def _status_code(exc):
+    response = getattr(exc, "response", None)
+    if response is not None and getattr(response, "status_code", None):
+        return response.status_code
+    code = getattr(exc, "code", None)  # google.api_core exceptions (Gemini SDK)
+    return int(code) if isinstance(code, int) else None
+
+
+def retry_after_seconds(exc, now=None):
+    """Seconds from a ``Retry-After`` header (delta or HTTP date) on the error's response, else None."""
+    response = getattr(exc, "response", None)
+    value = response.headers.get("Retry-After") if response is not None and getattr(response, "headers", None) else None
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at - (now or time.time()))
+
+
+class _Bucket:
+    def __init__(self, rpm, now):
+        self.rate = rpm / 60.0
+        self.capacity = max(1.0, self.rate * QUOTA_BURST_SECONDS)
+        self.tokens = self.capacity
+        self.updated = now
+        self.blocked_until = 0.0
+        self.waiters = []  # heap of (priority, seq)
+        self.throttled = 0
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else 1.0
+
+
+class QuotaScheduler:
+    def __init__(self, limits=None, clock=time.monotonic):
+        self.limits = {**DEFAULT_QUOTA_LIMITS, **parse_quota_limits(os.getenv("QUOTA_LIMITS", "")), **(limits or {})}
+        self._clock = clock
+        self._buckets = {}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+
+    def rpm_for(self, key):
+        project, family = key
+        return self.limits.get((project, family), self.limits.get(family, QUOTA_DEFAULT_RPM))
+
+    def _bucket(self, key):
+        if key not in self._buckets:
+            self._buckets[key] = _Bucket(self.rpm_for(key), self._clock())
+        return self._buckets[key]
+
+    def acquire(self, key, priority=PRIORITY_NORMAL, timeout=None):
+        """Blocks until ``key``'s bucket grants a token to this caller (highest priority first)."""
+        with self._cond:
+            bucket = self._bucket(key)
+            ticket = (priority, next(self._seq))
+            heapq.heappush(bucket.waiters, ticket)
+            deadline = None if timeout is None else self._clock() + timeout
+            try:
+                while True:
+                    now = self._clock()
+                    bucket.refill(now)
+                    if bucket.waiters[0] == ticket and bucket.tokens >= 1 and now >= bucket.blocked_until:
+                        bucket.tokens -= 1
+                        return
+                    wait = bucket.wait_time(now)
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise QuotaWaitTimeout(f"No {key[1]} quota for {key[0]} within {timeout}s")
+                        wait = min(wait, deadline - now)
+                    self._cond.wait(max(0.01, wait))
+            finally:
+                bucket.waiters.remove(ticket)
+                heapq.heapify(bucket.waiters)
+                self._cond.notify_all()
+
+    def penalize(self, key, seconds):
+        """Blocks ``key``'s bucket for ``seconds`` (quota exceeded upstream) and drops its burst."""
+        with self._cond:
+            bucket = self._bucket(key)
+            bucket.blocked_until = max(bucket.blocked_until, self._clock() + seconds)
+            bucket.tokens = min(bucket.tokens, 0.0)
+            bucket.throttled += 1
+            self._cond.notify_all()
+
+    def call(self, key, fn, priority=PRIORITY_NORMAL, max_retries=QUOTA_MAX_RETRIES):
+        """Runs ``fn()`` under ``key``'s quota, retrying 429/503 responses after backing off."""
+        for attempt in range(max_retries + 1):
+            self.acquire(key, priority)
+            try:
+                return fn()
+            except Exception as e:
+                if _status_code(e) not in RETRYABLE_STATUS_CODES or attempt == max_retries:
+                    raise
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = min(QUOTA_MAX_BACKOFF_SECONDS, QUOTA_BASE_BACKOFF_SECONDS * 2 ** attempt) * random.uniform(0.8, 1.2)
+                logger.warning("%s quota hit for %s (%s); backing off %.1fs", key[1], key[0], e, delay)
+                self.penalize(key, delay)
+
+    def snapshot(self):
+        """Per-bucket state for display: ``{(project, family): {...}}``."""
+        with self._cond:
+            now = self._clock()
+            for bucket in self._buckets.values():
+                bucket.refill(now)
+            return {key: {"rpm": b.rate * 60, "tokens": round(b.tokens, 1), "waiting": len(b.waiters),
+                          "blocked_for": round(max(0.0, b.blocked_until - now), 1), "throttled": b.throttled}
+                    for key, b in self._buckets.items()}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_quota_scheduler():
+    """Returns the process-wide ``QuotaScheduler``."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = QuotaScheduler()
+        return _scheduler
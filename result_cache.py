@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Opt-in cache of Veo results for fully determined requests.
+
+A request with a fixed ``seed`` always produces the same clips, so the
+canonical hash of (model, composed request) is mapped to the output
+GCS URIs and local files of the first run. Inputs are content-addressed in GCS
+(see ``gcs_utils``), so the input's content hash is part of the key through
+its URI. Fields that only depend on the target a job was routed to (the
+output ``storageUri`` and the bucket an input was uploaded to) are left out
+of the key, so an identical request hits whichever target serves it. Entries expire after ``RESULT_CACHE_TTL_SECONDS`` and the least recently
+used ones are evicted beyond ``RESULT_CACHE_MAX_ENTRIES``.
+"""
+import copy
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+VEO_CACHE_DIR = os.getenv("VEO_CACHE_DIR", ".veo_cache")
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(VEO_CACHE_DIR, "results.sqlite3"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "500"))
+
+
+def is_cacheable(request_body):
+    """Only requests with an explicit seed are deterministic enough to reuse."""
+    return (request_body or {}).get("parameters", {}).get("seed") is not None
+
+
+_CONTENT_ADDRESSED_URI_RE = re.compile(r"^gs://[^/]+/(.*/)?([0-9a-f]{64})(\.\w+)?$")
+
+
+def _canonical_request(request_body):
+    """``request_body`` without its per-target fields: no ``storageUri``, content-addressed inputs keyed by hash."""
+    request = copy.deepcopy(request_body or {})
+    request.get("parameters", {}).pop("storageUri", None)
+    for instance in request.get("instances", []):
+        for media in instance.values():
+            match = _CONTENT_ADDRESSED_URI_RE.match(media.get("gcsUri") or "") if isinstance(media, dict) else None
+            if match:
+                media["gcsUri"] = "sha256:" + match.group(2)
+    return request
+
+
+def request_cache_key(predict_endpoint, request_body):
+    # Key on the model, not the project/region/bucket serving it; the entry stores the actual output URIs.
+    model = predict_endpoint.rsplit("/models/", 1)[-1].split(":", 1)[0]
+    canonical = json.dumps({"model": model, "request": _canonical_request(request_body)}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def cached_operation_result(entry, cache_key):
+    """Builds an operation-shaped dict for a cache hit, annotated with the cached local files."""
+    return {"done": True, "response": {"videos": [{"gcsUri": uri} for uri in entry["output_uris"]]},
+            "_cached": True, "_cache_key": cache_key, "_local_files": entry["local_files"]}
+
+
+class ResultCache:
+    def __init__(self, path=RESULT_CACHE_PATH, ttl=RESULT_CACHE_TTL_SECONDS, max_entries=RESULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, output_uris TEXT NOT NULL, local_files TEXT NOT NULL,"
+                         " created_at REAL NOT NULL, last_used_at REAL NOT NULL)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        """Returns ``{'output_uris', 'local_files'}`` for a live entry, else None."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT output_uris, local_files, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            if now - row[2] > self.ttl:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE results SET last_used_at = ? WHERE key = ?", (now, key))
+        return {"output_uris": json.loads(row[0]), "local_files": json.loads(row[1])}
+
+    def put(self, key, output_uris, local_files=None):
+        if not output_uris:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO results (key, output_uris, local_files, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                         (key, json.dumps(output_uris), json.dumps(local_files or []), now, now))
+            conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl,))
+            conn.execute("DELETE FROM results WHERE key NOT IN (SELECT key FROM results ORDER BY last_used_at DESC LIMIT ?)", (self.max_entries,))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Returns the process-wide ``ResultCache``."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
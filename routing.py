@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Spreads Veo jobs across a pool of (project, region, bucket) targets.
+
+One project's Veo quota caps throughput, so jobs can be routed over several
+projects and regions. Targets come from ``VEO_TARGETS``, a comma-separated
+list of ``project:region:bucket[:weight]`` entries, for example::
+
+    VEO_TARGETS="veo-a:us-central1:veo-a-out:10,veo-b:europe-west4:veo-b-out:5"
+
+Without a weight, a target is weighted by its configured Veo quota (see
+``quota_scheduler``). Jobs are assigned by smooth weighted round-robin, so each
+target gets its share of jobs evenly interleaved. Wherever a job runs, its
+inputs go to the target's bucket (Veo reads them from there), its outputs are
+downloaded to the same local output directory, and it is recorded in the one
+job store. Without ``VEO_TARGETS`` the sidebar's project and bucket are the
+only target.
+"""
+import os
+import threading
+from dataclasses import dataclass
+
+from quota_scheduler import get_quota_scheduler
+from veo_api import veo_endpoints
+
+DEFAULT_VEO_REGION = os.getenv("VEO_REGION", "us-central1")
+
+
+@dataclass(frozen=True)
+class VeoTarget:
+    project_id: str
+    region: str
+    bucket: str
+    weight: float = 1.0
+
+    @property
+    def label(self):
+        return f"{self.project_id}/{self.region}"
+
+    def endpoints(self, model_url):
+        """``(predictLongRunning, fetchPredictOperation)`` URLs of ``model_url`` on this target."""
+        return veo_endpoints(self.project_id, model_url, self.region)
+
+    def storage_uri(self, subdir):
+        return f"gs://{self.bucket}/{subdir}"
+
+
+def parse_targets(spec, default_region=DEFAULT_VEO_REGION):
+    """Parses ``VEO_TARGETS``; an entry without weight is weighted by its project's Veo quota."""
+    targets = []
+    for item in (spec or "").split(","):
+        fields = [f.strip() for f in item.strip().split(":")]
+        if len(fields) < 3 or not fields[0] or not fields[2]:
+            if item.strip():
+                raise ValueError(f"Invalid VEO_TARGETS entry {item!r}; expected project:region:bucket[:weight]")
+            continue
+        project_id, region, bucket = fields[0], fields[1] or default_region, fields[2]
+        weight = float(fields[3]) if len(fields) > 3 and fields[3] else get_quota_scheduler().rpm_for((project_id, "veo"))
+        targets.append(VeoTarget(project_id, region, bucket, weight))
+    return targets
+
+
+class TargetRouter:
+    def __init__(self, targets):
+        if not targets:
+            raise ValueError("TargetRouter needs at least one target")
+        self.targets = list(targets)
+        self._current = [0.0] * len(self.targets)
+        self._lock = threading.Lock()
+
+    def next_target(self):
+        """Smooth weighted round-robin: weights 2:1 give A, B, A, A, B, A, ..."""
+        with self._lock:
+            total = sum(t.weight for t in self.targets)
+            for i, target in enumerate(self.targets):
+                self._current[i] += target.weight
+            best = max(range(len(self.targets)), key=self._current.__getitem__)
+            self._current[best] -= total
+            return self.targets[best]
+
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(default_project_id, default_bucket, region=DEFAULT_VEO_REGION):
+    """Returns the router for ``VEO_TARGETS``, or a single-target one for the given project and bucket."""
+    spec = os.getenv("VEO_TARGETS", "")
+    key = (spec, default_project_id, default_bucket, region)
+    with _routers_lock:
+        if key not in _routers:
+            _routers[key] = TargetRouter(parse_targets(spec, region) or [VeoTarget(default_project_id, region, default_bucket)])
+        return _routers[key]
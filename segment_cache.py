@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Content-addressed store of Movie Creator inputs and rendered segments.
+
+Uploads are stored once under ``VEO_CACHE_DIR/movie_segments/inputs``, named
+by the SHA-256 of their bytes, instead of being rewritten as temp files on
+every run. A rendered segment is keyed by its input's hash plus everything
+that changes its pixels or packets (caption text, font, tempo and the
+``SegmentSettings`` shared by the movie's segments), so re-running the Movie
+Creator after editing one clip renders just that clip and the others are
+joined from the cache. Files are indexed in SQLite; once the store exceeds
+``SEGMENT_CACHE_MAX_BYTES``, ``evict`` removes the least recently used ones.
+Files a run in this process has pinned, and files any process used in the
+last ``SEGMENT_CACHE_MIN_AGE_SECONDS``, are never evicted, so a run still
+rendering or joining segments doesn't lose them to another run's eviction.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+VEO_CACHE_DIR = os.getenv("VEO_CACHE_DIR", ".veo_cache")
+SEGMENT_CACHE_DIR = os.getenv("SEGMENT_CACHE_DIR", os.path.join(VEO_CACHE_DIR, "movie_segments"))
+SEGMENT_CACHE_MAX_BYTES = int(os.getenv("SEGMENT_CACHE_MAX_BYTES", str(4 * 1024 ** 3)))
+SEGMENT_CACHE_MIN_AGE_SECONDS = float(os.getenv("SEGMENT_CACHE_MIN_AGE_SECONDS", "600"))
+# Bump when the segment rendering itself changes (caption style, encoder options...).
+SEGMENT_FORMAT_VERSION = 1
+
+
+def segment_cache_key(input_digest, text, font, tempo, settings):
+    """Hash of everything that affects a rendered segment; ``settings`` is its ``SegmentSettings``."""
+    canonical = json.dumps({"input": input_digest, "text": text, "font": font, "tempo": tempo,
+                            "size": [settings.width, settings.height], "fps": settings.fps, "audio": settings.audio,
+                            "codec": settings.codec, "version": SEGMENT_FORMAT_VERSION},
+                           sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SegmentCache:
+    def __init__(self, directory=SEGMENT_CACHE_DIR, max_bytes=SEGMENT_CACHE_MAX_BYTES, min_age=SEGMENT_CACHE_MIN_AGE_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pinned = Counter()  # path -> runs in this process using it
+        for sub in ("inputs", "segments"):
+            os.makedirs(os.path.join(directory, sub), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER NOT NULL,"
+                         " duration REAL, last_used_at REAL NOT NULL)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _record(self, path, duration=None):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO files (path, size, duration, last_used_at) VALUES (?, ?, ?, ?)",
+                         (path, os.path.getsize(path), duration, time.time()))
+
+    def store_input(self, data, file_name):
+        """Stores an uploaded buffer once by content; returns ``(path, sha256 hex digest)``. The buffer is not copied."""
+        data = memoryview(data)
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.directory, "inputs", digest + os.path.splitext(file_name)[1].lower())
+        if not (os.path.exists(path) and os.path.getsize(path) == data.nbytes):
+            partial = f"{path}.{uuid.uuid4().hex[:8]}.part"
+            with open(partial, "wb") as f:
+                f.write(data)
+            os.replace(partial, path)
+        self._record(path)
+        return path, digest
+
+    def segment_path(self, key):
+        return os.path.join(self.directory, "segments", key + ".mp4")
+
+    def staging_path(self, key):
+        """Where to render a segment before ``put_segment`` (keeps the .mp4 extension ffmpeg needs)."""
+        return os.path.join(self.directory, "segments", f"{key}.{uuid.uuid4().hex[:8]}.part.mp4")
+
+    def get_segment(self, key):
+        """Returns ``(path, duration)`` of the cached segment, or None."""
+        path = self.segment_path(key)
+        with self._connect() as conn:
+            row = conn.execute("SELECT duration FROM files WHERE path = ?", (path,)).fetchone()
+            if row and os.path.exists(path):
+                conn.execute("UPDATE files SET last_used_at = ? WHERE path = ?", (time.time(), path))
+            else:
+                row = None
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return (path, row[0]) if row else None
+
+    def put_segment(self, key, rendered_path, duration):
+        """Moves a segment rendered at ``rendered_path`` into the cache; returns its cached path."""
+        path = self.segment_path(key)
+        os.replace(rendered_path, path)
+        self._record(path, duration)
+        return path
+
+    def pin(self, *paths):
+        """Keeps ``paths`` from being evicted until they are unpinned; returns them."""
+        with self._lock:
+            self._pinned.update(paths)
+        return paths
+
+    def unpin(self, *paths):
+        with self._lock:
+            self._pinned.subtract(paths)
+            self._pinned += Counter()  # Drops paths no run uses any more
+
+    def evict(self):
+        """Deletes least recently used files until the store fits in ``max_bytes``; returns how many were removed.
+
+        Pinned files and files used in the last ``min_age`` seconds are kept, even if the store stays over the limit.
+        """
+        cutoff = time.time() - self.min_age
+        with self._lock:
+            pinned = set(self._pinned)
+        with self._connect() as conn:
+            rows = conn.execute("SELECT path, size, last_used_at FROM files ORDER BY last_used_at DESC").fetchall()
+            total, evicted = 0, []
+            for path, size, last_used_at in rows:
+                total += size
+                if total > self.max_bytes and last_used_at < cutoff and path not in pinned:
+                    evicted.append(path)
+            conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in evicted])
+        for path in evicted:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return len(evicted)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_segment_cache():
+    """Returns the process-wide ``SegmentCache``."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SegmentCache()
+        return _cache
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Renders Movie Creator clips to segments in parallel worker processes.
+
+Compositing every clip into one MoviePy graph encodes the whole movie on a
+single pipeline, with frame decoding, caption blending and the Python side of
+the encode all bound to one core. Here each clip (tempo change, caption,
+padding to the movie's frame size) is encoded on its own to an intermediate
+segment in a process pool, one clip per worker, and the segments are then
+joined losslessly with ffmpeg's concat demuxer (``ffmpeg_tools``). All
+segments share ``SegmentSettings`` (size, fps, codec, audio format) so their
+packets can be copied as they are. Workers are started with ``spawn`` because
+forking the multi-threaded Streamlit server is unsafe.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+
+SEGMENT_RENDER_WORKERS = int(os.getenv("SEGMENT_RENDER_WORKERS", str(os.cpu_count() or 1)))
+SEGMENT_VIDEO_CODEC = os.getenv("SEGMENT_VIDEO_CODEC", "libx264")
+SEGMENT_AUDIO_FPS = 44100  # MoviePy reads clip audio as 44.1 kHz stereo; silent tracks match it
+
+
+@dataclass
+class SegmentSettings:
+    width: int
+    height: int
+    fps: float
+    audio: bool = True  # False when a music track replaces the clips' own audio
+    codec: str = SEGMENT_VIDEO_CODEC
+    threads: int = 1  # Encoder threads per worker
+
+
+@dataclass
+class Segment:
+    index: int
+    input_path: str
+    output_path: str
+    text: str = ""
+    font: str = "Arial"
+    tempo: float = 1.0
+    key: str = None  # Segment cache key
+    duration: float = None
+    seconds: float = None
+    raster_hits: int = 0
+    raster_misses: int = 0
+    error: str = None
+
+
+def plan_segment_settings(paths, audio=True):
+    """Settings for segments of the clips in ``paths``: the largest frame and highest fps among them.
+
+    Matches ``concatenate_videoclips(method="compose")``, which centers smaller clips on a black canvas.
+    """
+    from moviepy.editor import VideoFileClip  # Slow to import; only loaded when a movie is rendered
+
+    sizes, rates = [], []
+    for path in paths:
+        clip = VideoFileClip(path, audio=False)
+        try:
+            sizes.append(clip.size)
+            rates.append(clip.fps)
+        finally:
+            clip.close()
+    width, height = max(w for w, _ in sizes), max(h for _, h in sizes)
+    # yuv420p needs even dimensions.
+    return SegmentSettings(width + width % 2, height + height % 2, max(rates), audio)
+
+
+def _silence(duration):
+    from moviepy.editor import AudioClip
+
+    return AudioClip(lambda t: [0, 0] if not hasattr(t, "__len__") else [[0, 0]] * len(t), duration=duration, fps=SEGMENT_AUDIO_FPS)
+
+
+def render_segment(segment, settings):
+    """Encodes one clip to ``segment.output_path``; fills ``duration``, ``seconds`` and ``error`` and never raises.
+
+    Runs in a worker process, so ``segment`` is a copy: use the returned one.
+    """
+    from moviepy.editor import VideoFileClip
+    from caption_engine import add_word_by_word_caption
+    from text_raster_cache import get_text_raster_cache
+
+    t0 = time.monotonic()
+    raster_cache = get_text_raster_cache()
+    hits_before, misses_before = raster_cache.hits, raster_cache.misses
+    source = None
+    try:
+        source = VideoFileClip(segment.input_path, audio=settings.audio)
+        clip = source
+        if segment.tempo != 1.0:
+            clip = clip.speedx(segment.tempo)
+        if segment.text.strip():
+            clip = add_word_by_word_caption(clip, segment.text, segment.font, speed_factor=1.5)
+        if tuple(clip.size) != (settings.width, settings.height):
+            clip = clip.on_color(size=(settings.width, settings.height), color=(0, 0, 0), pos="center")
+        if settings.audio and clip.audio is None:
+            clip = clip.set_audio(_silence(clip.duration))
+        clip.write_videofile(segment.output_path, fps=settings.fps, codec=settings.codec, audio=settings.audio,
+                             audio_codec="aac", audio_fps=SEGMENT_AUDIO_FPS, threads=settings.threads,
+                             ffmpeg_params=["-pix_fmt", "yuv420p"], verbose=False, logger=None)
+        segment.duration = clip.duration
+    except Exception as e:
+        segment.error = str(e)
+    finally:
+        if source is not None:
+            source.close()
+    segment.raster_hits = raster_cache.hits - hits_before
+    segment.raster_misses = raster_cache.misses - misses_before
+    segment.seconds = time.monotonic() - t0
+    return segment
+
+
+def iter_segment_renders(segments, settings, max_workers=SEGMENT_RENDER_WORKERS):
+    """Renders ``segments`` in a process pool and yields each (the worker's copy) as it finishes.
+
+    Cores are shared out between workers and their encoders' threads (on a
+    copy of ``settings``; the caller's is left as it is).
+    """
+    if not segments:
+        return
+    workers = max(1, min(max_workers, len(segments)))
+    settings = replace(settings, threads=max(1, (os.cpu_count() or 1) // workers))
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futures = [executor.submit(render_segment, segment, settings) for segment in segments]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
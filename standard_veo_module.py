@@ -1,9 +1,5 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
-import requests
-import time
-import google.auth
-import google.auth.transport.requests
 from google.cloud import storage
 import os
 import uuid
@@ -13,11 +9,17 @@ from dotenv import load_dotenv
 
 # Google Drive API imports
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 from google.auth.transport.requests import Request as GoogleAuthRequest # Alias to avoid conflict
 
+from gcp_auth import get_token_provider
+from gcs_utils import upload_buffer
+from http_transport import http_get
+from image_preprocess import prepare_upload, IMAGE_CROP_TO_ASPECT
+from routing import get_router
+from veo_api import VEO_STANDARD_MODEL_URL, extract_video_uris
+from veo_batch import VeoBatchJob, run_veo_batch, VEO_BATCH_MAX_CONCURRENCY
+from media_server import media_url
+
 # Load environment variables (though main app also does this)
 load_dotenv()
 
@@ -27,10 +29,11 @@ load_dotenv()
 V0_DEFAULT_PROJECT_ID = os.getenv("DEFAULT_PROJECT_ID", "veo-testing") # Will be overridden by arg
 V0_DEFAULT_OUTPUT_GCS_BUCKET = os.getenv("DEFAULT_OUTPUT_GCS_BUCKET", "fk-test-veo") # Will be overridden
 V0_CLIENT_SECRETS_FILE = os.getenv("CLIENT_SECRETS_FILE", "credentials.json")
-V0_DEFAULT_DRIVE_FOLDER_LINK_ENV = os.getenv("DEFAULT_DRIVE_FOLDER_LINK", "https://drive.google.com/drive/folders/15SK65dQ7bsFIYPR1y9UXmwPgoqK7X41b?resourcekey=0-Zc4YZjA43nl6weUSbHsOWQ&usp=drive_link") # Will be overridden
+V0_DEFAULT_DRIVE_FOLDER_LINK_ENV = os.getenv("DEFAULT_DRIVE_FOLDER_LINK", "") # Will be overridden
 
 V0_IMAGE_UPLOAD_GCS_PREFIX = os.getenv("IMAGE_UPLOAD_GCS_PREFIX", "uploads/")
 V0_TEMP_IMAGE_DIR = os.getenv("DEFAULT_TEMP_IMAGE_DIR", "temp_images")
+V0_OUTPUT_GCS_SUBDIR = "video_outputs_v0_std/"
 
 
 # --- Helper Functions (Copied from v0-streamlit.py, prefixed with v0_ or kept local) ---
@@ -57,6 +60,7 @@ def v0_get_drive_service():
                 st.error(f"OAuth client secrets file ('{V0_CLIENT_SECRETS_FILE}') not found.")
                 return None
             try:
+                from google_auth_oauthlib.flow import InstalledAppFlow
                 flow = InstalledAppFlow.from_client_secrets_file(V0_CLIENT_SECRETS_FILE, DRIVE_SCOPES_V0)
                 auth_url, _ = flow.authorization_url(prompt='consent')
                 # This interactive part is problematic for a module.
@@ -77,7 +81,9 @@ def v0_get_drive_service():
         except Exception as e: st.error(f"Error saving Drive token (v0 module): {e}")
     
     if creds and creds.valid:
-        try: return build('drive', 'v3', credentials=creds)
+        try:
+            from googleapiclient.discovery import build
+            return build('drive', 'v3', credentials=creds)
         except Exception as e: st.error(f"Error building Drive service (v0 module): {e}")
     return None
 
@@ -98,6 +104,7 @@ def v0_upload_to_drive(drive_service, folder_id, file_path, file_name=None):
     try:
         drive_mime_type, _ = mimetypes.guess_type(file_path)
         if drive_mime_type is None: drive_mime_type = 'application/octet-stream'
+        from googleapiclient.http import MediaFileUpload
         media = MediaFileUpload(file_path, mimetype=drive_mime_type, resumable=True)
         with st.spinner(f"Uploading {file_name} to Google Drive (v0)..."):
             request = drive_service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink')
@@ -118,7 +125,7 @@ def v0_upload_to_drive(drive_service, folder_id, file_path, file_name=None):
 def v0_download_image_from_url(image_url, temp_dir=V0_TEMP_IMAGE_DIR):
     if not image_url: return None
     try:
-        response_req = requests.get(image_url, stream=True) # Renamed
+        response_req = http_get(image_url, stream=True) # Renamed
         response_req.raise_for_status() 
         parsed_url = urlparse(image_url)
         original_filename = os.path.basename(parsed_url.path) or f"{uuid.uuid4()}.jpg"
@@ -133,102 +140,65 @@ def v0_download_image_from_url(image_url, temp_dir=V0_TEMP_IMAGE_DIR):
 
 def v0_get_gcs_client():
     try:
-        credentials, project = google.auth.default()
-        return storage.Client(credentials=credentials)
+        return storage.Client(credentials=get_token_provider().get_credentials(refresh=False))
     except Exception as e: st.error(f"Error initializing GCS client (v0): {e}"); return None
 
-def v0_upload_to_gcs(storage_client, bucket_name, source_file_path, destination_blob_name):
+def v0_upload_image_to_gcs(storage_client, bucket_name, image_data, file_name, destination_blob_name_prefix, aspect_ratio="16:9"):
+    """Downscales/re-encodes an image for Veo, uploads it content-addressed and returns ``(gcs_uri, mime_type)``."""
     if not storage_client: return None, None
-    try:
-        bucket = storage_client.bucket(bucket_name)
-        mime_type, _ = mimetypes.guess_type(source_file_path)
-        if mime_type is None: mime_type = 'application/octet-stream'
-        blob = bucket.blob(destination_blob_name)
-        blob.upload_from_filename(source_file_path, content_type=mime_type)
-        gcs_uri = f"gs://{bucket_name}/{destination_blob_name}"
-        st.info(f"File {source_file_path} uploaded to {gcs_uri} (v0)")
+    try: # Prepared in memory, then hashed and streamed from the buffer.
+        payload, upload_name, mime_type, prepared = prepare_upload(image_data, file_name, aspect_ratio,
+                                                                   crop=st.session_state.get("crop_input_frames", IMAGE_CROP_TO_ASPECT))
+        if prepared: st.caption(f"🖼️ {prepared.describe(file_name)}")
+        gcs_uri, _, uploaded = upload_buffer(storage_client, bucket_name, payload, upload_name, destination_blob_name_prefix)
+        if uploaded: st.info(f"File {file_name} uploaded to {gcs_uri} (v0)")
+        else: st.info(f"Identical file already in GCS, skipped upload: {gcs_uri} (v0)")
         return gcs_uri, mime_type
-    except Exception as e: st.error(f"Error uploading {source_file_path} to GCS (v0): {e}"); return None, None
+    except Exception as e: st.error(f"Error uploading {file_name} to GCS (v0): {e}"); return None, None
 
-def v0_download_from_gcs(storage_client, bucket_name, source_blob_name, destination_file_name):
-    if not storage_client: return False
-    try:
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(source_blob_name)
-        os.makedirs(os.path.dirname(destination_file_name), exist_ok=True)
-        blob.download_to_filename(destination_file_name)
-        st.info(f"File {source_blob_name} downloaded to {destination_file_name} (v0)")
-        return True
-    except Exception as e: st.error(f"Error downloading {source_blob_name} from GCS (v0): {e}"); return False
-
-def v0_send_request_to_google_api(api_endpoint, data=None): # project_id removed as it's in endpoint
-    try:
-        creds, _ = google.auth.default(scopes=['https://www.googleapis.com/auth/cloud-platform'])
-        auth_req = google.auth.transport.requests.Request()
-        creds.refresh(auth_req)
-        headers = {'Authorization': f'Bearer {creds.token}', 'Content-Type': 'application/json'}
-        response_req = requests.post(api_endpoint, headers=headers, json=data) # Renamed
-        response_req.raise_for_status()
-        return response_req.json()
-    except Exception as e: st.error(f"An error occurred sending request to Google API (v0): {e}"); return None
+def v0_upload_uploaded_file_to_gcs(storage_client, bucket_name, uploaded_file_obj, destination_blob_name_prefix, aspect_ratio="16:9"):
+    return v0_upload_image_to_gcs(storage_client, bucket_name, uploaded_file_obj.getbuffer(), uploaded_file_obj.name, destination_blob_name_prefix, aspect_ratio)
 
 def v0_compose_videogen_request(prompt, parameters, image_gcs_uri: str = "", image_mime_type: str = "image/png"):
   instance = {"prompt": prompt}
   if image_gcs_uri: instance["image"] = {"gcsUri": image_gcs_uri, "mimeType": image_mime_type}
   return {"instances": [instance], "parameters": parameters}
 
-def v0_fetch_operation(fetch_api_endpoint, lro_name): # project_id removed
-  request_payload = {'operationName': lro_name}
-  max_retries = 60
-  with st.spinner(f"Fetching operation status for {lro_name} (v0)..."):
-    for i in range(max_retries):
-        resp = v0_send_request_to_google_api(fetch_api_endpoint, data=request_payload)
-        if resp:
-            st.write(f"Attempt {i+1}/{max_retries}: Checking status (v0)...")
-            if 'done' in resp and resp['done']: st.success(f"Operation {lro_name} completed (v0)."); return resp
-        else: st.error("Failed to fetch operation status (v0). Aborting."); return None
-        time.sleep(10)
-  st.warning(f"Operation {lro_name} did not complete (v0)."); return None
-
-def v0_generate_video_api_call(predict_api_endpoint, fetch_api_endpoint, prompt, parameters, image_gcs_uri: str = "", image_mime_type: str = "image/png"): # project_id removed
-  req = v0_compose_videogen_request(prompt, parameters, image_gcs_uri, image_mime_type)
-  st.write("Sending video generation request (v0)..."); st.json(req)
-  resp = v0_send_request_to_google_api(predict_api_endpoint, data=req)
-  if resp and 'name' in resp:
-    st.info(f"Video generation initiated (v0). Operation name: {resp['name']}")
-    return v0_fetch_operation(fetch_api_endpoint, resp['name'])
-  else:
-    st.error("Failed to initiate video generation (v0)."); 
-    if resp: st.json(resp)
-  return None
-
-def v0_process_and_display_videos(operation_result, gcs_client_main, current_local_output_dir, source_identifier="video_v0", drive_service_main=None, drive_folder_id_main=None, current_drive_folder_link_main=None):
-    if operation_result and operation_result.get('response') and operation_result['response'].get('videos'):
-        st.success(f"Video generation successful for {source_identifier}!")
-        videos_data = operation_result['response']['videos']
-        os.makedirs(current_local_output_dir, exist_ok=True)
-        for i, video_info in enumerate(videos_data):
-            video_gcs_uri = video_info.get('gcsUri')
-            if video_gcs_uri and video_gcs_uri.startswith("gs://"):
-                parts = video_gcs_uri[5:].split("/", 1)
-                video_bucket_name, video_blob_name = parts[0], parts[1] if len(parts) > 1 else ""
-                base_name = os.path.basename(video_blob_name) or f"video_{uuid.uuid4()}.mp4" # Ensure mp4 extension
-                local_video_filename = os.path.join(current_local_output_dir, f"generated_{source_identifier}_sample_{i+1}_{base_name}")
-                if v0_download_from_gcs(gcs_client_main, video_bucket_name, video_blob_name, local_video_filename):
-                    st.success(f"Video downloaded: {local_video_filename}")
-                    with open(local_video_filename, "rb") as fp:
-                        st.download_button(f"Download Video ({source_identifier} S{i+1})", fp, os.path.basename(local_video_filename), "video/mp4", key=f"v0_dl_vid_{source_identifier}_{i}")
-                    st.video(local_video_filename, autoplay=True, muted=True)
-                    if drive_service_main and drive_folder_id_main: 
-                        v0_upload_to_drive(drive_service_main, drive_folder_id_main, local_video_filename)
-                else: st.error(f"Failed to download {video_gcs_uri}")
-            else: st.warning(f"Invalid or missing GCS URI for video sample {i+1}")
-    elif operation_result and operation_result.get('error'):
-        st.error(f"Video generation failed for {source_identifier}: {operation_result['error'].get('message', 'Unknown error')}")
-        st.json(operation_result['error'])
-    else:
-        st.error(f"Video generation failed or timed out for {source_identifier}.")
-        if operation_result: st.json(operation_result)
+def v0_routed_batch_job(name, target, prompt, parameters, image_gcs_uri="", image_mime_type="image/png"):
+    """Builds a batch job bound to ``target``: its endpoints, and its bucket for the outputs."""
+    predict_endpoint, fetch_endpoint = target.endpoints(VEO_STANDARD_MODEL_URL)
+    parameters = {**parameters, "storageUri": target.storage_uri(V0_OUTPUT_GCS_SUBDIR)}
+    return VeoBatchJob(name, v0_compose_videogen_request(prompt, parameters, image_gcs_uri, image_mime_type),
+                       predict_endpoint=predict_endpoint, fetch_endpoint=fetch_endpoint, target=target.label)
+
+def v0_display_batch_job(job, drive_service_main=None, drive_folder_id_main=None, drive_mirror=None, storage_client=None):
+    st.markdown(f"--- \n ### Result (v0): {job.name}")
+    if not job.ok:
+        st.error(f"Video generation failed for {job.name}: {job.error}")
+        if job.result and job.result.get('error'): st.json(job.result['error'])
+        return
+    timings = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in job.timings.items())
+    st.success(f"Video generation successful for {job.name}!{' (from result cache)' if job.cached else ''} ({timings}{', ' + job.target if job.target else ''})")
+    if job.download_summary: st.caption(f"Downloaded {job.download_summary}")
+    gcs_uris = extract_video_uris(job.result)
+    for i, local_video_filename in enumerate(job.local_files):
+        st.success(f"Video downloaded: {local_video_filename}")
+        # Streamed by URL from disk (or a signed GCS URL) so the app never holds the video bytes.
+        gcs_uri = gcs_uris[i] if i < len(gcs_uris) else None
+        video_url = media_url(local_video_filename, gcs_uri, storage_client)
+        if video_url:
+            st.video(video_url, autoplay=True, muted=True)
+            st.markdown(f"[⬇️ Download Video ({job.name} S{i+1})]({media_url(local_video_filename, gcs_uri, storage_client, download=True)})")
+        else:
+            with open(local_video_filename, "rb") as fp:
+                st.download_button(f"Download Video ({job.name} S{i+1})", fp, os.path.basename(local_video_filename), "video/mp4", key=f"v0_dl_vid_{job.name}_{i}")
+            st.video(local_video_filename, autoplay=True, muted=True)
+        if drive_service_main and drive_folder_id_main and not drive_mirror:
+            v0_upload_to_drive(drive_service_main, drive_folder_id_main, local_video_filename)
+    if drive_mirror and drive_folder_id_main and job.local_files:
+        # Uploads run on the mirror's worker pool; the next job is rendered without waiting.
+        drive_mirror.mirror(job.local_files, drive_folder_id_main)
+        st.info(f"Mirroring {len(job.local_files)} file(s) to Google Drive in the background (v0).")
 
 
 # This is the main function to be called by veo_streamlit_app.py for the tab
@@ -241,7 +211,12 @@ def display_standard_veo_tab_from_v0(
     # Helper functions/clients from the main app
     main_gcs_client,
     main_get_drive_service_func, # This is tricky due to interactive auth in v0_get_drive_service
-    main_extract_folder_id_from_link_func
+    main_extract_folder_id_from_link_func,
+    # Background Drive uploader shared with the other tabs (see drive_mirror.py)
+    main_drive_mirror=None,
+    # Opt-in result cache for fixed-seed requests (sidebar toggles)
+    main_use_result_cache=False,
+    main_force_regenerate=False,
     # Note: The v0 code has its own API call and processing logic.
     # Reusing main app's API call functions would require more refactoring of v0 logic.
     # For now, v0 module uses its own API call chain.
@@ -263,6 +238,7 @@ def display_standard_veo_tab_from_v0(
         duration_input = st.number_input("Duration (seconds)", value=8, min_value=1, max_value=60, key="v0_std_duration")
     with col3:
         enhance_prompt_input = st.checkbox("Enhance Prompt", value=False, key="v0_std_enhance")
+        max_concurrency_input = st.number_input("Max Concurrent Jobs", value=VEO_BATCH_MAX_CONCURRENCY, min_value=1, max_value=32, key="v0_std_concurrency")
 
     if st.button("Generate Video (v0 Logic)", key="v0_std_generate_btn"):
         if not main_project_id: st.error("Project ID is required (from main app config).")
@@ -277,7 +253,9 @@ def display_standard_veo_tab_from_v0(
             # A better approach would be for the main app to handle Drive auth once and pass the service.
             current_drive_service = None
             current_target_drive_folder_id = None
-            if main_drive_folder_link:
+            if main_drive_folder_link and main_drive_mirror:
+                current_target_drive_folder_id = main_extract_folder_id_from_link_func(main_drive_folder_link)
+            elif main_drive_folder_link:
                 st.info("Attempting to init Google Drive service (v0 logic)...")
                 # This is where it gets tricky. v0_get_drive_service has its own st.text_input
                 # This might not work well when embedded.
@@ -296,11 +274,9 @@ def display_standard_veo_tab_from_v0(
                     drive_service_status_placeholder.warning("Could not get Drive service from main app. Drive uploads will be skipped.")
 
 
-            _PREDICT_API_ENDPOINT = f'https://us-central1-autopush-aiplatform.sandbox.googleapis.com/v1beta1/projects/{main_project_id}/locations/us-central1/publishers/google/models/veo-2.0-generate-001:predictLongRunning'
-            _FETCH_API_ENDPOINT = f'https://us-central1-autopush-aiplatform.sandbox.googleapis.com/v1beta1/projects/{main_project_id}/locations/us-central1/publishers/google/models/veo-2.0-generate-001:fetchPredictOperation'
-            
+            # Each job goes to the next (project, region, bucket) target; storageUri is set per job.
+            router = get_router(main_project_id, main_output_gcs_bucket)
             video_gen_params = {
-                "storageUri": f"gs://{main_output_gcs_bucket}/video_outputs_v0_std/", # Unique path
                 "sampleCount": sample_count_input, "seed": seed_input,
                 "aspectRatio": "16:9" if aspect_ratio_input == "LANDSCAPE" else "9:16",
                 "durationSeconds": duration_input, "enhancePrompt": enhance_prompt_input,
@@ -317,28 +293,30 @@ def display_standard_veo_tab_from_v0(
                 for i, url_item in enumerate(urls): # Renamed url to url_item
                     image_sources_to_process.append({"type": "url", "data": url_item, "name": f"url_image_{i+1}_{os.path.basename(urlparse(url_item).path) or uuid.uuid4()}"})
             
+            batch_jobs = []
             if not image_sources_to_process and prompt_input:
                 st.info("Generating video based on prompt (v0 logic, no images)...")
-                operation_result = v0_generate_video_api_call(_PREDICT_API_ENDPOINT, _FETCH_API_ENDPOINT, prompt_input, video_gen_params)
-                v0_process_and_display_videos(operation_result, main_gcs_client, main_local_output_dir, "prompt_based_v0", current_drive_service, current_target_drive_folder_id, main_drive_folder_link)
+                batch_jobs.append(v0_routed_batch_job("prompt_based_v0", router.next_target(), prompt_input, video_gen_params))
             
             elif image_sources_to_process:
                 for image_source in image_sources_to_process:
-                    st.markdown(f"--- \n ### Processing image (v0): {image_source['name']}")
+                    st.markdown(f"--- \n ### Preparing image (v0): {image_source['name']}")
                     image_gcs_uri_for_api = ""
                     image_mime_type_for_api = "image/png" 
                     temp_image_path_for_gcs = None
+                    target = router.next_target()
 
                     if image_source["type"] == "file":
-                        uploaded_image_file_obj = image_source["data"]
-                        # Save to a temporary local path before uploading to GCS
-                        temp_dir_for_upload = os.path.join(".", V0_TEMP_IMAGE_DIR, "temp_uploads")
-                        os.makedirs(temp_dir_for_upload, exist_ok=True)
-                        temp_image_path_for_gcs = os.path.join(temp_dir_for_upload, uploaded_image_file_obj.name)
-                        with open(temp_image_path_for_gcs, "wb") as f:
-                            f.write(uploaded_image_file_obj.getbuffer())
-                    
-                    elif image_source["type"] == "url":
+                        with st.spinner(f"Uploading {image_source['name']} to GCS (v0)..."):
+                            image_gcs_uri_for_api, image_mime_type_for_api = v0_upload_uploaded_file_to_gcs(
+                                main_gcs_client, target.bucket, image_source["data"], V0_IMAGE_UPLOAD_GCS_PREFIX, video_gen_params["aspectRatio"])
+                        if not image_gcs_uri_for_api:
+                            st.error(f"GCS Image upload failed for {image_source['name']} (v0). Skipping.")
+                            continue
+                        batch_jobs.append(v0_routed_batch_job(image_source['name'], target, prompt_input, video_gen_params, image_gcs_uri_for_api, image_mime_type_for_api))
+                        continue
+
+                    if image_source["type"] == "url":
                         with st.spinner(f"Downloading image from URL (v0): {image_source['data']} ..."):
                             temp_image_path_for_gcs = v0_download_image_from_url(image_source['data'], V0_TEMP_IMAGE_DIR)
                         if not temp_image_path_for_gcs:
@@ -347,15 +325,15 @@ def display_standard_veo_tab_from_v0(
                     
                     if temp_image_path_for_gcs:
                         with st.spinner(f"Uploading {image_source['name']} to GCS (v0)..."):
-                            image_extension = os.path.splitext(image_source['name'])[1] if image_source['name'] else ".jpg"
-                            unique_image_filename_gcs = f"{uuid.uuid4()}{image_extension}"
-                            destination_image_blob_name = f"{V0_IMAGE_UPLOAD_GCS_PREFIX}{unique_image_filename_gcs}"
-                            
-                            image_gcs_uri_for_api, image_mime_type_for_api = v0_upload_to_gcs(
+                            with open(temp_image_path_for_gcs, "rb") as f: image_data = f.read()
+                            # Content-addressed name: the same image is only uploaded once.
+                            image_gcs_uri_for_api, image_mime_type_for_api = v0_upload_image_to_gcs(
                                 main_gcs_client, # Use main GCS client
-                                main_output_gcs_bucket,
-                                temp_image_path_for_gcs,
-                                destination_image_blob_name
+                                target.bucket,
+                                image_data,
+                                image_source['name'] or os.path.basename(temp_image_path_for_gcs),
+                                V0_IMAGE_UPLOAD_GCS_PREFIX,
+                                video_gen_params["aspectRatio"]
                             )
                             try: # Cleanup temp file
                                 os.remove(temp_image_path_for_gcs)
@@ -367,14 +345,20 @@ def display_standard_veo_tab_from_v0(
                                 st.error(f"GCS Image upload failed for {image_source['name']} (v0). Skipping.")
                                 continue
                         
-                        st.info(f"Generating video for {image_source['name']} (v0)...")
-                        operation_result = v0_generate_video_api_call(_PREDICT_API_ENDPOINT, _FETCH_API_ENDPOINT, prompt_input, video_gen_params, image_gcs_uri=image_gcs_uri_for_api, image_mime_type=image_mime_type_for_api)
-                        v0_process_and_display_videos(operation_result, main_gcs_client, main_local_output_dir, image_source['name'], current_drive_service, current_target_drive_folder_id, main_drive_folder_link)
+                        batch_jobs.append(v0_routed_batch_job(image_source['name'], target, prompt_input, video_gen_params, image_gcs_uri_for_api, image_mime_type_for_api))
                     else:
                         st.error(f"Could not get temp path for image: {image_source['name']} (v0). Skipping.")
             else: # Should not happen due to initial checks, but as a fallback
                  st.error("No valid input for video generation (v0).")
 
+            if batch_jobs:
+                # Submit everything up front, then render each job as soon as it finishes.
+                st.info(f"Submitting {len(batch_jobs)} video generation job(s) (v0), polling up to {max_concurrency_input} at a time...")
+                with st.spinner("Waiting for video generation jobs (v0)..."):
+                    for finished_job in run_veo_batch(batch_jobs, None, None, main_gcs_client, main_local_output_dir, max_concurrency=max_concurrency_input,
+                                                      use_cache=main_use_result_cache, force_regenerate=main_force_regenerate):
+                        v0_display_batch_job(finished_job, current_drive_service, current_target_drive_folder_id, main_drive_mirror, main_gcs_client)
+
 
 if __name__ == "__main__":
     # This part is for testing the module independently if needed
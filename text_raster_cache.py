@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Persistent cache of rendered text overlays (RGBA rasters).
+
+Rendering text goes through ImageMagick, one process per call. Re-running the
+Movie Creator with the same captions and fonts (changing only clip order or
+music, say) would render every word again, so each raster is stored as an
+RGBA ``.npy`` file under ``VEO_CACHE_DIR/text_rasters`` and indexed in
+SQLite. The key covers everything that changes the pixels: text, font, size,
+colors, stroke and wrap width. Least recently used rasters are evicted once
+the cache exceeds ``TEXT_RASTER_CACHE_MAX_BYTES``. The cache is shared by
+every process (the Movie Creator renders segments in worker processes).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+VEO_CACHE_DIR = os.getenv("VEO_CACHE_DIR", ".veo_cache")
+TEXT_RASTER_CACHE_DIR = os.getenv("TEXT_RASTER_CACHE_DIR", os.path.join(VEO_CACHE_DIR, "text_rasters"))
+TEXT_RASTER_CACHE_MAX_BYTES = int(os.getenv("TEXT_RASTER_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def text_raster_key(text, font, fontsize, color, stroke_color=None, stroke_width=0, wrap_width=None, method="label"):
+    """Hash of every parameter that affects the rendered pixels."""
+    canonical = json.dumps([text, font, fontsize, color, stroke_color, stroke_width, wrap_width, method],
+                           separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class TextRasterCache:
+    def __init__(self, directory=TEXT_RASTER_CACHE_DIR, max_bytes=TEXT_RASTER_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS rasters (key TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used_at REAL NOT NULL)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npy")
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """Returns the cached ``(h, w, 4)`` uint8 RGBA array, or None."""
+        try:
+            rgba = np.load(self._path(key), allow_pickle=False)
+        except (OSError, ValueError):
+            self._count(False)
+            return None
+        with self._connect() as conn:
+            conn.execute("UPDATE rasters SET last_used_at = ? WHERE key = ?", (time.time(), key))
+        self._count(True)
+        return rgba
+
+    def put(self, key, rgba):
+        path = self._path(key)
+        partial = f"{path}.{uuid.uuid4().hex[:8]}.part"
+        with open(partial, "wb") as f:
+            np.save(f, np.ascontiguousarray(rgba, dtype=np.uint8), allow_pickle=False)
+        os.replace(partial, path)
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO rasters (key, size, last_used_at) VALUES (?, ?, ?)",
+                         (key, os.path.getsize(path), time.time()))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM rasters").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            evicted = []
+            for old_key, size in conn.execute("SELECT key, size FROM rasters ORDER BY last_used_at").fetchall():
+                if total <= self.max_bytes or old_key == key:
+                    break
+                evicted.append(old_key)
+                total -= size
+            conn.executemany("DELETE FROM rasters WHERE key = ?", [(k,) for k in evicted])
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def get_or_render(self, key, render):
+        """Returns the cached raster for ``key``, calling ``render()`` (which returns RGBA) and storing it on a miss."""
+        rgba = self.get(key)
+        if rgba is None:
+            rgba = render()
+            self.put(key, rgba)
+        return rgba
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM rasters").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_text_raster_cache():
+    """Returns the process-wide ``TextRasterCache``."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TextRasterCache()
+        return _cache
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Streamlit-free helpers for calling the Veo long-running prediction endpoints.
+
+Everything here raises on failure instead of calling ``st.error`` so it can be
+used from worker threads and from the headless tools.
+"""
+from gcp_auth import get_token_provider
+from http_transport import post_json
+from quota_scheduler import PRIORITY_INTERACTIVE, get_quota_scheduler, quota_key_for_url
+
+# Model base URLs used by the Standard tab and by the Interpolation/Extension/Camera tabs.
+VEO_STANDARD_MODEL_URL = "https://{region}-autopush-aiplatform.sandbox.googleapis.com/v1beta1/projects/{project_id}/locations/{region}/publishers/google/models/veo-2.0-generate-001"
+VEO_ADVANCED_MODEL_URL = "https://{region}-aiplatform.googleapis.com/v1/projects/{project_id}/locations/{region}/publishers/google/models/veo-2.0-generate-exp"
+
+
+class VeoApiError(Exception):
+    """Raised when a Veo API call fails or returns an unusable response."""
+
+
+def send_vertex_request(api_endpoint, data=None, priority=PRIORITY_INTERACTIVE):
+    """POSTs ``data`` as JSON to a Vertex AI endpoint and returns the decoded response.
+
+    Model endpoints go through the quota scheduler: the call waits for its
+    project/model budget and 429/503 responses are retried after backing off.
+    """
+    def post():
+        headers = {**get_token_provider().auth_headers(), "Content-Type": "application/json"}
+        return post_json(api_endpoint, data, headers=headers).json()
+
+    quota_key = quota_key_for_url(api_endpoint)
+    return get_quota_scheduler().call(quota_key, post, priority) if quota_key else post()
+
+
+def veo_endpoints(project_id, model_url=VEO_ADVANCED_MODEL_URL, region="us-central1"):
+    """Returns the ``(predictLongRunning, fetchPredictOperation)`` URLs for a project and region."""
+    base = model_url.format(project_id=project_id, region=region)
+    return f"{base}:predictLongRunning", f"{base}:fetchPredictOperation"
+
+
+def compose_veo_request(prompt, parameters, image_uri="", video_uri="", last_frame_uri="", camera_control="",
+                        image_mime_type="image/jpeg", last_frame_mime_type="image/jpeg"):
+    instance = {"prompt": prompt}
+    if image_uri: instance["image"] = {"gcsUri": image_uri, "mimeType": image_mime_type}
+    if video_uri: instance["video"] = {"gcsUri": video_uri, "mimeType": "video/mp4"}
+    if last_frame_uri: instance["lastFrame"] = {"gcsUri": last_frame_uri, "mimeType": last_frame_mime_type}
+    if camera_control: instance["cameraControl"] = camera_control
+    return {"instances": [instance], "parameters": parameters}
+
+
+def submit_veo_operation(predict_endpoint, request_body, priority=PRIORITY_INTERACTIVE):
+    """Starts a predictLongRunning call and returns the operation name."""
+    resp = send_vertex_request(predict_endpoint, data=request_body, priority=priority)
+    if not resp or 'name' not in resp:
+        raise VeoApiError(f"predictLongRunning returned no operation name: {resp}")
+    return resp['name']
+
+
+def fetch_veo_operation(fetch_endpoint, lro_name, priority=PRIORITY_INTERACTIVE):
+    """Returns the current state of a Veo operation (a single fetchPredictOperation call)."""
+    return send_vertex_request(fetch_endpoint, data={'operationName': lro_name}, priority=priority)
+
+
+def extract_video_uris(operation_result):
+    """Returns the gs:// URIs of all samples in a finished operation (both response shapes)."""
+    uris = []
+    response = (operation_result or {}).get('response') or {}
+    if 'videos' in response:
+        uris = [v.get('gcsUri') for v in response['videos']]
+    elif 'generatedSamples' in response:
+        uris = [s['video'].get('uri') for s in response['generatedSamples'] if 'video' in s]
+    return [u for u in uris if u]
+
+
+def operation_error_message(operation_result):
+    if operation_result and operation_result.get('error'):
+        return operation_result['error'].get('message', 'Unknown error')
+    return None
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Concurrent submit-and-poll engine for batches of Veo generations.
+
+All predictLongRunning operations of a batch are submitted up front, then a
+bounded pool of workers polls them and downloads each job's samples as soon as
+that job finishes. Total wall time tracks the slowest job instead of the sum.
+Workers never touch Streamlit; callers render results from the main thread as
+``run_veo_batch`` yields them.
+"""
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+import job_store
+from gcs_utils import download_gcs_uris, describe_downloads
+from result_cache import get_result_cache, is_cacheable, request_cache_key
+from lro_polling import PollPolicy, poll_operation
+from quota_scheduler import PRIORITY_INTERACTIVE
+from veo_api import submit_veo_operation, fetch_veo_operation, extract_video_uris, operation_error_message
+
+VEO_BATCH_MAX_CONCURRENCY = int(os.getenv("VEO_BATCH_MAX_CONCURRENCY", "8"))
+
+
+@dataclass
+class VeoBatchJob:
+    name: str
+    request: dict
+    operation_name: str = None
+    result: dict = None
+    error: str = None
+    local_files: list = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+    store_id: str = None  # Row in the job store once the operation is recorded
+    cache_key: str = None  # Set when the result should be written to the result cache
+    cached: bool = False
+    predict_endpoint: str = None  # Per-job endpoints when jobs are routed across targets
+    fetch_endpoint: str = None
+    target: str = None  # "project/region" the job was routed to
+    download_summary: str = None  # Throughput of the download stage, for display
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def wait_for_operation(fetch_endpoint, lro_name, poll_policy=None, priority=PRIORITY_INTERACTIVE):
+    """Blocks until ``lro_name`` is done and returns the final operation (see ``lro_polling.poll_operation``)."""
+    return poll_operation(lambda: fetch_veo_operation(fetch_endpoint, lro_name, priority), poll_policy)
+
+
+def download_job_outputs(job, storage_client, local_output_dir, reuse_files=()):
+    """Downloads every sample of a finished job into ``local_output_dir``, all samples at once.
+
+    ``reuse_files`` are previously downloaded copies (same order as the
+    samples); those that still exist are used instead of downloading again.
+    Raises if any sample could not be downloaded.
+    """
+    local_files, pending = [], []
+    for i, gcs_uri in enumerate(extract_video_uris(job.result)):
+        if i < len(reuse_files) and os.path.exists(reuse_files[i]):
+            local_files.append(reuse_files[i])
+            continue
+        base_name = os.path.basename(gcs_uri) or f"video_{uuid.uuid4()}.mp4"
+        local_files.append(os.path.join(local_output_dir, f"generated_{job.name}_sample_{i+1}_{base_name}"))
+        pending.append((gcs_uri, local_files[-1]))
+    t0 = time.monotonic()
+    results = download_gcs_uris(storage_client, pending)
+    failed = [r for r in results if not r.ok]
+    if failed:
+        raise RuntimeError("; ".join(f"{r.gcs_uri}: {r.error}" for r in failed))
+    if results:
+        job.download_summary = describe_downloads(results, time.monotonic() - t0)
+    job.local_files.extend(local_files)
+
+
+def resolve_from_cache(job, predict_endpoint, storage_client, local_output_dir, force_regenerate=False):
+    """Looks ``job`` up in the result cache; returns True (job complete) on a hit.
+
+    Only fixed-seed requests are cacheable. With ``force_regenerate`` the lookup
+    is skipped but the fresh result still replaces the cached one.
+    """
+    if not is_cacheable(job.request):
+        return False
+    job.cache_key = request_cache_key(predict_endpoint, job.request)
+    entry = None if force_regenerate else get_result_cache().get(job.cache_key)
+    if not entry:
+        return False
+    t0 = time.monotonic()
+    job.result = {"done": True, "response": {"videos": [{"gcsUri": uri} for uri in entry["output_uris"]]}}
+    job.cached = True
+    try:
+        download_job_outputs(job, storage_client, local_output_dir, entry["local_files"])
+    except Exception as e:
+        job.error = f"Cached result could not be fetched: {e}"
+    job.timings["cache"] = time.monotonic() - t0
+    return True
+
+
+def submit_job(job, predict_endpoint, fetch_endpoint=None, local_output_dir=None, kind="veo", priority=PRIORITY_INTERACTIVE,
+               origin=job_store.ORIGIN_APP):
+    """Starts ``job``'s operation; on failure records the error on the job instead of raising.
+
+    When ``fetch_endpoint`` is given the operation is also written to the job
+    store (leased to this process, on behalf of ``origin``) so it can be resumed after a restart.
+    """
+    t0 = time.monotonic()
+    try:
+        job.operation_name = submit_veo_operation(predict_endpoint, job.request, priority)
+    except Exception as e:
+        job.error = f"Submission failed: {e}"
+    job.timings["submit"] = time.monotonic() - t0
+    if job.operation_name and fetch_endpoint:
+        job.store_id = job_store.get_job_store().record_submitted(job.name, kind, job.request, fetch_endpoint, job.operation_name,
+                                                                  local_output_dir, job.target, origin)
+    return job
+
+
+def _record_outcome(job):
+    if not job.store_id:
+        return
+    status = job_store.STATUS_FAILED if job.error else job_store.STATUS_SUCCEEDED
+    job_store.get_job_store().record_finished(job.store_id, status, extract_video_uris(job.result), job.local_files, job.error)  # Ends the lease
+
+
+def complete_job(job, fetch_endpoint, storage_client, local_output_dir, poll_policy=None, priority=PRIORITY_INTERACTIVE):
+    """Polls a submitted job until it finishes and downloads its samples; errors end up in ``job.error``.
+
+    Fetches wait in the quota scheduler at ``priority``, like ``submit_job``'s predict call.
+    """
+    try:
+        t0 = time.monotonic()
+        policy = poll_policy or PollPolicy.for_parameters(job.request.get("parameters"))
+        job.result = wait_for_operation(fetch_endpoint, job.operation_name, policy, priority)
+        job.timings["poll"] = time.monotonic() - t0
+        error_message = operation_error_message(job.result)
+        if error_message:
+            job.error = error_message
+            return job
+        if not extract_video_uris(job.result):
+            job.error = "Operation finished without any video samples."
+            return job
+        t0 = time.monotonic()
+        download_job_outputs(job, storage_client, local_output_dir)
+        job.timings["download"] = time.monotonic() - t0
+        if job.cache_key:
+            get_result_cache().put(job.cache_key, extract_video_uris(job.result), job.local_files)
+    except Exception as e:
+        job.error = str(e)
+    finally:
+        _record_outcome(job)
+    return job
+
+
+def run_veo_batch(jobs, predict_endpoint, fetch_endpoint, storage_client, local_output_dir,
+                  max_concurrency=VEO_BATCH_MAX_CONCURRENCY, poll_policy=None, use_cache=False, force_regenerate=False,
+                  priority=PRIORITY_INTERACTIVE):
+    """Submits all ``jobs``, then yields each one as soon as it has finished (or failed).
+
+    A job's own ``predict_endpoint``/``fetch_endpoint`` (set when it was routed
+    to a target) take precedence over the batch-wide ones. Without an explicit ``poll_policy`` each job is polled on a schedule sized
+    to its own ``durationSeconds``/``sampleCount``. With ``use_cache`` fixed-seed
+    jobs found in the result cache are yielded right away without submitting.
+    Submissions and polls are scheduled at ``priority``.
+    """
+    os.makedirs(local_output_dir, exist_ok=True)
+    submitted = []
+    for job in jobs:
+        job.predict_endpoint = job.predict_endpoint or predict_endpoint
+        job.fetch_endpoint = job.fetch_endpoint or fetch_endpoint
+        if use_cache and resolve_from_cache(job, job.predict_endpoint, storage_client, local_output_dir, force_regenerate):
+            yield job
+            continue
+        submit_job(job, job.predict_endpoint, job.fetch_endpoint, local_output_dir, priority=priority)
+        if job.error:
+            yield job
+        else:
+            submitted.append(job)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency))
+    try:
+        futures = [executor.submit(complete_job, job, job.fetch_endpoint, storage_client, local_output_dir, poll_policy, priority)
+                   for job in submitted]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Don't block a Streamlit rerun on the remaining workers.
+        executor.shutdown(wait=False)
+
+
+def resume_unfinished_jobs(storage_client, default_output_dir, max_concurrency=VEO_BATCH_MAX_CONCURRENCY, origin=job_store.ORIGIN_APP):
+    """Resumes polling every stored operation of ``origin`` that no process holds a live lease on.
+
+    Runs in the background and returns the jobs that were picked up; their
+    outcome lands in the job store.
+    """
+    resumed = []
+    for stored in job_store.get_job_store().unfinished(origin):
+        if not job_store.claim(stored["id"]):
+            continue
+        job = VeoBatchJob(stored["name"], stored["request"], operation_name=stored["operation_name"], store_id=stored["id"], target=stored["target"])
+        resumed.append((job, stored["fetch_endpoint"], stored["local_output_dir"] or default_output_dir))
+    if resumed:
+        executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency))
+        for job, fetch_endpoint, local_output_dir in resumed:
+            executor.submit(complete_job, job, fetch_endpoint, storage_client, local_output_dir)
+        executor.shutdown(wait=False)
+    return [job for job, _, _ in resumed]
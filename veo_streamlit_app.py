@@ -3,27 +3,35 @@ import streamlit as st
 import requests
 import time
 import google.auth
-import google.auth.transport.requests
 from google.cloud import storage
 import os
 import uuid
-import mimetypes
 from urllib.parse import urlparse
 from dotenv import load_dotenv
-from PIL import Image as PIL_Image 
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Google Drive API imports
+# Google Drive API imports (the OAuth flow and the API client are imported when Drive is first used)
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 from google.auth.transport.requests import Request as GoogleAuthRequest
 
+from gcp_auth import get_token_provider
+from gcs_utils import upload_buffer, download_gcs_uris, describe_downloads
+from http_transport import http_get
+from image_preprocess import prepare_upload, IMAGE_CROP_TO_ASPECT
+from lro_polling import PollPolicy, OperationDeadlineExceeded, poll_operation
+from job_store import get_job_store, release as release_job, STATUS_FAILED, STATUS_SUCCEEDED
+from routing import get_router
+from veo_api import VEO_ADVANCED_MODEL_URL, send_vertex_request, fetch_veo_operation, compose_veo_request, extract_video_uris, operation_error_message
+from result_cache import get_result_cache, is_cacheable, request_cache_key, cached_operation_result
+from veo_batch import resume_unfinished_jobs
+from drive_mirror import get_drive_mirror
+from media_server import media_url
+from quota_scheduler import get_quota_scheduler
+
 # Import Lyria function
-from lyria import generate_lyria_music
+from lyria import plan_lyria_calls, iter_lyria_batch, LYRIA_MAX_CONCURRENCY, MUSIC_OUTPUT_SUBDIR
 # Import Movie Creator tab function
 from moviecreator import movie_creator_tab
 # Import Prompt Builder tab function
@@ -36,24 +44,17 @@ DEFAULT_PROJECT_ID = os.getenv("DEFAULT_PROJECT_ID", "veo-testing")
 DEFAULT_LYRIA_PROJECT_ID = os.getenv("DEFAULT_LYRIA_PROJECT_ID", "music-generation-434117") # Updated Lyria default
 DEFAULT_OUTPUT_GCS_BUCKET = os.getenv("DEFAULT_OUTPUT_GCS_BUCKET", "fk-test-veo")
 CLIENT_SECRETS_FILE = os.getenv("CLIENT_SECRETS_FILE", "credentials.json")
-DEFAULT_DRIVE_FOLDER_LINK_ENV = os.getenv("DEFAULT_DRIVE_FOLDER_LINK", "https://drive.google.com/drive/folders/15SK65dQ7bsFIYPR1y9UXmwPgoqK7X41b?resourcekey=0-Zc4YZjA43nl6weUSbHsOWQ&usp=drive_link")
+DEFAULT_DRIVE_FOLDER_LINK_ENV = os.getenv("DEFAULT_DRIVE_FOLDER_LINK", "")  # Drive output is opt-in
 
 IMAGE_UPLOAD_GCS_PREFIX = os.getenv("IMAGE_UPLOAD_GCS_PREFIX", "uploads/")
 VIDEO_UPLOAD_GCS_PREFIX = os.getenv("VIDEO_UPLOAD_GCS_PREFIX", "video_uploads/") 
-MUSIC_OUTPUT_SUBDIR = "lyria_music_outputs" # Subdirectory for Lyria outputs within local_output_dir
 TEMP_MEDIA_DIR = os.getenv("DEFAULT_TEMP_MEDIA_DIR", "temp_media")
 
 
-_PREDICT_API_ENDPOINT_STD = f'https://us-central1-autopush-aiplatform.sandbox.googleapis.com/v1beta1/projects/{DEFAULT_PROJECT_ID}/locations/us-central1/publishers/google/models/veo-2.0-generate-001:predictLongRunning'
-_FETCH_API_ENDPOINT_STD = f'https://us-central1-autopush-aiplatform.sandbox.googleapis.com/v1beta1/projects/{DEFAULT_PROJECT_ID}/locations/us-central1/publishers/google/models/veo-2.0-generate-001:fetchPredictOperation'
-
-VEO_ADVANCED_MODEL_BASE = f"https://us-central1-aiplatform.googleapis.com/v1/projects/{DEFAULT_PROJECT_ID}/locations/us-central1/publishers/google/models/veo-2.0-generate-exp"
-PREDICTION_ENDPOINT_ADV = f"{VEO_ADVANCED_MODEL_BASE}:predictLongRunning"
-FETCH_ENDPOINT_ADV = f"{VEO_ADVANCED_MODEL_BASE}:fetchPredictOperation"
 
 DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive.file']
 
-def get_drive_service():
+def get_drive_credentials():
     creds = None; token_path = 'token.json'
     if os.path.exists(token_path):
         try: creds = Credentials.from_authorized_user_file(token_path, DRIVE_SCOPES)
@@ -65,6 +66,7 @@ def get_drive_service():
         else:
             if not os.path.exists(CLIENT_SECRETS_FILE): st.error(f"OAuth secrets file ('{CLIENT_SECRETS_FILE}') not found."); return None
             try:
+                from google_auth_oauthlib.flow import InstalledAppFlow
                 flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILE, DRIVE_SCOPES)
                 auth_url, _ = flow.authorization_url(prompt='consent')
                 st.info(f"Authorize Drive: {auth_url}")
@@ -76,12 +78,37 @@ def get_drive_service():
             with open(token_path, 'w') as token_file: token_file.write(creds.to_json())
             st.success(f"Drive token saved to {token_path}.")
         except Exception as e: st.error(f"Error saving Drive token: {e}")
-    if creds and creds.valid:
-        try: return build('drive', 'v3', credentials=creds)
+    if creds and creds.valid: return creds
+    st.error("Failed to get valid Drive credentials.")
+    return None
+
+def get_drive_service(creds=None):
+    creds = creds or get_drive_credentials()
+    if creds:
+        try:
+            from googleapiclient.discovery import build
+            return build('drive', 'v3', credentials=creds)
         except Exception as e: st.error(f"Error building Drive service: {e}")
-    else: st.error("Failed to get valid Drive credentials.")
     return None
 
+def show_media_output(local_path, label, key, gcs_uri=None, media_kind="video", mime="video/mp4"):
+    """Renders a player and a download link streamed from disk/GCS by URL; falls back to in-memory media."""
+    url = media_url(local_path, gcs_uri, gcs_client)
+    if url:
+        if media_kind == "video": st.video(url, autoplay=True, muted=True)
+        else: st.audio(url, format=mime)
+        st.markdown(f"[⬇️ {label}]({media_url(local_path, gcs_uri, gcs_client, download=True)})")
+        return
+    if media_kind == "video": st.video(local_path, autoplay=True, muted=True)
+    else: st.audio(local_path, format=mime)
+    with open(local_path, "rb") as fp: st.download_button(label, fp, os.path.basename(local_path), mime, key=key)
+
+def mirror_to_drive(local_files):
+    """Queues files for background upload to the target Drive folder; returns immediately."""
+    if not (drive_mirror and target_drive_folder_id and local_files): return
+    drive_mirror.mirror(local_files, target_drive_folder_id)
+    st.info(f"Mirroring {len(local_files)} file(s) to Google Drive in the background (see sidebar).")
+
 def extract_folder_id_from_link(link):
     if not link: return None
     try:
@@ -89,27 +116,10 @@ def extract_folder_id_from_link(link):
     except Exception as e: st.error(f"Could not parse Drive folder ID: {e}")
     return None
 
-def upload_to_drive(drive_service, folder_id, file_path, file_name=None):
-    if not drive_service: st.error("Drive service NA for upload."); return
-    if not file_name: file_name = os.path.basename(file_path)
-    file_metadata = {'name': file_name, 'parents': [folder_id] if folder_id else []}
-    try:
-        mime_type, _ = mimetypes.guess_type(file_path)
-        if mime_type is None: mime_type = 'application/octet-stream'
-        media = MediaFileUpload(file_path, mimetype=mime_type, resumable=True)
-        with st.spinner(f"Uploading {file_name} to Drive..."):
-            request = drive_service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink')
-            response = None; pbar = st.progress(0)
-            while response is None: status, response = request.next_chunk(); pbar.progress(int(status.progress()*100) if status else 0)
-            pbar.empty(); st.success(f"Uploaded to Drive: {response.get('webViewLink')}")
-            return response.get('id'), response.get('webViewLink')
-    except Exception as e: st.error(f"Drive upload error for {file_name}: {e}")
-    return None, None
-
 def download_image_from_url(image_url, temp_dir=TEMP_MEDIA_DIR):
     if not image_url: return None
     try:
-        response = requests.get(image_url, stream=True); response.raise_for_status()
+        response = http_get(image_url, stream=True); response.raise_for_status()
         parsed_url = urlparse(image_url); original_filename = os.path.basename(parsed_url.path) or f"{uuid.uuid4()}.jpg"
         safe_filename = "".join(c if c.isalnum() or c in ('.','_','-') else '_' for c in original_filename) or f"{uuid.uuid4()}{os.path.splitext(original_filename)[1]}"
         os.makedirs(temp_dir, exist_ok=True)
@@ -121,76 +131,54 @@ def download_image_from_url(image_url, temp_dir=TEMP_MEDIA_DIR):
     except Exception as e: st.error(f"Error downloading {image_url}: {e}"); return None
 
 def get_gcs_client():
-    try: credentials, project = google.auth.default(); return storage.Client(credentials=credentials)
+    try: return storage.Client(credentials=get_token_provider().get_credentials(refresh=False))
     except Exception as e: st.error(f"GCS client error: {e}"); return None
 
-def upload_to_gcs(storage_client, bucket_name, source_file_path, destination_blob_name_prefix=""):
-    if not storage_client or not source_file_path : return None, None
-    try:
-        bucket = storage_client.bucket(bucket_name)
-        file_name = os.path.basename(source_file_path)
-        destination_blob_name = f"{destination_blob_name_prefix}{uuid.uuid4()}_{file_name}"
-        mime_type, _ = mimetypes.guess_type(source_file_path)
-        if mime_type is None: mime_type = 'application/octet-stream'
-        blob = bucket.blob(destination_blob_name)
-        blob.upload_from_filename(source_file_path, content_type=mime_type)
-        gcs_uri = f"gs://{bucket_name}/{destination_blob_name}"
-        st.info(f"Uploaded {source_file_path} to {gcs_uri}")
-        return gcs_uri, mime_type
-    except Exception as e: st.error(f"GCS upload error for {source_file_path}: {e}"); return None, None
-
-def download_from_gcs(storage_client, bucket_name, source_blob_name, destination_file_name):
-    if not storage_client: return False
-    try:
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(source_blob_name)
-        os.makedirs(os.path.dirname(destination_file_name), exist_ok=True)
-        blob.download_to_filename(destination_file_name)
-        st.info(f"Downloaded gs://{bucket_name}/{source_blob_name} to {destination_file_name}")
-        return True
-    except Exception as e: st.error(f"GCS download error for gs://{bucket_name}/{source_blob_name}: {e}"); return False
-
 def send_veo_api_request(project_id, api_endpoint, data=None):
     try:
-        creds, _ = google.auth.default(scopes=['https://www.googleapis.com/auth/cloud-platform'])
-        auth_req = GoogleAuthRequest()
-        creds.refresh(auth_req)
-        headers = {"Authorization": f"Bearer {creds.token}", "Content-Type": "application/json"}
-        response = requests.post(api_endpoint, headers=headers, json=data)
-        response.raise_for_status()
-        return response.json()
+        return send_vertex_request(api_endpoint, data=data)
     except google.auth.exceptions.DefaultCredentialsError: st.error("GCP Default Credentials Error. Run 'gcloud auth application-default login'.")
     except requests.exceptions.HTTPError as e: st.error(f"HTTP Error: {e} - {e.response.text if e.response else 'No response text'}")
     except Exception as e: st.error(f"API request error: {e}")
     return None
 
-def compose_veo_request(prompt, parameters, image_uri="", video_uri="", last_frame_uri="", camera_control=""):
-    instance = {"prompt": prompt}
-    if image_uri: instance["image"] = {"gcsUri": image_uri, "mimeType": "image/jpeg"}
-    if video_uri: instance["video"] = {"gcsUri": video_uri, "mimeType": "video/mp4"}
-    if last_frame_uri: instance["lastFrame"] = {"gcsUri": last_frame_uri, "mimeType": "image/jpeg"}
-    if camera_control: instance["cameraControl"] = camera_control
-    return {"instances": [instance], "parameters": parameters}
-
-def poll_veo_operation(project_id, fetch_endpoint, lro_name, max_attempts=60, sleep_seconds=10):
-    request_payload = {'operationName': lro_name}
-    for i in range(max_attempts):
-        resp = send_veo_api_request(project_id, fetch_endpoint, data=request_payload)
-        if resp:
-            if 'done' in resp and resp['done']: st.success(f"Operation {lro_name} completed."); return resp
-            st.write(f"Polling Veo operation... Attempt {i+1}/{max_attempts}")
-        else: st.error("Failed to fetch Veo operation status. Aborting."); return None
-        time.sleep(sleep_seconds)
-    st.warning(f"Veo operation {lro_name} timed out after {max_attempts*sleep_seconds}s."); return None
+def poll_veo_operation(project_id, fetch_endpoint, lro_name, poll_policy=None):
+    policy = poll_policy or PollPolicy()
+    def on_poll(attempt, elapsed, resp, error):
+        if error: st.write(f"Polling Veo operation... attempt {attempt} failed transiently ({error}), retrying.")
+        else: st.write(f"Polling Veo operation... attempt {attempt}, {elapsed:.0f}s elapsed")
+    try:
+        resp = poll_operation(lambda: fetch_veo_operation(fetch_endpoint, lro_name), policy, on_poll=on_poll)
+        st.success(f"Operation {lro_name} completed."); return resp
+    except OperationDeadlineExceeded: st.warning(f"Veo operation {lro_name} timed out after {policy.deadline:.0f}s.")
+    except Exception as e: st.error(f"Failed to fetch Veo operation status. Aborting. ({e})")
+    return None
 
 def generate_veo_video(project_id, predict_endpoint, fetch_endpoint, prompt, parameters, 
-                       image_uri="", video_uri="", last_frame_uri="", camera_control=""):
-    req = compose_veo_request(prompt, parameters, image_uri, video_uri, last_frame_uri, camera_control)
+                       image_uri="", video_uri="", last_frame_uri="", camera_control="", kind="veo", local_output_dir=None,
+                       use_cache=False, force_regenerate=False, target=None, image_mime_type="image/jpeg", last_frame_mime_type="image/jpeg"):
+    req = compose_veo_request(prompt, parameters, image_uri, video_uri, last_frame_uri, camera_control, image_mime_type, last_frame_mime_type)
+    cache_key = request_cache_key(predict_endpoint, req) if use_cache and is_cacheable(req) else None
+    if cache_key and not force_regenerate:
+        cached = get_result_cache().get(cache_key)
+        if cached:
+            st.success("Result cache hit: reusing a previous generation for this exact request (use 'Force regenerate' to bypass).")
+            return cached_operation_result(cached, cache_key)
     st.write("Sending Veo API request..."); st.json(req)
     resp = send_veo_api_request(project_id, predict_endpoint, data=req)
     if resp and 'name' in resp:
         st.info(f"Veo operation initiated: {resp['name']}")
-        return poll_veo_operation(project_id, fetch_endpoint, resp['name'])
+        store = get_job_store()
+        store_id = store.record_submitted(kind, kind, req, fetch_endpoint, resp['name'], local_output_dir, target) # Leased to this process
+        try:
+            op_result = poll_veo_operation(project_id, fetch_endpoint, resp['name'], PollPolicy.for_parameters(parameters))
+            if op_result:
+                error_message = operation_error_message(op_result)
+                # Recorded before the lease is given up, so no other session can pick the job up in between.
+                store.record_finished(store_id, STATUS_FAILED if error_message else STATUS_SUCCEEDED, extract_video_uris(op_result), error=error_message)
+                if cache_key and not error_message: op_result["_cache_key"] = cache_key # display_generated_videos fills the cache entry
+        finally: release_job(store_id) # No-op once finished; if a rerun interrupts polling, the job is resumed from the store on the next run.
+        return op_result
     else:
         st.error("Failed to initiate Veo video generation.")
         if resp: st.json(resp)
@@ -207,38 +195,73 @@ local_output_dir_input = st.sidebar.text_input("Local Output Directory", value=o
 
 st.sidebar.header("💾 Google Drive Output (Optional)")
 drive_folder_link_input = st.sidebar.text_input("Google Drive Folder Link", value=DEFAULT_DRIVE_FOLDER_LINK_ENV)
+st.sidebar.caption(f"GCP token refreshes (this process): {get_token_provider().refresh_count}")
+quota_state = get_quota_scheduler().snapshot()
+if quota_state:
+    with st.sidebar.expander("🚦 API Quota", expanded=any(q["waiting"] or q["blocked_for"] for q in quota_state.values())):
+        st.dataframe([{"project": project, "model": family, "rpm": q["rpm"], "tokens": q["tokens"], "waiting": q["waiting"],
+                       "backoff (s)": q["blocked_for"], "429/503": q["throttled"]} for (project, family), q in quota_state.items()], use_container_width=True)
+
+st.sidebar.header("♻️ Result Cache (Optional)")
+use_result_cache_input = st.sidebar.checkbox("Reuse results for identical fixed-seed requests", value=False, help="Returns the previous output instead of submitting a new Veo job when prompt, parameters, seed and input are unchanged.")
+force_regenerate_input = st.sidebar.checkbox("Force regenerate", value=False, disabled=not use_result_cache_input, help="Skip the cache lookup and overwrite the cached result.")
+
+st.sidebar.header("🖼️ Input Frames")
+st.sidebar.checkbox("Center-crop frames to the aspect ratio", value=IMAGE_CROP_TO_ASPECT, key="crop_input_frames",
+                    help="Off: frames are only downscaled, keeping the whole image. On: the edges outside the video's aspect ratio are cut off (the kept box is shown after upload).")
 
 tab_names = ["Standard Veo", "Veo Interpolation", "Veo Extension", "Veo Camera Controls", "✨ AI Prompt Builder", "Lyria Music", "🎬 Movie Creator"]
 tabs = st.tabs(tab_names)
 
 gcs_client = get_gcs_client()
-drive_service = None
+# Pick up operations that were still in flight when a previous run or process stopped.
+resumed_jobs = resume_unfinished_jobs(gcs_client, local_output_dir_input.strip() or "Output") if gcs_client else []
+with st.sidebar.expander("🗂️ Job Store", expanded=bool(resumed_jobs)):
+    if resumed_jobs: st.info(f"Resumed polling {len(resumed_jobs)} in-flight job(s) instead of resubmitting them.")
+    recent_jobs = get_job_store().recent()
+    if recent_jobs:
+        st.dataframe([{"name": j["name"], "kind": j["kind"], "status": j["status"], "target": j["target"] or "", "submitted": time.strftime("%Y-%m-%d %H:%M", time.localtime(j["created_at"])),
+                       "outputs": ", ".join(j["local_files"] or j["output_uris"])} for j in recent_jobs], use_container_width=True)
+    else: st.caption("No jobs recorded yet.")
+drive_mirror = None
 target_drive_folder_id = None
 
 if drive_folder_link_input.strip():
     with st.sidebar.expander("Google Drive Status", expanded=False):
+        # Only the OAuth token is loaded here; the Drive API client is built by the first upload (DriveMirror._service).
         drive_auth_placeholder = st.empty()
-        with drive_auth_placeholder.container(): drive_service = get_drive_service()
-        if drive_service:
+        with drive_auth_placeholder.container(): drive_credentials = get_drive_credentials()
+        if drive_credentials:
             drive_auth_placeholder.success("Drive Authenticated.")
+            drive_mirror = get_drive_mirror(drive_credentials)
             target_drive_folder_id = extract_folder_id_from_link(drive_folder_link_input.strip())
             if target_drive_folder_id: st.info(f"Drive Folder ID: {target_drive_folder_id}")
             else: st.error("Could not get Drive Folder ID from link.")
+            if drive_mirror.in_flight: st.caption(f"{drive_mirror.in_flight} upload(s) in progress.")
+            for r in drive_mirror.recent_results(10):
+                if not r.ok: st.caption(f"❌ {os.path.basename(r.path)}: {r.error}")
+                else: st.caption(f"{'⏭️ already in Drive' if r.skipped else '✅ uploaded'}{' (resumed)' if r.resumed else ''}: {os.path.basename(r.path)} ({r.seconds:.1f}s)")
         else: drive_auth_placeholder.error("Drive Auth Failed/Pending.")
 
 def handle_file_upload_to_gcs(uploaded_file_obj, bucket_name, prefix=""):
     if not uploaded_file_obj or not gcs_client or not bucket_name: return None
-    os.makedirs(TEMP_MEDIA_DIR, exist_ok=True)
-    temp_file_path = os.path.join(TEMP_MEDIA_DIR, f"{uuid.uuid4()}_{uploaded_file_obj.name}")
-    try:
-        with open(temp_file_path, "wb") as f: f.write(uploaded_file_obj.getbuffer())
-        gcs_uri, _ = upload_to_gcs(gcs_client, bucket_name, temp_file_path, prefix)
+    try: # Streamed from the in-memory upload buffer; no temp file round trip.
+        gcs_uri, _, uploaded = upload_buffer(gcs_client, bucket_name, uploaded_file_obj.getbuffer(), uploaded_file_obj.name, prefix)
+        st.info(f"{uploaded_file_obj.name} {'uploaded to' if uploaded else 'already in GCS at'} {gcs_uri}")
         return gcs_uri
     except Exception as e: st.error(f"Error processing uploaded file {uploaded_file_obj.name}: {e}")
-    finally:
-        if os.path.exists(temp_file_path):
-            try: os.remove(temp_file_path)
-            except OSError: pass
+
+def handle_image_upload_to_gcs(uploaded_file_obj, bucket_name, aspect_ratio, prefix=""):
+    """Downscales/re-encodes an uploaded frame for Veo, uploads it and returns ``(gcs_uri, mime_type)``."""
+    if not uploaded_file_obj or not gcs_client or not bucket_name: return None, None
+    try:
+        payload, file_name, mime_type, prepared = prepare_upload(uploaded_file_obj.getbuffer(), uploaded_file_obj.name, aspect_ratio,
+                                                                 crop=st.session_state.get("crop_input_frames", IMAGE_CROP_TO_ASPECT))
+        if prepared: st.caption(f"🖼️ {prepared.describe(uploaded_file_obj.name)}")
+        gcs_uri, _, uploaded = upload_buffer(gcs_client, bucket_name, payload, file_name, prefix)
+        st.info(f"{uploaded_file_obj.name} {'uploaded to' if uploaded else 'already in GCS at'} {gcs_uri}")
+        return gcs_uri, mime_type
+    except Exception as e: st.error(f"Error processing uploaded image {uploaded_file_obj.name}: {e}"); return None, None
 
 def display_generated_videos(operation_result, current_local_output_dir, source_identifier="video"):
     videos_data = []
@@ -252,22 +275,39 @@ def display_generated_videos(operation_result, current_local_output_dir, source_
         st.error(f"Video gen failed for {source_identifier}: {err_msg}")
         if operation_result: st.json(operation_result.get('error', operation_result))
         return
-    st.success(f"Video generation successful for {source_identifier}!")
+    st.success(f"Video generation successful for {source_identifier}!" + (" (from result cache)" if operation_result.get('_cached') else ""))
     os.makedirs(current_local_output_dir, exist_ok=True)
+    cached_files = operation_result.get('_local_files') or []
+    local_paths, pending = {}, []
+    for i, video_info in enumerate(videos_data):
+        video_gcs_uri = video_info.get('gcsUri')
+        if not (video_gcs_uri and video_gcs_uri.startswith("gs://")): continue
+        if i < len(cached_files) and os.path.exists(cached_files[i]): local_paths[i] = cached_files[i]; continue
+        base_name = os.path.basename(video_gcs_uri) or f"video_{uuid.uuid4()}.mp4"
+        local_paths[i] = os.path.join(current_local_output_dir, f"generated_{source_identifier}_sample_{i+1}_{base_name}")
+        pending.append((video_gcs_uri, local_paths[i]))
+    download_errors = {}
+    if pending and gcs_client:
+        with st.spinner(f"Downloading {len(pending)} sample(s) in parallel..."):
+            t0 = time.monotonic()
+            results = download_gcs_uris(gcs_client, pending)
+        download_errors = {r.path: r.error for r in results if not r.ok}
+        st.info(f"Downloaded {describe_downloads(results, time.monotonic() - t0)}")
+    elif pending: download_errors = {path: "No GCS client" for _, path in pending}
+    local_files = []
     for i, video_info in enumerate(videos_data):
         video_gcs_uri = video_info.get('gcsUri')
-        if video_gcs_uri and video_gcs_uri.startswith("gs://"):
-            parts = video_gcs_uri[5:].split("/", 1); video_bucket_name, video_blob_name = parts[0], parts[1] if len(parts) > 1 else ""
-            base_name = os.path.basename(video_blob_name) or f"video_{uuid.uuid4()}.mp4"
-            local_video_filename = os.path.join(current_local_output_dir, f"generated_{source_identifier}_sample_{i+1}_{base_name}")
-            if download_from_gcs(gcs_client, video_bucket_name, video_blob_name, local_video_filename):
-                st.success(f"Video downloaded: {local_video_filename}")
-                with open(local_video_filename, "rb") as fp:
-                    st.download_button(f"Download Video ({source_identifier} S{i+1})", fp, os.path.basename(local_video_filename), "video/mp4", key=f"dl_vid_{source_identifier}_{i}")
-                st.video(local_video_filename, autoplay=True, muted=True)
-                if drive_service and target_drive_folder_id: upload_to_drive(drive_service, target_drive_folder_id, local_video_filename)
-            else: st.error(f"Failed to download {video_gcs_uri}")
+        if i in local_paths:
+            local_video_filename = local_paths[i]
+            if local_video_filename not in download_errors:
+                local_files.append(local_video_filename)
+                st.success(f"Video available: {local_video_filename}")
+                show_media_output(local_video_filename, f"Download Video ({source_identifier} S{i+1})", f"dl_vid_{source_identifier}_{i}", video_gcs_uri)
+            else: st.error(f"Failed to download {video_gcs_uri}: {download_errors[local_video_filename]}")
         else: st.warning(f"Invalid or missing GCS URI for video sample {i+1}")
+    mirror_to_drive(local_files)
+    if operation_result.get('_cache_key') and local_files:
+        get_result_cache().put(operation_result['_cache_key'], [v.get('gcsUri') for v in videos_data], local_files)
 
 with tabs[0]: # Standard Veo (now using v0 logic)
     display_standard_veo_tab_from_v0(
@@ -277,7 +317,10 @@ with tabs[0]: # Standard Veo (now using v0 logic)
         main_drive_folder_link=drive_folder_link_input.strip(),
         main_gcs_client=gcs_client, # Pass the initialized GCS client
         main_get_drive_service_func=get_drive_service, # Pass the function itself
-        main_extract_folder_id_from_link_func=extract_folder_id_from_link # Pass the function
+        main_extract_folder_id_from_link_func=extract_folder_id_from_link, # Pass the function
+        main_drive_mirror=drive_mirror,
+        main_use_result_cache=use_result_cache_input,
+        main_force_regenerate=force_regenerate_input,
         # The v0 module will use its own API calling and processing logic for now.
     )
 
@@ -297,14 +340,15 @@ with tabs[1]: # Veo Interpolation
         if not all([current_project_id, current_gcs_bucket, current_local_dir, interp_prompt.strip(), interp_first_frame, interp_last_frame]):
             st.error("All fields are required for Interpolation.")
         else:
-            predict_ep = PREDICTION_ENDPOINT_ADV.replace(DEFAULT_PROJECT_ID, current_project_id)
-            fetch_ep = FETCH_ENDPOINT_ADV.replace(DEFAULT_PROJECT_ID, current_project_id)
-            gcs_first = handle_file_upload_to_gcs(interp_first_frame, current_gcs_bucket, IMAGE_UPLOAD_GCS_PREFIX)
-            gcs_last = handle_file_upload_to_gcs(interp_last_frame, current_gcs_bucket, IMAGE_UPLOAD_GCS_PREFIX)
+            target = get_router(current_project_id, current_gcs_bucket).next_target()
+            predict_ep, fetch_ep = target.endpoints(VEO_ADVANCED_MODEL_URL)
+            st.caption(f"Routed to {target.label} (gs://{target.bucket})")
+            gcs_first, first_mime = handle_image_upload_to_gcs(interp_first_frame, target.bucket, interp_aspect_ratio, IMAGE_UPLOAD_GCS_PREFIX)
+            gcs_last, last_mime = handle_image_upload_to_gcs(interp_last_frame, target.bucket, interp_aspect_ratio, IMAGE_UPLOAD_GCS_PREFIX)
             if gcs_first and gcs_last:
-                params = {"aspectRatio": interp_aspect_ratio, "storageUri": f"gs://{current_gcs_bucket}/interpolation_videos/", 
+                params = {"aspectRatio": interp_aspect_ratio, "storageUri": target.storage_uri("interpolation_videos/"), 
                           "durationSeconds": interp_duration, "enhancePrompt": True}
-                op_result = generate_veo_video(current_project_id, predict_ep, fetch_ep, interp_prompt.strip(), params, image_uri=gcs_first, last_frame_uri=gcs_last)
+                op_result = generate_veo_video(target.project_id, predict_ep, fetch_ep, interp_prompt.strip(), params, image_uri=gcs_first, last_frame_uri=gcs_last, image_mime_type=first_mime, last_frame_mime_type=last_mime, kind="interpolation", local_output_dir=current_local_dir, use_cache=use_result_cache_input, force_regenerate=force_regenerate_input, target=target.label)
                 display_generated_videos(op_result, current_local_dir, "interp_video")
             else: st.error("Failed to upload frames for interpolation.")
 
@@ -322,13 +366,14 @@ with tabs[2]: # Veo Extension
         if not all([current_project_id, current_gcs_bucket, current_local_dir, extend_prompt.strip(), extend_video_file]):
             st.error("All fields are required for Video Extension.")
         else:
-            predict_ep = PREDICTION_ENDPOINT_ADV.replace(DEFAULT_PROJECT_ID, current_project_id)
-            fetch_ep = FETCH_ENDPOINT_ADV.replace(DEFAULT_PROJECT_ID, current_project_id)
-            gcs_video = handle_file_upload_to_gcs(extend_video_file, current_gcs_bucket, VIDEO_UPLOAD_GCS_PREFIX)
+            target = get_router(current_project_id, current_gcs_bucket).next_target()
+            predict_ep, fetch_ep = target.endpoints(VEO_ADVANCED_MODEL_URL)
+            st.caption(f"Routed to {target.label} (gs://{target.bucket})")
+            gcs_video = handle_file_upload_to_gcs(extend_video_file, target.bucket, VIDEO_UPLOAD_GCS_PREFIX)
             if gcs_video:
-                params = {"aspectRatio": extend_aspect_ratio, "storageUri": f"gs://{current_gcs_bucket}/extended_videos/",
+                params = {"aspectRatio": extend_aspect_ratio, "storageUri": target.storage_uri("extended_videos/"),
                           "durationSeconds": extend_duration, "enhancePrompt": True}
-                op_result = generate_veo_video(current_project_id, predict_ep, fetch_ep, extend_prompt.strip(), params, video_uri=gcs_video)
+                op_result = generate_veo_video(target.project_id, predict_ep, fetch_ep, extend_prompt.strip(), params, video_uri=gcs_video, kind="extension", local_output_dir=current_local_dir, use_cache=use_result_cache_input, force_regenerate=force_regenerate_input, target=target.label)
                 display_generated_videos(op_result, current_local_dir, "extended_video")
             else: st.error("Failed to upload video for extension.")
 
@@ -348,13 +393,14 @@ with tabs[3]: # Veo Camera Controls
         if not all([current_project_id, current_gcs_bucket, current_local_dir, cam_prompt.strip(), cam_image_file, cam_control_type]):
             st.error("All fields are required for Camera Control generation.")
         else:
-            predict_ep = PREDICTION_ENDPOINT_ADV.replace(DEFAULT_PROJECT_ID, current_project_id)
-            fetch_ep = FETCH_ENDPOINT_ADV.replace(DEFAULT_PROJECT_ID, current_project_id)
-            gcs_image = handle_file_upload_to_gcs(cam_image_file, current_gcs_bucket, IMAGE_UPLOAD_GCS_PREFIX)
+            target = get_router(current_project_id, current_gcs_bucket).next_target()
+            predict_ep, fetch_ep = target.endpoints(VEO_ADVANCED_MODEL_URL)
+            st.caption(f"Routed to {target.label} (gs://{target.bucket})")
+            gcs_image, cam_image_mime = handle_image_upload_to_gcs(cam_image_file, target.bucket, cam_aspect_ratio, IMAGE_UPLOAD_GCS_PREFIX)
             if gcs_image:
-                params = {"aspectRatio": cam_aspect_ratio, "storageUri": f"gs://{current_gcs_bucket}/camera_videos/", "enhancePrompt": True}
+                params = {"aspectRatio": cam_aspect_ratio, "storageUri": target.storage_uri("camera_videos/"), "enhancePrompt": True}
                 # if cam_duration: params["durationSeconds"] = cam_duration # If API supports it
-                op_result = generate_veo_video(current_project_id, predict_ep, fetch_ep, cam_prompt.strip(), params, image_uri=gcs_image, camera_control=cam_control_type)
+                op_result = generate_veo_video(target.project_id, predict_ep, fetch_ep, cam_prompt.strip(), params, image_uri=gcs_image, image_mime_type=cam_image_mime, camera_control=cam_control_type, kind="camera", local_output_dir=current_local_dir, use_cache=use_result_cache_input, force_regenerate=force_regenerate_input, target=target.label)
                 display_generated_videos(op_result, current_local_dir, f"cam_{cam_control_type}_video")
             else: st.error("Failed to upload image for camera control.")
 
@@ -366,28 +412,36 @@ with tabs[5]: # Lyria Music Generation
     lyria_prompt = st.text_area("Music Prompt", placeholder="e.g., Epic cinematic score", key="lyria_prompt")
     lyria_neg_prompt = st.text_area("Negative Prompt (Optional)", placeholder="e.g., Off-key, noisy", key="lyria_neg_prompt")
     lyria_sample_count = st.number_input("Number of Samples", 1, 4, 2, key="lyria_samples") # Lyria Colab had fixed 4, making it configurable 1-4
+    with st.expander("Batch Mode (many samples or prompts)"):
+        lyria_batch_prompts = st.text_area("Additional Prompts (one per line)", placeholder="e.g., Calm lo-fi piano\nUpbeat synthwave", key="lyria_batch_prompts")
+        lyria_samples_per_prompt = st.number_input("Samples per Prompt (overrides Number of Samples)", 0, 32, 0, key="lyria_batch_samples", help="0 keeps 'Number of Samples'. Samples are split into concurrent calls.")
+        lyria_concurrency = st.number_input("Max Concurrent Calls", 1, 16, LYRIA_MAX_CONCURRENCY, key="lyria_concurrency")
 
     if st.button("Generate Lyria Music", key="lyria_btn"):
         current_lyria_project_id = lyria_project_id_input.strip()
         current_local_dir = local_output_dir_input.strip()
-        if not all([current_lyria_project_id, current_local_dir, lyria_prompt.strip()]):
+        lyria_prompts = [p for p in [lyria_prompt.strip()] + [l.strip() for l in lyria_batch_prompts.splitlines()] if p]
+        if not all([current_lyria_project_id, current_local_dir, lyria_prompts]):
             st.error("Lyria Project ID, Local Output Dir, and Prompt are required for Music Generation.")
         else:
-            music_samples = generate_lyria_music(current_lyria_project_id, lyria_prompt.strip(), lyria_neg_prompt.strip(), lyria_sample_count)
-            if music_samples:
-                st.success(f"Generated {len(music_samples)} music sample(s)!")
-                music_output_path = os.path.join(current_local_dir, MUSIC_OUTPUT_SUBDIR)
-                os.makedirs(music_output_path, exist_ok=True)
-                for i, sample in enumerate(music_samples):
-                    local_music_file = os.path.join(music_output_path, sample["filename"])
-                    with open(local_music_file, "wb") as f:
-                        f.write(sample["audio_bytes"])
-                    st.markdown(f"**Sample {i+1}:** `{sample['filename']}`")
-                    st.audio(local_music_file, format='audio/wav')
-                    with open(local_music_file, "rb") as fp_music:
-                        st.download_button(label=f"Download {sample['filename']}", data=fp_music, file_name=sample["filename"], mime="audio/wav", key=f"dl_music_{i}")
-                    if drive_service and target_drive_folder_id:
-                        upload_to_drive(drive_service, target_drive_folder_id, local_music_file)
+            calls = plan_lyria_calls(lyria_prompts, lyria_neg_prompt.strip(), lyria_samples_per_prompt or lyria_sample_count)
+            st.info(f"Sending {len(calls)} Lyria call(s), up to {lyria_concurrency} at a time; samples appear as each call returns.")
+            music_output_path = os.path.join(current_local_dir, MUSIC_OUTPUT_SUBDIR)
+            music_files, latencies = [], []
+            with st.spinner("Generating music..."):
+                for call in iter_lyria_batch(current_lyria_project_id, calls, music_output_path, lyria_concurrency):
+                    latencies.append(call.latency)
+                    if call.error:
+                        st.error(f"Lyria call {call.index+1} ('{call.prompt[:40]}') failed after {call.latency:.1f}s: {call.error}")
+                        continue
+                    for local_music_file in call.samples:
+                        music_files.append(local_music_file)
+                        file_name = os.path.basename(local_music_file)
+                        st.markdown(f"**Sample {len(music_files)}:** `{file_name}` — _{call.prompt}_ ({call.latency:.1f}s)")
+                        show_media_output(local_music_file, f"Download {file_name}", f"dl_music_{len(music_files)}", media_kind="audio", mime="audio/wav")
+            if music_files:
+                st.success(f"Generated {len(music_files)} music sample(s) from {len(calls)} call(s); slowest call {max(latencies):.1f}s, total {sum(latencies):.1f}s of call time.")
+                mirror_to_drive(music_files)
             else:
                 st.error("Lyria music generation failed or returned no samples.")
 